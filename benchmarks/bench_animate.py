@@ -0,0 +1,125 @@
+"""
+Measure the frames per second of BlockGrid.animate and flash, along with
+the number of outputs they create and the bytes they send, compared with
+clearing the output and displaying every frame anew as they used to.
+
+Frames are published through a stand-in IPython shell that only records
+the messages a kernel would send, so this measures the cost on the Python
+side of the kernel.
+
+"""
+from __future__ import print_function
+
+import time
+
+from IPython.core.interactiveshell import InteractiveShell
+from IPython.display import HTML, display
+
+from ipythonblocks import BlockGrid
+from ipythonblocks import ipythonblocks as ipb
+
+GRID_SIDES = (10, 20, 40)
+TARGET_FPS = (60, 240, 2000)
+SCHEDULE_SIDE = 20
+
+
+class CountingPublisher(object):
+    """
+    Records display messages in place of a kernel's display publisher.
+
+    """
+    def __init__(self):
+        self.new = 0
+        self.updates = 0
+        self.clears = 0
+        self.bytes = 0
+
+    def publish(self, data, metadata=None, source=None, transient=None,
+                update=False, **kwargs):
+        if update:
+            self.updates += 1
+        else:
+            self.new += 1
+
+        self.bytes += len(data.get('text/html', ''))
+
+    def clear_output(self, wait=False):
+        self.clears += 1
+
+
+def clear_and_display(grid):
+    """
+    Animate the way animate() used to: clear, then display each frame.
+
+    """
+    for block in grid:
+        display(HTML(grid._repr_html_()))
+        yield block
+        ipb.clear_output(wait=True)
+    display(HTML(grid._repr_html_()))
+
+
+def flash_loop(grid):
+    for block in grid:
+        block.red = 255
+        grid.flash(display_time=0)
+        yield block
+
+
+def run(shell, animation):
+    shell.display_pub = pub = CountingPublisher()
+    # each run is its own cell
+    shell.execution_count += 1
+
+    start = time.time()
+    frames = 0
+    for block in animation:
+        block.green = 255
+        frames += 1
+    elapsed = time.time() - start
+
+    return frames / elapsed, pub
+
+
+def main():
+    shell = InteractiveShell.instance()
+
+    for side in GRID_SIDES:
+        runs = (('clear+display', lambda g: clear_and_display(g)),
+                ('animate', lambda g: g.animate(stop_time=0)),
+                ('animate delta', lambda g: g.animate(stop_time=0,
+                                                      delta=True)),
+                ('flash', flash_loop))
+
+        for name, animation in runs:
+            fps, pub = run(shell, animation(BlockGrid(side, side)))
+            print('{0:>3} x {0:<3} {1:14} {2:8.1f} fps  new outputs {3:5d}  '
+                  'updates {4:5d}  clears {5:5d}  {6:12,d} B'.format(
+                      side, name, fps, pub.new, pub.updates, pub.clears,
+                      pub.bytes))
+
+
+def schedule():
+    """
+    Report the frame rate achieved and frames dropped by animate when
+    targeting different frame rates.
+
+    """
+    shell = InteractiveShell.instance()
+    shell.display_pub = CountingPublisher()
+
+    for fps in TARGET_FPS:
+        for delta in (False, True):
+            grid = BlockGrid(SCHEDULE_SIDE, SCHEDULE_SIDE)
+            for block in grid.animate(fps=fps, delta=delta):
+                block.green = 255
+
+            stats = grid.animation_stats
+            print('target {0:5d} fps  delta={1!s:5}  achieved {2:7.1f} fps  '
+                  'frames {3:5d}  dropped {4:5d}'.format(
+                      fps, delta, stats.fps, stats.frames, stats.dropped))
+
+
+if __name__ == '__main__':
+    main()
+    schedule()
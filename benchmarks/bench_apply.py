@@ -0,0 +1,55 @@
+"""
+Time coloring a million block grid from a function of block position,
+by setting each block in a loop and with ``apply`` and ``from_function``,
+and inverting its colors in a loop and with ``map``.
+
+"""
+from __future__ import print_function
+
+import timeit
+
+from ipythonblocks import BlockGrid
+
+GRID_SIDE = 1000
+
+
+def color(row, col):
+    return (row % 256, col % 256, (row + col) % 256)
+
+
+def invert(red, green, blue):
+    return (255 - red, 255 - green, 255 - blue)
+
+
+def color_loop(grid):
+    for block in grid:
+        block.rgb = color(block.row, block.col)
+
+
+def invert_loop(grid):
+    for block in grid:
+        block.rgb = invert(*block.rgb)
+
+
+def time_once(func):
+    return min(timeit.repeat(func, number=1, repeat=3))
+
+
+def main():
+    grid = BlockGrid(GRID_SIDE, GRID_SIDE)
+
+    print('BlockGrid {0} x {0}'.format(GRID_SIDE))
+    for name, func in (
+            ('color loop', lambda: color_loop(grid)),
+            ('apply', lambda: grid.apply(color)),
+            ('apply scalar', lambda: grid.apply(color, vectorized=False)),
+            ('from_function',
+             lambda: BlockGrid.from_function(GRID_SIDE, GRID_SIDE, color)),
+            ('invert loop', lambda: invert_loop(grid)),
+            ('map', lambda: grid.map(invert)),
+            ('map scalar', lambda: grid.map(invert, vectorized=False))):
+        print('  {0:>14} {1:8.3f} s'.format(name, time_once(func)))
+
+
+if __name__ == '__main__':
+    main()
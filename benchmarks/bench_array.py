@@ -0,0 +1,54 @@
+"""
+Time getting the colors of a million block grid into a NumPy array
+through ``_to_simple_grid`` and with ``to_array`` and ``np.asarray``,
+and making a grid from an array by setting each block and with
+``from_array``.
+
+"""
+from __future__ import print_function
+
+import timeit
+
+import numpy as np
+
+from ipythonblocks import BlockGrid
+
+GRID_SIDE = 1000
+
+
+def via_simple_grid(grid):
+    return np.array([[block[:3] for block in row]
+                     for row in grid._to_simple_grid()], dtype=np.uint8)
+
+
+def block_loop(colors):
+    grid = BlockGrid(colors.shape[1], colors.shape[0])
+    for block in grid:
+        block.rgb = colors[block.row, block.col]
+    return grid
+
+
+def time_once(func):
+    return min(timeit.repeat(func, number=1, repeat=3))
+
+
+def main():
+    grid = BlockGrid(GRID_SIDE, GRID_SIDE)
+    colors = np.random.randint(
+        0, 256, (GRID_SIDE, GRID_SIDE, 3)).astype(np.uint8)
+
+    print('BlockGrid {0} x {0}'.format(GRID_SIDE))
+    for name, func in (
+            ('_to_simple_grid', lambda: via_simple_grid(grid)),
+            ('to_array', lambda: grid.to_array()),
+            ('to_array copy', lambda: grid.to_array(copy=True)),
+            ('np.asarray', lambda: np.asarray(grid)),
+            ('block loop', lambda: block_loop(colors)),
+            ('from_array', lambda: BlockGrid.from_array(colors)),
+            ('from_array copy',
+             lambda: BlockGrid.from_array(colors, copy=True))):
+        print('  {0:>16} {1:10.6f} s'.format(name, time_once(func)))
+
+
+if __name__ == '__main__':
+    main()
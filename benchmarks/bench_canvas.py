@@ -0,0 +1,47 @@
+"""
+Time building the display HTML for very large grids as a table and as
+a canvas, and report the size of each.
+
+"""
+from __future__ import print_function
+
+import timeit
+
+import numpy as np
+
+from ipythonblocks import BlockGrid
+
+GRID_SIDES = (200, 500, 1000)
+N_COLORS = 16
+
+
+def uncached(grid, render):
+    def func():
+        # clear the render cache so the HTML is built every time
+        grid._reset_cache()
+        return render()
+    return func
+
+
+def time_per_call(func):
+    return min(timeit.repeat(func, number=1, repeat=3))
+
+
+def main():
+    rs = np.random.RandomState(0)
+    palette = rs.randint(0, 256, size=(N_COLORS, 3))
+
+    for side in GRID_SIDES:
+        grid = BlockGrid(side, side, block_size=1, lines_on=False)
+        grid[:, :] = palette[rs.randint(0, N_COLORS, size=(side, side))]
+        grid.canvas_threshold = None
+
+        for name, render in (('table', grid._repr_html_),
+                             ('canvas', lambda: grid._canvas_html('bench'))):
+            t = time_per_call(uncached(grid, render))
+            print('{0:>5} x {0:<5} {1:6} {2:9.1f} ms {3:12,d} B'.format(
+                side, name, t * 1e3, len(render())))
+
+
+if __name__ == '__main__':
+    main()
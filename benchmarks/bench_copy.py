@@ -0,0 +1,51 @@
+"""
+Time taking 100 snapshots of a million block grid, as frame history
+code does, with ``copy`` and copy-on-write copies, when the grid is
+unchanged between snapshots, when one block changes before every tenth
+snapshot, and when one block changes before each one. Copy-on-write
+copies the colors once for each change, when the grid is written to.
+
+"""
+from __future__ import print_function
+
+import timeit
+
+from ipythonblocks import BlockGrid
+
+GRID_SIDE = 1000
+N_SNAPSHOTS = 100
+
+
+def snapshots(grid, snapshot, change_every):
+    history = []
+    for i in range(N_SNAPSHOTS):
+        if change_every and i % change_every == 0:
+            grid[0, 0] = (i, i, i)
+        history.append(snapshot(grid))
+    return history
+
+
+def time_once(func):
+    return min(timeit.repeat(func, number=1, repeat=3))
+
+
+def main():
+    grid = BlockGrid(GRID_SIDE, GRID_SIDE)
+
+    print('{0} snapshots of BlockGrid {1} x {1}'.format(
+        N_SNAPSHOTS, GRID_SIDE))
+    for change_every, label in (
+            (None, 'unchanged'),
+            (10, 'one block changed every tenth time'),
+            (1, 'one block changed each time')):
+        print('  ' + label)
+        for name, snapshot in (
+                ('copy', lambda g: g.copy()),
+                ('copy_on_write', lambda g: g.copy(copy_on_write=True))):
+            seconds = time_once(
+                lambda: snapshots(grid, snapshot, change_every))
+            print('    {0:>14} {1:8.3f} s'.format(name, seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Time comparing million block grids with ``==``, with full array
+comparisons as ``__eq__`` used to do, and ``content_digest`` when it
+is computed and when it is cached.
+
+"""
+from __future__ import print_function
+
+import timeit
+
+import numpy as np
+
+from ipythonblocks import BlockGrid
+
+GRID_SIDE = 1000
+
+
+def full_compare(a, b):
+    return (np.array_equal(a._colors, b._colors) and
+            np.array_equal(a._sizes, b._sizes))
+
+
+def fresh_digest(grid):
+    grid._digest = None
+    return grid.content_digest()
+
+
+def time_once(func):
+    return min(timeit.repeat(func, number=10, repeat=3)) / 10
+
+
+def main():
+    grid = BlockGrid(GRID_SIDE, GRID_SIDE)
+    same = grid.copy()
+    different = grid.copy()
+    different[0, 0] = (1, 1, 1)
+
+    print('BlockGrid {0} x {0}'.format(GRID_SIDE))
+    for name, func in (
+            ('full equal', lambda: full_compare(grid, same)),
+            ('== equal', lambda: grid == same),
+            ('full differ', lambda: full_compare(grid, different)),
+            ('== differ', lambda: grid == different),
+            ('== itself', lambda: grid == grid),
+            ('digest', lambda: fresh_digest(grid)),
+            ('digest cached', lambda: grid.content_digest())):
+        print('  {0:>14} {1:10.6f} s'.format(name, time_once(func)))
+
+
+if __name__ == '__main__':
+    main()
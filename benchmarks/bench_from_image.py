@@ -0,0 +1,65 @@
+"""
+Time making a 150 block wide ImageGrid from a 6000 x 4000 photo by
+resizing it with PIL and assigning each pixel in a loop, and with
+``ImageGrid.from_image`` from an image in memory and a JPEG file.
+
+"""
+from __future__ import print_function
+
+import os
+import tempfile
+import timeit
+
+import numpy as np
+from PIL import Image
+
+from ipythonblocks import ImageGrid
+
+IMAGE_SIZE = (6000, 4000)
+GRID_WIDTH = 150
+
+
+def pixel_loop(filename):
+    im = Image.open(filename).convert('RGB')
+    height = GRID_WIDTH * im.size[1] // im.size[0]
+    im = im.resize((GRID_WIDTH, height), Image.BOX)
+
+    grid = ImageGrid(GRID_WIDTH, height, origin='upper-left')
+    for pixel in grid:
+        pixel.rgb = im.getpixel((pixel.x, pixel.y))
+    return grid
+
+
+def time_once(func):
+    return min(timeit.repeat(func, number=1, repeat=3))
+
+
+def main():
+    # smooth gradients with noise so the JPEG is a realistic size
+    y, x = np.indices(IMAGE_SIZE[::-1])
+    pixels = np.dstack([x * 255 // IMAGE_SIZE[0], y * 255 // IMAGE_SIZE[1],
+                        np.random.randint(0, 64, x.shape)]).astype(np.uint8)
+    image = Image.fromarray(pixels)
+
+    fd, filename = tempfile.mkstemp(suffix='.jpg')
+    os.close(fd)
+    try:
+        image.save(filename, quality=90)
+
+        print('{0} x {1} image to {2} blocks wide'.format(
+            IMAGE_SIZE[0], IMAGE_SIZE[1], GRID_WIDTH))
+        for name, func in (
+                ('pixel loop', lambda: pixel_loop(filename)),
+                ('from_image file', lambda: ImageGrid.from_image(
+                    filename, width=GRID_WIDTH)),
+                ('from_image nearest', lambda: ImageGrid.from_image(
+                    filename, width=GRID_WIDTH, resample='nearest')),
+                ('from_image PIL', lambda: ImageGrid.from_image(
+                    image, width=GRID_WIDTH))):
+            print('  {0:>18} {1:8.3f} s'.format(name, time_once(func)))
+    finally:
+        os.remove(filename)
+
+
+if __name__ == '__main__':
+    main()
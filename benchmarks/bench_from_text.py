@@ -0,0 +1,63 @@
+"""
+Time reading a grid written by ``to_text`` with ``BlockGrid.from_text``
+against parsing it a line at a time and setting one block per line.
+
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import timeit
+
+import numpy as np
+
+from ipythonblocks import BlockGrid
+
+GRID_SIDES = (100, 1000)
+
+
+def read_lines(filename):
+    with open(filename) as f:
+        lines = [line for line in f
+                 if line.strip() and not line.startswith('#')]
+
+    width, height = map(int, lines[0].split())
+    grid = BlockGrid(width, height, block_size=int(lines[1]))
+
+    for line in lines[3:]:
+        row, col, red, green, blue = map(int, line.split())
+        grid[row, col] = (red, green, blue)
+
+    return grid
+
+
+def time_once(func):
+    return min(timeit.repeat(func, number=1, repeat=3))
+
+
+def main():
+    rs = np.random.RandomState(0)
+    tmp = tempfile.mkdtemp()
+    filename = os.path.join(tmp, 'grid.txt')
+
+    try:
+        for side in GRID_SIDES:
+            grid = BlockGrid(side, side)
+            grid[:, :] = rs.randint(0, 256, size=(side, side, 3))
+            grid.to_text(filename)
+
+            assert BlockGrid.from_text(filename) == grid
+
+            t_lines = time_once(lambda: read_lines(filename))
+            t_bulk = time_once(lambda: BlockGrid.from_text(filename))
+            print('{0:>5} x {0:<5} ({1:>7} lines)  per line {2:8.1f} ms  '
+                  'from_text {3:7.1f} ms  speedup {4:5.1f}x'.format(
+                      side, side * side, t_lines * 1e3, t_bulk * 1e3,
+                      t_lines / t_bulk))
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""
+Report the size of the HTML rendered for grids of increasing size
+with inline styles or CSS classes, and with or without per-cell titles.
+
+"""
+from __future__ import print_function
+
+import numpy as np
+
+from ipythonblocks import BlockGrid
+
+GRID_SIDES = (20, 50, 100, 200)
+N_COLORS = 16
+
+
+def html_size(grid, **options):
+    for name, value in options.items():
+        setattr(grid, name, value)
+
+    return len(grid._repr_html_().encode('utf-8'))
+
+
+def main():
+    rs = np.random.RandomState(0)
+    palette = rs.randint(0, 256, size=(N_COLORS, 3))
+
+    for side in GRID_SIDES:
+        grid = BlockGrid(side, side)
+        grid[:, :] = palette[rs.randint(0, N_COLORS, size=(side, side))]
+
+        inline = html_size(grid, css_classes=False, tooltips='title')
+
+        for css_classes in (False, True):
+            for tooltips in ('title', 'hover', None):
+                size = html_size(
+                    grid, css_classes=css_classes, tooltips=tooltips)
+                print('{0:>4} x {0:<4} {1:7} tooltips={2!r:8} '
+                      '{3:10,d} B  ratio {4:5.1f}x'.format(
+                          side, 'classes' if css_classes else 'inline',
+                          tooltips, size, inline / float(size)))
+
+
+if __name__ == '__main__':
+    main()
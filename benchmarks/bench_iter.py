@@ -0,0 +1,51 @@
+"""
+Time iterating over a million block grid by indexing every block, as
+``__iter__`` used to, and with ``__iter__``, ``iter_rgb``,
+``enumerate_rgb``, and ``iter_rows``.
+
+"""
+from __future__ import print_function
+
+import timeit
+
+from ipythonblocks import BlockGrid, ImageGrid
+
+GRID_SIDE = 1000
+
+
+def consume(iterable):
+    for _ in iterable:
+        pass
+
+
+def by_index(grid):
+    if isinstance(grid, ImageGrid):
+        for x in range(grid.width):
+            for y in range(grid.height):
+                grid[x, y]
+    else:
+        for r in range(grid.height):
+            for c in range(grid.width):
+                grid[r, c]
+
+
+def time_once(func):
+    return min(timeit.repeat(func, number=1, repeat=3))
+
+
+def main():
+    for grid_cls in (BlockGrid, ImageGrid):
+        grid = grid_cls(GRID_SIDE, GRID_SIDE)
+
+        print('{0} {1} x {1}'.format(grid_cls.__name__, GRID_SIDE))
+        for name, func in (
+                ('indexing', lambda: by_index(grid)),
+                ('__iter__', lambda: consume(grid)),
+                ('iter_rgb', lambda: consume(grid.iter_rgb())),
+                ('enumerate_rgb', lambda: consume(grid.enumerate_rgb())),
+                ('iter_rows', lambda: consume(grid.iter_rows()))):
+            print('  {0:>14} {1:8.3f} s'.format(name, time_once(func)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Compare the size and encode time of PNG images of grids written as
+RGB and as palette images, and as chosen by ``_write_image``, at a few
+zlib levels and strategies.
+
+"""
+from __future__ import print_function
+
+import io
+import timeit
+import zlib
+
+import numpy as np
+from PIL import Image
+
+from ipythonblocks import BlockGrid
+
+GRID_SIDE = 200
+BLOCK_SIZE = 10
+N_COLORS = 16
+
+OPTIONS = (
+    ('default', {}),
+    ('level 1', {'compress_level': 1}),
+    ('level 9', {'compress_level': 9}),
+    ('rle', {'strategy': zlib.Z_RLE}),
+)
+
+
+def write_rgb(grid, **options):
+    fp = io.BytesIO()
+    if 'strategy' in options:
+        options['compress_type'] = options.pop('strategy')
+    Image.fromarray(grid._image_array()).save(fp, format='png', **options)
+    return fp.getvalue()
+
+
+def write_palette(grid, **options):
+    fp = io.BytesIO()
+    if 'strategy' in options:
+        options['compress_type'] = options.pop('strategy')
+    grid._pil_image(palette=True).save(fp, format='png', **options)
+    return fp.getvalue()
+
+
+def write_image(grid, **options):
+    # clear the render cache so the PNG is encoded every time
+    grid._reset_cache()
+    fp = io.BytesIO()
+    grid._write_image(fp, **options)
+    return fp.getvalue()
+
+
+def time_once(func):
+    return min(timeit.repeat(func, number=1, repeat=3))
+
+
+def main():
+    rs = np.random.RandomState(0)
+    palette = rs.randint(0, 256, size=(N_COLORS, 3))
+
+    grid = BlockGrid(GRID_SIDE, GRID_SIDE, block_size=BLOCK_SIZE)
+    grid[:, :] = palette[rs.randint(0, N_COLORS, size=(GRID_SIDE, GRID_SIDE))]
+
+    print('{0} x {0} grid, {1} colors, block_size {2}'.format(
+        GRID_SIDE, N_COLORS, BLOCK_SIZE))
+
+    for name, options in OPTIONS:
+        rgb = write_rgb(grid, **options)
+        pal = write_palette(grid, **options)
+
+        written = write_image(grid, **options)
+
+        t_rgb = time_once(lambda: write_rgb(grid, **options))
+        t_pal = time_once(lambda: write_palette(grid, **options))
+        t_written = time_once(lambda: write_image(grid, **options))
+        print('{0:>8}  rgb {1:7.1f} kB {2:6.1f} ms  '
+              'palette {3:7.1f} kB {4:6.1f} ms  '
+              '_write_image {5:7.1f} kB {6:6.1f} ms'.format(
+                  name, len(rgb) / 1e3, t_rgb * 1e3,
+                  len(pal) / 1e3, t_pal * 1e3,
+                  len(written) / 1e3, t_written * 1e3))
+
+
+if __name__ == '__main__':
+    main()
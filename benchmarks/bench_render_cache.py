@@ -0,0 +1,50 @@
+"""
+Time displaying and saving an unchanged grid again, which reuses the
+output cached since the grid was last changed, against rendering it
+after a change.
+
+"""
+from __future__ import print_function
+
+import io
+import os
+import timeit
+
+import numpy as np
+
+from ipythonblocks import BlockGrid
+
+GRID_SIDE = 200
+
+
+def time_once(func):
+    return min(timeit.repeat(func, number=1, repeat=5))
+
+
+def main():
+    rs = np.random.RandomState(0)
+    grid = BlockGrid(GRID_SIDE, GRID_SIDE, block_size=5)
+    grid[:, :] = rs.randint(0, 4, size=(GRID_SIDE, GRID_SIDE, 3)) * 64
+
+    def change():
+        grid[0, 0].red = 255 - grid[0, 0].red
+
+    outputs = (
+        ('html', grid._repr_html_),
+        ('png', lambda: grid._write_image(io.BytesIO())),
+        ('text', lambda: grid.to_text(os.devnull)),
+    )
+
+    print('{0} x {0} grid'.format(GRID_SIDE))
+    for name, render in outputs:
+        t_miss = time_once(lambda: (change(), render()))
+        t_hit = time_once(render)
+        print('{0:>5}  changed {1:8.2f} ms  unchanged {2:8.3f} ms  '
+              '({3:.0f}x)'.format(name, t_miss * 1e3, t_hit * 1e3,
+                                  t_miss / t_hit))
+
+    print(grid.cache_stats)
+
+
+if __name__ == '__main__':
+    main()
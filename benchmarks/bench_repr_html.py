@@ -0,0 +1,83 @@
+"""
+Time rendering the HTML for grids of increasing size.
+
+Compares the storage-based renderer used by ``_repr_html_`` against
+building the same table from the ``_td`` of every block, and checks that
+both produce identical HTML.
+
+"""
+from __future__ import print_function
+
+import timeit
+import uuid
+
+from functools import reduce
+from operator import iadd
+
+import numpy as np
+
+from ipythonblocks import BlockGrid, ImageGrid
+from ipythonblocks import ipythonblocks as ipb
+
+GRID_SIDES = (20, 50, 100, 200)
+N_COLORS = 16
+
+
+def fixed_uuid():
+    return 'bench'
+
+
+def td_html(grid):
+    """
+    Build the grid HTML from the ``_td`` of each block, the way
+    ``_repr_html_`` used to.
+
+    """
+    rows = range(grid.height)
+    if isinstance(grid, ImageGrid):
+        if grid.origin == 'lower-left':
+            rows = rows[::-1]
+
+        def cells(r):
+            return (grid[c, r]._td for c in range(grid.width))
+    else:
+        def cells(r):
+            return (grid[r, c]._td for c in range(grid.width))
+
+    html = reduce(iadd, (ipb._TR.format(reduce(iadd, cells(r)))
+                         for r in rows))
+    return ipb._TABLE.format(uuid.uuid4(), int(grid.lines_on), html)
+
+
+def storage_html(grid):
+    # clear the render cache so the HTML is built every time
+    grid._reset_cache()
+    return grid._repr_html_()
+
+
+def time_per_call(func, number):
+    return min(timeit.repeat(func, number=number, repeat=3)) / number
+
+
+def main():
+    uuid.uuid4 = fixed_uuid
+    rs = np.random.RandomState(0)
+    palette = rs.randint(0, 256, size=(N_COLORS, 3))
+
+    for grid_cls in (BlockGrid, ImageGrid):
+        for side in GRID_SIDES:
+            grid = grid_cls(side, side)
+            grid[:, :] = palette[rs.randint(0, N_COLORS, size=(side, side))]
+
+            assert grid._repr_html_() == td_html(grid)
+
+            t_old = time_per_call(lambda: td_html(grid), 1)
+            t_new = time_per_call(lambda: storage_html(grid), 3)
+            print('{0:10} {1:>4} x {1:<4} td {2:9.2f} ms  '
+                  'storage {3:8.2f} ms  speedup {4:5.1f}x'.format(
+                      grid_cls.__name__, side, t_old * 1e3, t_new * 1e3,
+                      t_old / t_new))
+
+
+if __name__ == '__main__':
+    main()
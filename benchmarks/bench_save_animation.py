@@ -0,0 +1,62 @@
+"""
+Compare saving an animation with ``save_animation``, which streams
+frames holding only the pixels that changed, against collecting full
+frames and saving them with PIL's ``save_all``.
+
+"""
+from __future__ import print_function
+
+import io
+import time
+
+import numpy as np
+from PIL import Image
+
+from ipythonblocks import BlockGrid, save_animation
+
+GRID_SIDE = 100
+BLOCK_SIZE = 4
+N_FRAMES = 100
+CHANGES_PER_FRAME = 5
+
+
+def grid_states(seed=0):
+    rs = np.random.RandomState(seed)
+    grid = BlockGrid(GRID_SIDE, GRID_SIDE, block_size=BLOCK_SIZE)
+    for i in range(N_FRAMES):
+        if i % 10 != 9:
+            for _ in range(CHANGES_PER_FRAME):
+                r, c = rs.randint(0, GRID_SIDE, size=2).tolist()
+                grid[r, c] = rs.randint(0, 4, size=3) * 64
+        yield grid
+
+
+def save_all(format):
+    frames = [Image.fromarray(grid._image_array()) for grid in grid_states()]
+    fp = io.BytesIO()
+    frames[0].save(fp, format=format, save_all=True,
+                   append_images=frames[1:], duration=100, loop=0)
+    return fp.getvalue()
+
+
+def stream(format):
+    fp = io.BytesIO()
+    save_animation(grid_states(), fp, format, duration=0.1)
+    return fp.getvalue()
+
+
+def main():
+    print('{0} frames of a {1} x {1} grid, {2} blocks changed per '
+          'frame'.format(N_FRAMES, GRID_SIDE, CHANGES_PER_FRAME))
+
+    for format in ('gif', 'png'):
+        for name, func in (('save_all', save_all), ('stream', stream)):
+            start = time.time()
+            data = func(format)
+            elapsed = time.time() - start
+            print('{0:>4} {1:>9}  {2:8.1f} kB  {3:7.2f} s'.format(
+                format, name, len(data) / 1e3, elapsed))
+
+
+if __name__ == '__main__':
+    main()
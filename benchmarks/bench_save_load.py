@@ -0,0 +1,53 @@
+"""
+Time saving and loading grids with the binary format of ``save`` and
+``load``, with and without memory-mapping, against ``to_text``.
+
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import timeit
+
+import numpy as np
+
+from ipythonblocks import BlockGrid
+
+GRID_SIDES = (200, 2000)
+
+
+def time_once(func, repeat=3):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main():
+    rs = np.random.RandomState(0)
+    tmp = tempfile.mkdtemp()
+    binary = os.path.join(tmp, 'grid.ipbg')
+    text = os.path.join(tmp, 'grid.txt')
+
+    try:
+        for side in GRID_SIDES:
+            grid = BlockGrid(side, side)
+            grid[:, :] = rs.randint(0, 256, size=(side, side, 3))
+
+            # clear the render cache so to_text does the work every time
+            t_text = time_once(
+                lambda: (grid._reset_cache(), grid.to_text(text)), repeat=1)
+            t_save = time_once(lambda: grid.save(binary))
+            t_load = time_once(lambda: BlockGrid.load(binary))
+            t_mmap = time_once(lambda: BlockGrid.load(binary, mmap=True))
+
+            print('{0:>5} x {0:<5} to_text {1:8.1f} ms {2:8.1f} MB  '
+                  'save {3:7.2f} ms {4:6.1f} MB  load {5:7.2f} ms  '
+                  'mmap load {6:6.2f} ms'.format(
+                      side, t_text * 1e3, os.path.getsize(text) / 1e6,
+                      t_save * 1e3, os.path.getsize(binary) / 1e6,
+                      t_load * 1e3, t_mmap * 1e3))
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""
+Time slicing a large grid with slices of increasing area.
+
+Views share storage with their parent grid, so the cost of taking a slice
+should stay flat as the area of the slice grows. Also times getting a
+single block.
+
+"""
+from __future__ import print_function
+
+import timeit
+
+from ipythonblocks import BlockGrid, ImageGrid
+
+GRID_SIDE = 1000
+SLICE_SIDES = (1, 10, 100, 1000)
+NUMBER = 1000
+
+
+def time_per_call(func):
+    return min(timeit.repeat(func, number=NUMBER, repeat=3)) / NUMBER
+
+
+def main():
+    for grid_cls in (BlockGrid, ImageGrid):
+        grid = grid_cls(GRID_SIDE, GRID_SIDE)
+
+        for side in SLICE_SIDES:
+            t = time_per_call(lambda: grid[:side, :side])
+            print('{0:10} slice {1:>5} x {1:<5} {2:8.2f} us'.format(
+                grid_cls.__name__, side, t * 1e6))
+
+        t = time_per_call(lambda: grid[3, 4])
+        print('{0:10} single block  {1:12.2f} us'.format(
+            grid_cls.__name__, t * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Time ``to_text`` against writing one line per block as it used to, and
+compare file sizes with gzip and with blocks of the initial color left
+out.
+
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import timeit
+
+import numpy as np
+
+from ipythonblocks import BlockGrid
+
+GRID_SIDES = (100, 1000)
+
+# fraction of blocks that aren't the background color
+SPARSITY = 0.05
+
+
+def write_per_block(grid, filename):
+    with open(filename, 'w') as f:
+        s = ['# width height', '{0} {1}'.format(grid.width, grid.height),
+             '# block size', '{0}'.format(grid.block_size),
+             '# initial color', '0 0 0',
+             '# row column red green blue']
+        f.write(os.linesep.join(s) + os.linesep)
+
+        for block in grid:
+            things = [str(x) for x in (block.row, block.col) + block.rgb]
+            f.write(' '.join(things) + os.linesep)
+
+
+def time_once(func):
+    return min(timeit.repeat(func, number=1, repeat=3))
+
+
+def main():
+    rs = np.random.RandomState(0)
+    tmp = tempfile.mkdtemp()
+    name = os.path.join(tmp, 'grid.txt')
+
+    def to_text(filename, fill=None):
+        # clear the render cache so to_text does the work every time
+        grid._reset_cache()
+        grid.to_text(filename, fill=fill)
+
+    try:
+        for side in GRID_SIDES:
+            grid = BlockGrid(side, side)
+            colors = rs.randint(0, 256, size=(side, side, 3))
+            colors[rs.rand(side, side) > SPARSITY] = 0
+            grid[:, :] = colors
+
+            t_old = time_once(lambda: write_per_block(grid, name))
+            t_new = time_once(lambda: to_text(name))
+            size = os.path.getsize(name)
+            t_gz = time_once(lambda: to_text(name + '.gz'))
+            size_gz = os.path.getsize(name + '.gz')
+            t_fill = time_once(lambda: to_text(name, fill=(0, 0, 0)))
+            size_fill = os.path.getsize(name)
+
+            print('{0:>5} x {0:<5} per block {1:8.1f} ms  '
+                  'to_text {2:7.1f} ms ({3:4.1f}x) {4:6.1f} MB'.format(
+                      side, t_old * 1e3, t_new * 1e3, t_old / t_new,
+                      size / 1e6))
+            print('{0:13} gzip {1:7.1f} ms {2:6.2f} MB  '
+                  'fill {3:7.1f} ms {4:6.2f} MB'.format(
+                      '', t_gz * 1e3, size_gz / 1e6,
+                      t_fill * 1e3, size_fill / 1e6))
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Time writing PNG images of grids by expanding the color array to pixels
+and by drawing one rectangle per block, as ``_write_image`` used to, and
+check that both give the same pixels.
+
+"""
+from __future__ import print_function
+
+import io
+import timeit
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from ipythonblocks import BlockGrid
+
+GRID_SIDES = (50, 200, 500)
+BLOCK_SIZE = 20
+
+
+def draw_rectangles(grid):
+    im = Image.new(
+        mode='RGB', size=grid._calc_image_size(), color=(255, 255, 255))
+    draw = ImageDraw.Draw(im)
+    bs = grid.block_size
+
+    for r in range(grid.height):
+        for c in range(grid.width):
+            px_r = r * bs + r + 1
+            px_c = c * bs + c + 1
+            rect = ((px_c, px_r), (px_c + bs - 1, px_r + bs - 1))
+            draw.rectangle(rect, fill=tuple(grid._colors[r, c].tolist()))
+
+    return im
+
+
+def write_png(grid):
+    # clear the render cache so the PNG is encoded every time
+    grid._reset_cache()
+    grid._write_image(io.BytesIO())
+
+
+def time_once(func):
+    return min(timeit.repeat(func, number=1, repeat=3))
+
+
+def main():
+    rs = np.random.RandomState(0)
+
+    for side in GRID_SIDES:
+        grid = BlockGrid(side, side, block_size=BLOCK_SIZE)
+        grid[:, :] = rs.randint(0, 256, size=(side, side, 3))
+
+        assert (Image.fromarray(grid._image_array()).tobytes() ==
+                draw_rectangles(grid).tobytes())
+
+        t_draw = time_once(lambda: draw_rectangles(grid))
+        t_array = time_once(lambda: Image.fromarray(grid._image_array()))
+        t_png = time_once(lambda: write_png(grid))
+        print('{0:>4} x {0:<4} rectangles {1:8.1f} ms  array {2:8.1f} ms  '
+              'speedup {3:6.1f}x  (png encode incl. {4:8.1f} ms)'.format(
+                  side, t_draw * 1e3, t_array * 1e3, t_draw / t_array,
+                  t_png * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -8,19 +8,25 @@ practicing control flow stuctures and quickly seeing the results.
 # This file is copyright 2013 by Matt Davis and covered by the license at
 # https://github.com/jiffyclub/ipythonblocks/blob/master/LICENSE.txt
 
-import copy
+import base64
 import collections
+import hashlib
+import io
 import json
 import numbers
 import os
+import struct
 import sys
 import time
 import uuid
+import warnings
+import zlib
 
 from collections import namedtuple
-from operator import iadd
-from functools import reduce
 
+import numpy as np
+
+from IPython import get_ipython
 from IPython.display import HTML, IFrame, display, clear_output
 from IPython.display import Image as ipyImage
 
@@ -41,6 +47,8 @@ __all__ = (
     'ImageGrid',
     'InvalidColorSpec',
     'ShapeMismatch',
+    'AnimationWriter',
+    'save_animation',
     'show_color',
     'show_color_triple',
     'embed_colorpicker',
@@ -64,6 +72,111 @@ _TD = ('<td title="{0}" style="width: {1}px; height: {1}px;'
 _RGB = 'rgb({0}, {1}, {2})'
 _TITLE = 'Index: [{0}, {1}]&#10;Color: ({2}, {3}, {4})'
 
+# _TD split around the cell index so grids can render the part of each
+# cell that depends on color and size once per unique color and size.
+_TD_HEAD = '<td title="Index: ['
+_TD_TAIL = (']&#10;Color: ({0}, {1}, {2})" '
+            'style="width: {3}px; height: {3}px;'
+            'background-color: rgb({0}, {1}, {2});"></td>')
+
+# Used when BlockGrid.css_classes is on: colors and sizes are set by one
+# CSS rule per unique block and cells only name their class.
+_TABLE_CLASSES = ('<style type="text/css">'
+                  'table.blockgrid {{border: none;}}'
+                  ' .blockgrid tr {{border: none;}}'
+                  ' .blockgrid td {{padding: 0px;}}'
+                  ' #blocks{0} td {{border: {1}px solid white;'
+                  ' width: {3}px; height: {3}px;}}'
+                  '{4}'
+                  '</style>'
+                  '<table id="blocks{0}" class="blockgrid">'
+                  '<tbody>{2}</tbody></table>')
+_CSS_CLASS = ' #blocks{0} .c{1} {{background-color: rgb({2}, {3}, {4});}}'
+_CSS_CLASS_SIZED = (' #blocks{0} td.c{1} {{width: {5}px; height: {5}px;'
+                    ' background-color: rgb({2}, {3}, {4});}}')
+_TD_CLASS_TAIL = ']&#10;Color: ({1}, {2}, {3})" class="c{0}"></td>'
+
+# Cells without a title, used when BlockGrid.tooltips is not 'title'.
+_TD_STYLE = ('<td style="width: {3}px; height: {3}px;'
+             'background-color: rgb({0}, {1}, {2});"></td>')
+_TD_CLASS = '<td class="c{0}"></td>'
+
+_TOOLTIPS = ('title', 'hover', None)
+
+# Fills in a cell's title the first time the mouse is over it, taking the
+# index from the cell's position and the color from its computed style.
+_HOVER_SCRIPT = ('<script type="text/javascript">'
+                 'document.getElementById("blocks{0}").addEventListener('
+                 '"mouseover", function (e) {{'
+                 'var td = e.target, row, col, rgb;'
+                 'if (td.tagName !== "TD" || td.title) {{ return; }}'
+                 'row = td.parentNode.rowIndex; col = td.cellIndex;'
+                 'rgb = getComputedStyle(td).backgroundColor.match(/\\d+/g);'
+                 'td.title = "Index: [" + {1} + "]\\nColor: (" +'
+                 ' rgb.slice(0, 3).join(", ") + ")";'
+                 '}});'
+                 '</script>')
+
+# Draws a grid whose colors are shipped as base64 RGB bytes. The colors
+# are put one pixel per block into an offscreen canvas that is scaled up
+# onto the visible one, then lines are drawn over the gaps.
+_CANVAS = ('<canvas id="blocks{0}" width="{1}" height="{2}"></canvas>'
+           '<script type="text/javascript">(function () {{'
+           'var canvas = document.getElementById("blocks{0}"),'
+           ' ctx = canvas.getContext("2d"),'
+           ' src = document.createElement("canvas"),'
+           ' w = {3}, h = {4}, step = {5}, lines = {6},'
+           ' rgb = atob("{7}"), im, i, j;'
+           'src.width = w; src.height = h;'
+           'im = src.getContext("2d").createImageData(w, h);'
+           'for (i = 0, j = 0; i < rgb.length; i += 3, j += 4) {{'
+           'im.data[j] = rgb.charCodeAt(i);'
+           ' im.data[j + 1] = rgb.charCodeAt(i + 1);'
+           ' im.data[j + 2] = rgb.charCodeAt(i + 2);'
+           ' im.data[j + 3] = 255;'
+           '}}'
+           'src.getContext("2d").putImageData(im, 0, 0);'
+           'ctx.imageSmoothingEnabled = false;'
+           'ctx.drawImage(src, 0, 0, w * step, h * step);'
+           'if (lines) {{'
+           'ctx.fillStyle = "white";'
+           'for (i = 0; i <= w; i++) {{'
+           ' ctx.fillRect(i * step, 0, 1, canvas.height); }}'
+           'for (i = 0; i <= h; i++) {{'
+           ' ctx.fillRect(0, i * step, canvas.width, 1); }}'
+           '}}'
+           '}})();</script>')
+
+# Defines a function that applies changed blocks to a grid displayed as a
+# table or canvas. Changes are a flat list of (row, column, 0xRRGGBB
+# color, size) for each block. _DELTA_SCRIPT calls it for each update.
+_DELTA_FUNCTION = ('<script type="text/javascript">'
+                   'window.ipythonblocksDelta = function (id, step, lines, d)'
+                   ' {'
+                   'var el = document.getElementById(id), ctx, i, rgb, td;'
+                   'if (!el) { return; }'
+                   'if (el.tagName === "CANVAS") {'
+                   ' ctx = el.getContext("2d"); }'
+                   'for (i = 0; i < d.length; i += 4) {'
+                   'rgb = "rgb(" + (d[i + 2] >> 16) + ", " +'
+                   ' ((d[i + 2] >> 8) & 255) + ", " + (d[i + 2] & 255) + ")";'
+                   'if (ctx) {'
+                   'ctx.fillStyle = rgb;'
+                   ' ctx.fillRect(d[i + 1] * step + lines,'
+                   ' d[i] * step + lines, step - lines, step - lines);'
+                   '} else {'
+                   'td = el.rows[d[i]].cells[d[i + 1]];'
+                   ' td.style.backgroundColor = rgb;'
+                   ' td.style.width = td.style.height = d[i + 3] + "px";'
+                   ' if (td.title) {'
+                   ' td.title = td.title.replace(/Color: .*/,'
+                   ' "Color: (" + rgb.slice(4)); }'
+                   '}'
+                   '}'
+                   '};</script>')
+_DELTA_SCRIPT = ('<script type="text/javascript">'
+                 'ipythonblocksDelta("blocks{0}", {1}, {2}, [{3}]);</script>')
+
 _SINGLE_ITEM = 'single item'
 _SINGLE_ROW = 'single row'
 _ROW_SLICE = 'row slice'
@@ -71,6 +184,43 @@ _DOUBLE_SLICE = 'double slice'
 
 _SMALLEST_BLOCK = 1
 
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Ways from_image can downsample images to blocks.
+_RESAMPLE_METHODS = ('area', 'nearest')
+
+# Number of characters of block data from_text parses at a time, the
+# number of lines to_text formats at a time, and the largest grid whose
+# to_text output is cached.
+_TEXT_CHUNK = 2 ** 22
+_TEXT_LINES = 2 ** 16
+_TEXT_CACHE_BLOCKS = 10 ** 6
+
+# Binary grid files written by BlockGrid.save start with a header of
+# magic bytes, format version, grid class (0 for BlockGrid and 1 for
+# ImageGrid), index into _GRID_ORIGINS, lines_on, whether the file has
+# block sizes, width, height, and block size. Colors follow as raw RGB
+# bytes, then block sizes as 4 byte aligned int32 if they aren't all
+# the same.
+_GRID_MAGIC = b'IPBG'
+_GRID_FORMAT = 1
+_GRID_HEADER = struct.Struct('<4sBBBBB3xIII')
+_GRID_ORIGINS = (None, 'upper-left', 'lower-left')
+
+# content_digest hashes a header of width, height, block size, and
+# lines_on followed by the colors and block sizes.
+_DIGEST_HEADER = struct.Struct('<IIiB')
+
+# Number of array elements grid equality compares at a time, so grids
+# that differ early on are found unequal without comparing everything.
+_COMPARE_ELEMENTS = 2 ** 16
+
+# Grid attributes left out when pickling, the storage is pickled as
+# arrays and the rest are caches that needn't be pickled.
+_UNPICKLED_ATTRS = frozenset(['_storage', '_index', '_digest', '_cache',
+                              '_cache_version', '_cache_hits',
+                              '_cache_misses'])
+
 _POST_URL = 'http://www.ipythonblocks.org/post'
 _GET_URL_PUBLIC = 'http://www.ipythonblocks.org/get/{0}'
 _GET_URL_SECRET = 'http://www.ipythonblocks.org/get/secret/{0}'
@@ -102,6 +252,129 @@ def clear():
     clear_output()
 
 
+# The display handle for the last frame shown by BlockGrid.flash and the
+# execution count of the cell it is in, so that later flashes from the
+# same cell replace that output instead of adding a new one.
+_flash_frame = {'cell': None, 'handle': None}
+
+
+def _execution_count():
+    """
+    Execution count of the running cell, or None outside of IPython.
+
+    """
+    shell = get_ipython()
+    return shell.execution_count if shell is not None else None
+
+
+# perf_counter is the best clock for timing frames but is new in Python 3.3
+_now = getattr(time, 'perf_counter', time.time)
+
+# Summary of an animation: the number of frames shown, the number dropped
+# to keep up with the frame rate, and the achieved frames per second.
+AnimationStats = namedtuple('AnimationStats', ['frames', 'dropped', 'fps'])
+
+# Number of times a grid's rendered output was reused from its cache
+# and the number of times it had to be rendered.
+CacheStats = namedtuple('CacheStats', ['hits', 'misses'])
+
+
+class _FrameClock(object):
+    """
+    Schedules animation frames at a fixed wall-clock interval.
+
+    Time spent rendering and running the loop body is taken out of the
+    wait between frames. When that time runs past the next frame's due
+    time the late frame is dropped so the animation can catch up.
+
+    Parameters
+    ----------
+    interval : float
+        Time between frames, in seconds.
+
+    """
+    def __init__(self, interval):
+        self.interval = interval
+        self.shown = 0
+        self.dropped = 0
+        self.start = self.due = _now()
+
+    def tick(self):
+        """
+        Call when the next frame is due to find out whether to show it.
+
+        Returns
+        -------
+        show : bool
+            False if the frame is late enough that it should be dropped.
+
+        """
+        if self.interval > 0 and _now() >= self.due + self.interval:
+            self.dropped += 1
+            return False
+
+        self.shown += 1
+        return True
+
+    def wait(self):
+        """
+        Sleep until the next frame is due.
+
+        """
+        self.due += self.interval
+        delay = self.due - _now()
+        if delay > 0:
+            time.sleep(delay)
+
+    def stats(self, final=True):
+        """
+        Summarize the animation.
+
+        Parameters
+        ----------
+        final : bool, optional
+            Whether the final frame was shown and should be counted,
+            which it isn't when the animation loop is left early.
+
+        Returns
+        -------
+        stats : AnimationStats
+
+        """
+        if final:
+            self.shown += 1
+        elapsed = _now() - self.start
+        fps = self.shown / elapsed if elapsed > 0 else float('inf')
+
+        return AnimationStats(self.shown, self.dropped, fps)
+
+
+def _display_frame(html, handle=None):
+    """
+    Display a frame of an animation, replacing a previous frame in place.
+
+    Parameters
+    ----------
+    html : str
+        HTML for the new frame.
+    handle : IPython.display.DisplayHandle, optional
+        Handle of the previous frame. If not given the frame is
+        displayed as a new output.
+
+    Returns
+    -------
+    handle : IPython.display.DisplayHandle
+        Handle to pass in with the next frame. This will be None
+        outside of IPython, where every frame is displayed anew.
+
+    """
+    if handle is not None:
+        handle.update(HTML(html))
+        return handle
+
+    return display(HTML(html), display_id=True)
+
+
 def show_color(red, green, blue):
     """
     Show a given color in the IPython Notebook.
@@ -141,21 +414,491 @@ def embed_colorpicker():
     )
 
 
-def _color_property(name):
-    real_name = "_" + name
+def _color_property(channel):
+    name = ('_red', '_green', '_blue')[channel]
 
     @property
     def prop(self):
-        return getattr(self, real_name)
+        if self._grid is None:
+            return getattr(self, name)
+        return int(self._grid._colors[self._row, self._col, channel])
 
     @prop.setter
     def prop(self, value):
         value = Block._check_value(value)
-        setattr(self, real_name, value)
+        if self._grid is None:
+            setattr(self, name, value)
+        else:
+            self._grid._set_block_colors(self._row, self._col, value,
+                                         channel)
 
     return prop
 
 
+def _check_colors(colors):
+    """
+    Check that an array of color values holds numbers and constrain them
+    to [0 - 255]. This is the vectorized equivalent of `Block._check_value`.
+
+    Returns
+    -------
+    colors : ndarray of uint8
+
+    """
+    colors = np.asarray(colors)
+
+    if colors.dtype == np.uint8:
+        return colors
+
+    if colors.dtype.kind not in 'biuf':
+        s = 'values must be numbers. got {0}.'.format(colors.dtype)
+        raise InvalidColorSpec(s)
+
+    colors = np.clip(colors, 0, 255)
+    if colors.dtype.kind == 'f':
+        colors = np.rint(colors)
+
+    return colors.astype(np.uint8)
+
+
+def _unique_blocks(colors, sizes):
+    """
+    Find the unique (color, size) combinations in grid storage so the
+    HTML that depends on them can be formatted once per combination.
+
+    Parameters
+    ----------
+    colors : ndarray
+        ``(height, width, 3)`` array of colors.
+    sizes : ndarray
+        ``(height, width)`` array of block sizes.
+
+    Returns
+    -------
+    blocks : list of tuple
+        Unique ``(red, green, blue, size)`` tuples.
+    inverse : list of lists of int
+        Index into `blocks` for each block in storage order.
+
+    """
+    # pack color and size into a single integer so one np.unique will do
+    packed = colors.astype(np.int64)
+    keys = ((sizes.astype(np.int64) << 24) | (packed[..., 0] << 16) |
+            (packed[..., 1] << 8) | packed[..., 2])
+
+    uniq, inverse = np.unique(keys, return_inverse=True)
+
+    blocks = [((k >> 16) & 255, (k >> 8) & 255, k & 255, k >> 24)
+              for k in uniq.tolist()]
+
+    return blocks, inverse.reshape(keys.shape).tolist()
+
+
+def _render_rows(tails, inverse, labels=None):
+    """
+    Render the table rows for a grid.
+
+    Parameters
+    ----------
+    tails : list of str
+        The HTML for each unique block. When `labels` are given this is
+        the part of the cell following the index in its title.
+    inverse : list of lists of int
+        Index into `tails` for each block, as from `_unique_blocks`.
+    labels : list of lists of str, optional
+        The index shown in the title of each cell, e.g. ``'0, 1'``.
+        If not given cells are rendered without titles.
+
+    Returns
+    -------
+    html : str
+
+    """
+    if labels is None:
+        return ''.join(
+            _TR.format(''.join([tails[i] for i in row_inverse]))
+            for row_inverse in inverse)
+
+    return ''.join(
+        _TR.format(''.join([_TD_HEAD + label + tails[i]
+                            for label, i in zip(row_labels, row_inverse)]))
+        for row_labels, row_inverse in zip(labels, inverse))
+
+
+def _write_array(f, array, chunk_size=2 ** 24):
+    """
+    Write the bytes of an array to a file in C order, a few rows at a
+    time so that views of large grids don't have to be copied whole.
+
+    """
+    step = max(1, chunk_size // max(1, array[:1].nbytes))
+    for start in range(0, len(array), step):
+        f.write(np.ascontiguousarray(array[start:start + step]).tobytes())
+
+
+def _read_array(f, dtype, shape):
+    """
+    Read an array from the current position in a file.
+
+    """
+    array = np.empty(shape, dtype=dtype)
+
+    if f.readinto(array) != array.nbytes:
+        raise ValueError('Grid file is truncated.')
+
+    return array
+
+
+def _text_chunks(f, head, size):
+    """
+    Read a text file in chunks of about `size` characters that end on
+    line boundaries.
+
+    Parameters
+    ----------
+    f : file-like
+    head : str
+        Text already read from `f` to put at the start of the first chunk.
+    size : int
+
+    """
+    tail = head
+    while True:
+        chunk = f.read(size)
+        if not chunk:
+            break
+
+        chunk = tail + chunk
+        end = chunk.rfind('\n') + 1
+        tail = chunk[end:]
+        if end:
+            yield chunk[:end]
+
+    if tail.strip():
+        yield tail
+
+
+def _open_text(filename, mode):
+    """
+    Open a text file, using gzip if the name ends with '.gz'.
+
+    """
+    if not filename.endswith('.gz'):
+        return open(filename, mode)
+
+    import gzip
+
+    # zlib's default level is much faster than gzip's and compresses
+    # grid text nearly as well
+    if sys.version_info[0] == 2:
+        return gzip.open(filename, mode + 'b', compresslevel=6)
+    else:
+        return gzip.open(filename, mode + 't', compresslevel=6)
+
+
+def _parse_blocks(text):
+    """
+    Parse lines of ``row column red green blue`` from a text grid file.
+
+    Returns
+    -------
+    blocks : ndarray
+        ``(n, 5)`` int64 array with a row for each line.
+
+    """
+    # older versions of numpy warn instead of failing on bad data
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', DeprecationWarning)
+        try:
+            values = np.fromstring(text, dtype=np.int64, sep=' ')
+        except (ValueError, DeprecationWarning):
+            values = None
+
+    if values is None or values.size % 5:
+        raise ValueError('Block lines must have five integers: '
+                         'row column red green blue.')
+
+    return values.reshape(-1, 5)
+
+
+def _iter_blocks(block_class, grid, rows, cols, transposed=False):
+    """
+    Make a Block for each position in grid storage.
+
+    This makes the Blocks directly instead of going through grid indexing.
+
+    Parameters
+    ----------
+    block_class : type
+        Block or Pixel.
+    grid : BlockGrid
+        Grid the blocks are in.
+    rows, cols : sequence of int
+        Storage rows and columns in the order to iterate over them.
+    transposed : bool, optional
+        Whether to iterate over the rows of each column instead of the
+        columns of each row.
+
+    """
+    new = block_class.__new__
+
+    # lists so the same int objects are shared by all the blocks
+    rows, cols = list(rows), list(cols)
+
+    if transposed:
+        for col in cols:
+            for row in rows:
+                block = new(block_class)
+                block._grid = grid
+                block._row = row
+                block._col = col
+                yield block
+    else:
+        for row in rows:
+            for col in cols:
+                block = new(block_class)
+                block._grid = grid
+                block._row = row
+                block._col = col
+                yield block
+
+
+def _colors_from_result(result, shape, per_block=False):
+    """
+    Make an array of colors from the result of a function given to
+    `BlockGrid.apply` or `BlockGrid.map`.
+
+    Parameters
+    ----------
+    result
+        A tuple of (red, green, blue) values or arrays, or an array
+        of colors with a last axis of length three. If `per_block` is
+        True a list of colors for each block.
+    shape : tuple of int
+        Shape of the blocks to color.
+    per_block : bool, optional
+
+    Returns
+    -------
+    colors : ndarray
+        ``shape + (3,)`` uint8 array.
+
+    """
+    colors = np.empty(tuple(shape) + (3,), dtype=np.uint8)
+
+    try:
+        if per_block:
+            colors[...] = _check_colors(result).reshape(colors.shape)
+        elif isinstance(result, (tuple, list)) and len(result) == 3:
+            for channel, values in enumerate(result):
+                colors[..., channel] = _check_colors(values)
+        else:
+            colors[...] = _check_colors(result)
+    except ValueError:
+        raise ShapeMismatch('Colors must be (red, green, blue) values or '
+                            'arrays matching the shape of the grid.')
+
+    return colors
+
+
+def _image_colors(image, width=None, height=None, resample='area'):
+    """
+    Downsample an image to colors for a grid of blocks.
+
+    Parameters
+    ----------
+    image : str, file, or PIL Image
+        Image or name of an image file.
+    width, height : int, optional
+        Size of the grid. If only one is given the other keeps the aspect
+        ratio of the image. If neither is given there is one block
+        per pixel.
+    resample : {'area', 'nearest'}, optional
+        Color blocks with the average of the pixels they cover or with
+        the pixel nearest their center.
+
+    Returns
+    -------
+    colors : ndarray
+        ``(height, width, 3)`` uint8 array of colors, top row first.
+
+    """
+    try:
+        # PIL
+        import Image
+    except ImportError:
+        # pillow
+        from PIL import Image
+
+    if resample not in _RESAMPLE_METHODS:
+        s = 'resample must be one of {0}, got {1!r}.'
+        raise ValueError(s.format(_RESAMPLE_METHODS, resample))
+
+    for name, value in (('width', width), ('height', height)):
+        if value is not None and value < 1:
+            s = '{0} must be at least 1, got {1!r}.'
+            raise ValueError(s.format(name, value))
+
+    if isinstance(image, Image.Image):
+        return _downsample_image(image, width, height, resample)
+
+    with Image.open(image) as image:
+        return _downsample_image(image, width, height, resample, draft=True)
+
+
+def _downsample_image(image, width, height, resample, draft=False):
+    """
+    Downsample a PIL Image to colors for a grid of blocks.
+
+    Parameters are as for `_image_colors`, with `draft` True to let
+    PIL decode the image at a reduced size, which only works for an
+    image that was just opened.
+
+    """
+    src_width, src_height = image.size
+    if width is None and height is None:
+        width, height = src_width, src_height
+    elif width is None:
+        width = max(1, int(round(src_width * height / float(src_height))))
+    elif height is None:
+        height = max(1, int(round(src_height * width / float(src_width))))
+
+    if draft:
+        # JPEGs can be decoded at a fraction of their size, which is
+        # much faster and smaller for large photos
+        image.draft('RGB', (width, height))
+
+    if resample == 'area':
+        # box-average large images by a whole factor in PIL, leaving at
+        # least two pixels per block to average here. The few pixels
+        # past the last whole box on the right and bottom are left out.
+        factor = min(image.size[0] // width, image.size[1] // height) // 2
+        if factor > 1 and hasattr(image, 'reduce'):
+            box = (0, 0, image.size[0] - image.size[0] % factor,
+                   image.size[1] - image.size[1] % factor)
+            image = image.reduce(factor, box)
+
+    pixels = np.asarray(image.convert('RGB'))
+    src_height, src_width = pixels.shape[:2]
+
+    if resample == 'nearest':
+        rows = (np.arange(height) + 0.5) * src_height // height
+        cols = (np.arange(width) + 0.5) * src_width // width
+        return np.ascontiguousarray(
+            pixels[rows.astype(np.intp)][:, cols.astype(np.intp)])
+
+    # sum the pixels covered by each block in two passes, the first
+    # pixel covered by each block given by floor division
+    rows = np.arange(height) * src_height // height
+    cols = np.arange(width) * src_width // width
+    sums = np.add.reduceat(np.add.reduceat(pixels, rows, axis=0,
+                                           dtype=np.uint64),
+                           cols, axis=1)
+
+    # blocks smaller than a pixel get the pixel's color
+    counts = np.outer(np.maximum(np.diff(np.append(rows, src_height)), 1),
+                      np.maximum(np.diff(np.append(cols, src_width)), 1))
+
+    return _check_colors(sums / counts[..., np.newaxis])
+
+
+def _new_digest():
+    """
+    Make a hash object for `BlockGrid.content_digest`.
+
+    """
+    try:
+        return hashlib.blake2b(digest_size=20)
+    except AttributeError:
+        # Python < 3.6
+        return hashlib.sha1()
+
+
+def _arrays_equal(a, b):
+    """
+    Check whether two arrays have the same shape and elements, comparing
+    a few rows at a time so arrays that differ near their start are
+    found unequal without comparing all of their elements.
+
+    """
+    if a.shape != b.shape:
+        return False
+
+    if a.size == 0:
+        return True
+
+    if a.strides == b.strides and a.__array_interface__['data'][0] == \
+            b.__array_interface__['data'][0]:
+        # the same storage
+        return True
+
+    rows = max(1, _COMPARE_ELEMENTS // a[0].size)
+    for start in range(0, len(a), rows):
+        if not np.array_equal(a[start:start + rows], b[start:start + rows]):
+            return False
+
+    return True
+
+
+def _check_origin(origin):
+    """
+    Raise a ValueError if `origin` isn't a valid ImageGrid origin.
+
+    """
+    if origin not in ('lower-left', 'upper-left'):
+        s = "origin keyword must be one of {'lower-left', 'upper-left'}."
+        raise ValueError(s)
+
+
+def _int_to_slice(index):
+    """
+    Convert an integer index into a slice selecting only that item.
+
+    """
+    if index == -1:
+        return slice(index, None)
+    else:
+        return slice(index, index + 1)
+
+
+def _flip_slice(index, length):
+    """
+    Convert a slice of a sequence in reverse order into a slice of
+    the sequence that selects the same items in forward order.
+
+    This is how a slice of the rows of a lower-left origin ImageGrid,
+    which run bottom to top, is turned into a slice of its storage,
+    which runs top to bottom.
+
+    Parameters
+    ----------
+    index : slice
+    length : int
+        Length of the sequence.
+
+    Returns
+    -------
+    index : slice
+
+    """
+    start, stop, step = index.indices(length)
+
+    if step > 0:
+        count = max(0, (stop - start + step - 1) // step)
+    else:
+        count = max(0, (start - stop - step - 1) // -step)
+
+    if count == 0:
+        return slice(0, 0)
+
+    # the last item selected from the reversed sequence is the first
+    # one in forward order
+    first = length - 1 - (start + (count - 1) * step)
+    stop = first + count * step
+
+    return slice(first, stop if stop >= 0 else None, step)
+
+
 def _flatten(thing, ignore_types=(str,)):
     """
     Yield a single item or str/unicode or recursively yield from iterables.
@@ -252,6 +995,50 @@ def _get_code_cells(cells):
     return [In[x] for x in cells]
 
 
+class _GridStorage(object):
+    """
+    The arrays holding a grid's blocks, shared by the grid and its views.
+
+    Copy-on-write copies start out with read-only arrays that are
+    replaced here when the grid is first changed, so the grid and all
+    of its views move to the new arrays together. The array marking
+    changed blocks is only allocated once it is used.
+
+    """
+    __slots__ = ('colors', 'sizes', '_dirty')
+
+    def __init__(self, colors, sizes, dirty=None):
+        self.colors = colors
+        self.sizes = sizes
+        self._dirty = dirty
+
+    @property
+    def dirty(self):
+        if self._dirty is None:
+            self._dirty = np.zeros(self.sizes.shape, dtype=bool)
+        return self._dirty
+
+
+def _uniform_sizes(shape, block_size):
+    """
+    Read-only block sizes that are all `block_size`, without allocating
+    storage for every block until the sizes are changed.
+
+    """
+    return np.broadcast_to(np.int32(max(_SMALLEST_BLOCK, block_size)), shape)
+
+
+def _storage_property(name):
+    @property
+    def prop(self):
+        array = getattr(self._storage, name)
+        for index in self._index:
+            array = array[index]
+        return array
+
+    return prop
+
+
 class Block(object):
     """
     A colored square.
@@ -279,11 +1066,17 @@ class Block(object):
 
     """
 
-    red = _color_property('red')
-    green = _color_property('green')
-    blue = _color_property('blue')
+    # a Block in a grid keeps only the grid and its position in the
+    # grid's storage, a Block on its own keeps its color and size
+    __slots__ = ('_grid', '_row', '_col', '_red', '_green', '_blue', '_size')
+
+    red = _color_property(0)
+    green = _color_property(1)
+    blue = _color_property(2)
 
     def __init__(self, red, green, blue, size=20):
+        self._grid = None
+
         self.red = red
         self.green = green
         self.blue = blue
@@ -292,21 +1085,55 @@ class Block(object):
         self._row = None
         self._col = None
 
-    @staticmethod
-    def _check_value(value):
+    @classmethod
+    def _from_grid(cls, grid, row, col):
         """
-        Check that a value is a number and constrain it to [0 - 255].
+        Make a Block that is a view onto grid storage.
 
-        """
-        if not isinstance(value, numbers.Number):
-            s = 'value must be a number. got {0}.'.format(value)
+        Parameters
+        ----------
+        grid : BlockGrid
+            Grid whose storage holds the block.
+        row, col : int
+            Position of the block in the grid's storage.
+
+        """
+        block = cls.__new__(cls)
+        block._grid = grid
+        block._row = row
+        block._col = col
+        return block
+
+    def __getstate__(self):
+        return self.rgb, self.size, self.row, self.col
+
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            # pickled by ipythonblocks 1.9 or earlier
+            state = ((state['_red'], state['_green'], state['_blue']),
+                     state['_size'], state['_row'], state['_col'])
+
+        rgb, self._size, self._row, self._col = state
+        self._red, self._green, self._blue = rgb
+        self._grid = None
+
+    @staticmethod
+    def _check_value(value):
+        """
+        Check that a value is a number and constrain it to [0 - 255].
+
+        """
+        if not isinstance(value, numbers.Number):
+            s = 'value must be a number. got {0}.'.format(value)
             raise InvalidColorSpec(s)
 
         return int(round(min(255, max(0, value))))
 
     @property
     def rgb(self):
-        return (self._red, self._green, self._blue)
+        if self._grid is None:
+            return self._red, self._green, self._blue
+        return tuple(self._grid._colors[self._row, self._col].tolist())
 
     @rgb.setter
     def rgb(self, colors):
@@ -314,7 +1141,11 @@ class Block(object):
             s = 'Setting colors requires three values: (red, green, blue).'
             raise ValueError(s)
 
-        self.red, self.green, self.blue = colors
+        if self._grid is None:
+            self.red, self.green, self.blue = colors
+        else:
+            colors = [Block._check_value(x) for x in colors]
+            self._grid._set_block_colors(self._row, self._col, colors)
 
     @property
     def row(self):
@@ -326,11 +1157,17 @@ class Block(object):
 
     @property
     def size(self):
-        return self._size
+        if self._grid is None:
+            return self._size
+        return int(self._grid._sizes[self._row, self._col])
 
     @size.setter
     def size(self, size):
-        self._size = max(_SMALLEST_BLOCK, size)
+        size = max(_SMALLEST_BLOCK, size)
+        if self._grid is None:
+            self._size = size
+        else:
+            self._grid._set_block_size(self._row, self._col, size)
 
     def set_colors(self, red, green, blue):
         """
@@ -350,7 +1187,7 @@ class Block(object):
         if isinstance(other, Block):
             self.rgb = other.rgb
             self.size = other.size
-        elif isinstance(other, Sequence) and len(other) == 3:
+        elif isinstance(other, (Sequence, np.ndarray)) and len(other) == 3:
             self.rgb = other
         else:
             errmsg = (
@@ -365,10 +1202,10 @@ class Block(object):
         The HTML for a table cell with the background color of this Block.
 
         """
-        title = _TITLE.format(self._row, self._col,
-                              self._red, self._green, self._blue)
-        rgb = _RGB.format(self._red, self._green, self._blue)
-        return _TD.format(title, self._size, rgb)
+        red, green, blue = self.rgb
+        title = _TITLE.format(self.row, self.col, red, green, blue)
+        rgb = _RGB.format(red, green, blue)
+        return _TD.format(title, self.size, rgb)
 
     def _repr_html_(self):
         return _TABLE.format(uuid.uuid4(), 0, _TR.format(self._td))
@@ -385,13 +1222,11 @@ class Block(object):
 
     def __str__(self):
         s = ['{0}'.format(self.__class__.__name__),
-             'Color: ({0}, {1}, {2})'.format(self._red,
-                                             self._green,
-                                             self._blue)]
+             'Color: ({0}, {1}, {2})'.format(*self.rgb)]
 
         # add position information if we have it
         if self._row is not None:
-            s[0] += ' [{0}, {1}]'.format(self._row, self._col)
+            s[0] += ' [{0}, {1}]'.format(self.row, self.col)
 
         return os.linesep.join(s)
 
@@ -408,6 +1243,10 @@ class BlockGrid(object):
     """
     A grid of blocks whose colors can be individually controlled.
 
+    Grid colors are stored in a single ``(height, width, 3)`` uint8 array
+    and block sizes in a ``(height, width)`` array. The `Block` objects
+    returned by indexing are views onto that storage.
+
     Parameters
     ----------
     width : int
@@ -436,23 +1275,111 @@ class BlockGrid(object):
     lines_on : bool
         Whether lines are shown between blocks when the grid is displayed.
         This attribute can used to toggle the whether the lines appear.
+    css_classes : bool
+        Whether the displayed HTML styles blocks with one CSS class per
+        unique color instead of inline styles on every cell. This makes
+        the HTML for large grids much smaller. Set this on the class to
+        change the default for all grids.
+    tooltips : {'title', 'hover', None}
+        How the index and color of each block are shown when the mouse
+        is over it. 'title' writes them into every cell, 'hover' computes
+        them in the browser with a small script, and None leaves them out.
+        The last two make the HTML for large grids much smaller.
+        Set this on the class to change the default for all grids.
+    canvas_threshold : int or None
+        Grids with more blocks than this are displayed by drawing them on
+        an HTML canvas instead of building a table, which is much faster
+        for very large grids. Canvas drawing uses `block_size` for every
+        block and has no tooltips. None means always use a table.
+        Set this on the class to change the default for all grids.
+    animation_stats : AnimationStats or None
+        The number of frames shown and dropped, and the frames per
+        second achieved, by the last animation of this grid.
+    cache_stats : CacheStats
+        The number of times displaying or saving this grid reused output
+        cached since the grid was last changed, and the number of times
+        the output had to be rendered.
 
     """
 
+    _block_class = Block
+
+    css_classes = False
+    tooltips = 'title'
+    canvas_threshold = 200000
+    animation_stats = None
+
+    # views of the shared storage, after applying each index in _index
+    _colors = _storage_property('colors')
+    _sizes = _storage_property('sizes')
+    _dirty = _storage_property('dirty')
+
+    _display_options = ('css_classes', 'tooltips', 'canvas_threshold')
+
     def __init__(self, width, height, fill=(0, 0, 0),
                  block_size=20, lines_on=True):
         self._width = width
         self._height = height
         self._block_size = block_size
-        self.lines_on = lines_on
         self._initialize_grid(fill)
+        self.lines_on = lines_on
+
+    @classmethod
+    def _from_storage(cls, colors, sizes, block_size=20, lines_on=True):
+        """
+        Make a grid that uses the given arrays as its storage.
+
+        This bypasses ``__init__`` so no storage is allocated for colors
+        or block sizes.
+
+        Parameters
+        ----------
+        colors : ndarray
+            ``(height, width, 3)`` uint8 array of colors.
+        sizes : ndarray
+            ``(height, width)`` int32 array of block sizes.
+        block_size : int, optional
+        lines_on : bool, optional
+
+        """
+        grid = cls.__new__(cls)
+        grid._height, grid._width = sizes.shape
+        grid._block_size = block_size
+        grid._storage = _GridStorage(colors, sizes)
+        grid._index = ()
+        grid._version = np.zeros((), dtype=np.int64)
+        grid._shared = np.zeros((), dtype=bool)
+        grid._reset_cache()
+        grid.lines_on = lines_on
+
+        return grid
 
     def _initialize_grid(self, fill):
-        grid = [[Block(*fill, size=self._block_size)
-                for col in range(self.width)]
-                for row in range(self.height)]
+        fill = [Block._check_value(x) for x in fill]
+        if len(fill) != 3:
+            s = 'fill requires three values: (red, green, blue).'
+            raise ValueError(s)
 
-        self._grid = grid
+        colors = np.empty((self._height, self._width, 3), dtype=np.uint8)
+        colors[...] = fill
+
+        sizes = np.empty((self._height, self._width), dtype=np.int32)
+        sizes[...] = max(_SMALLEST_BLOCK, self._block_size)
+
+        # the storage also marks blocks changed since the last time
+        # changes were collected. views share it and index into it.
+        self._storage = _GridStorage(colors, sizes)
+        self._index = ()
+
+        # incremented by every change to the grid, shared with its views
+        # and blocks so rendered output can be cached against it
+        self._version = np.zeros((), dtype=np.int64)
+
+        # set once the colors are handed out as a writable array, after
+        # which they can change without the version or dirty blocks
+        # being updated
+        self._shared = np.zeros((), dtype=bool)
+        self._reset_cache()
 
     @property
     def width(self):
@@ -472,10 +1399,11 @@ class BlockGrid(object):
 
     @block_size.setter
     def block_size(self, size):
+        self._own_storage(colors=False)
         self._block_size = size
-
-        for block in self:
-            block.size = size
+        self._sizes[...] = max(_SMALLEST_BLOCK, size)
+        self._dirty[...] = True
+        self._version[...] += 1
 
     @property
     def lines_on(self):
@@ -488,26 +1416,119 @@ class BlockGrid(object):
             raise ValueError(s)
 
         self._lines_on = value
+        self._version[...] += 1
+
+    @property
+    def cache_stats(self):
+        return CacheStats(self._cache_hits, self._cache_misses)
+
+    def _reset_cache(self):
+        self._digest = None
+        self._cache = {}
+        self._cache_version = None
+        self._cache_hits = 0
+        self._cache_misses = 0
+
+    def _cached(self, key, render):
+        """
+        Get rendered output from the cache, or render and cache it if the
+        grid has changed since it was cached.
+
+        Parameters
+        ----------
+        key : tuple
+            Identifies the output and any options it was rendered with.
+        render : callable
+            Called with no arguments to render the output.
+
+        """
+        if self._shared:
+            # the colors may have been changed through an array
+            self._cache_misses += 1
+            return render()
+
+        version = int(self._version)
+        if version != self._cache_version:
+            self._cache.clear()
+            self._cache_version = version
+
+        if key in self._cache:
+            self._cache_hits += 1
+        else:
+            self._cache_misses += 1
+            self._cache[key] = render()
+
+        return self._cache[key]
 
     def __eq__(self, other):
         if not isinstance(other, BlockGrid):
             return False
         else:
-            # compare the underlying grids
-            return self._grid == other._grid
+            # compare the underlying storage
+            return (_arrays_equal(self._colors, other._colors) and
+                    _arrays_equal(self._sizes, other._sizes))
+
+    def content_digest(self):
+        """
+        A digest of everything that affects how the grid looks: its
+        shape, block size, whether lines are on, and the color and size
+        of every block. Grids that look the same have the same digest,
+        so it can be used to find duplicate grids or as a cache key.
+
+        The digest is cached until the grid changes.
+
+        Returns
+        -------
+        digest : str
+            Hexadecimal digest.
 
-    def _view_from_grid(self, grid):
         """
-        Make a new grid from a list of lists of Block objects.
+        version = int(self._version)
+        if self._digest is not None and self._digest[0] == version and \
+                not self._shared:
+            return self._digest[1]
+
+        h = _new_digest()
+        h.update(_DIGEST_HEADER.pack(self._width, self._height,
+                                     self._block_size, self._lines_on))
+        h.update(np.ascontiguousarray(self._colors))
+        h.update(np.ascontiguousarray(self._sizes, dtype='<i4'))
 
+        self._digest = (version, h.hexdigest())
+        return self._digest[1]
+
+    def _view_from_grid(self, index, storage=None):
         """
-        new_width = len(grid[0])
-        new_height = len(grid)
+        Make a new grid that shares this grid's storage.
 
-        new_BG = self.__class__(new_width, new_height,
-                                block_size=self._block_size,
-                                lines_on=self._lines_on)
-        new_BG._grid = grid
+        This bypasses ``__init__`` so nothing is allocated per block,
+        making views cheap regardless of their size.
+
+        Parameters
+        ----------
+        index : slice or tuple of slice
+            Index into this grid's storage arrays giving the view.
+        storage : _GridStorage, optional
+            Storage to use instead of this grid's, in which case `index`
+            is ignored.
+
+        """
+        new_BG = self.__class__.__new__(self.__class__)
+        if storage is None:
+            new_BG._storage = self._storage
+            new_BG._index = self._index + (index,)
+        else:
+            new_BG._storage = storage
+            new_BG._index = ()
+        new_BG._height, new_BG._width = new_BG._sizes.shape
+        new_BG._block_size = self._block_size
+        new_BG._lines_on = self._lines_on
+
+        for name in self._display_options:
+            setattr(new_BG, name, getattr(self, name))
+        new_BG._version = self._version
+        new_BG._shared = self._shared
+        new_BG._reset_cache()
 
         return new_BG
 
@@ -550,93 +1571,683 @@ class BlockGrid(object):
         ind_cat = self._categorize_index(index)
 
         if ind_cat == _SINGLE_ROW:
-            return self._view_from_grid([self._grid[index]])
+            # indexing a range raises an IndexError for rows that don't exist
+            range(self._height)[index]
+
+            return self._view_from_grid(_int_to_slice(index))
 
         elif ind_cat == _SINGLE_ITEM:
-            block = self._grid[index[0]][index[1]]
-            block._row, block._col = index
-            return block
+            # indexing a range checks bounds and wraps negative indices
+            return self._block_class._from_grid(
+                self, range(self._height)[index[0]],
+                range(self._width)[index[1]])
 
         elif ind_cat == _ROW_SLICE:
-            return self._view_from_grid(self._grid[index])
+            return self._view_from_grid(index)
 
         elif ind_cat == _DOUBLE_SLICE:
-            new_grid = self._get_double_slice(index)
-            return self._view_from_grid(new_grid)
+            return self._view_from_grid(self._double_slice_index(index))
 
     def __setitem__(self, index, value):
         thing = self[index]
 
-        if isinstance(value, BlockGrid):
-            if isinstance(thing, BlockGrid):
-                if thing.shape != value.shape:
-                    raise ShapeMismatch('Both sides of grid assignment must '
-                                        'have the same shape.')
-
-                for a, b in zip(thing, value):
-                    a._update(b)
-
-            else:
+        if isinstance(thing, Block):
+            if isinstance(value, BlockGrid):
                 raise TypeError('Cannot assign grid to single block.')
 
-        elif isinstance(value, (Iterable, Block)):
-            for b in _flatten(thing):
-                b._update(value)
+            elif isinstance(value, (Iterable, Block)):
+                thing._update(value)
+
+        # assignments to more than one block are done as a single
+        # write to the underlying storage
+        elif isinstance(value, BlockGrid):
+            if thing.shape != value.shape:
+                raise ShapeMismatch('Both sides of grid assignment must '
+                                    'have the same shape.')
+
+            self._own_storage()
+            thing._colors[...] = value._colors
+            thing._sizes[...] = value._sizes
+            thing._dirty[...] = True
+            thing._version[...] += 1
+
+        elif isinstance(value, Block):
+            self._own_storage()
+            thing._colors[...] = value.rgb
+            thing._sizes[...] = value.size
+            thing._dirty[...] = True
+            thing._version[...] += 1
+
+        elif isinstance(value, np.ndarray) and value.ndim == 3:
+            if value.shape != thing._colors.shape:
+                raise ShapeMismatch('Assigned arrays must have shape '
+                                    '(height, width, 3) matching the grid.')
+
+            self._own_storage(sizes=False)
+            thing._colors[...] = _check_colors(value)
+            thing._dirty[...] = True
+            thing._version[...] += 1
+
+        elif isinstance(value, Iterable):
+            if not isinstance(value, (Sequence, np.ndarray)) or \
+                    len(value) != 3:
+                errmsg = (
+                    'Value must be a Block or a sequence of 3 integers. '
+                    'Got {0!r}.'
+                )
+                raise ValueError(errmsg.format(value))
+
+            colors = _check_colors(value)
+            if colors.shape != (3,):
+                s = 'values must be numbers. got {0!r}.'.format(value)
+                raise InvalidColorSpec(s)
+
+            self._own_storage(sizes=False)
+            thing._colors[...] = colors
+            thing._dirty[...] = True
+            thing._version[...] += 1
+
+    def _double_slice_index(self, index):
+        """
+        Get the index into storage for a 2D slice.
 
-    def _get_double_slice(self, index):
+        Returns
+        -------
+        index : tuple of slice
+
+        """
         sl_height, sl_width = index
 
         if isinstance(sl_width, int):
-            if sl_width == -1:
-                sl_width = slice(sl_width, None)
-            else:
-                sl_width = slice(sl_width, sl_width + 1)
+            sl_width = _int_to_slice(sl_width)
 
         if isinstance(sl_height, int):
-            if sl_height == -1:
-                sl_height = slice(sl_height, None)
-            else:
-                sl_height = slice(sl_height, sl_height + 1)
+            sl_height = _int_to_slice(sl_height)
 
-        rows = self._grid[sl_height]
-        grid = [r[sl_width] for r in rows]
+        return sl_height, sl_width
 
-        return grid
+    def _iter_order(self, array):
+        """
+        View of `array`, one of the color, size, or changed block
+        storage arrays, with the blocks in the order they are iterated
+        over, row by row.
+
+        """
+        return array
 
     def __iter__(self):
-        for r in range(self.height):
-            for c in range(self.width):
-                yield self[r, c]
+        return _iter_blocks(self._block_class, self,
+                            range(self._height), range(self._width))
+
+    def iter_rgb(self):
+        """
+        Iterate over the colors of the blocks in the same order as
+        iterating over the grid, without making `Block` objects.
+
+        Yields
+        ------
+        rgb : tuple of int
+            The (red, green, blue) color of a block.
+
+        """
+        for colors in self._iter_order(self._colors):
+            for rgb in map(tuple, colors.tolist()):
+                yield rgb
+
+    def enumerate_rgb(self):
+        """
+        Iterate over the indices and colors of the blocks in the same
+        order as iterating over the grid, without making `Block` objects.
+
+        Yields
+        ------
+        i, j : int
+            Index of a block in the grid, such that ``grid[i, j]`` is
+            the block.
+        rgb : tuple of int
+            The (red, green, blue) color of the block.
+
+        """
+        for i, colors in enumerate(self._iter_order(self._colors)):
+            for j, rgb in enumerate(map(tuple, colors.tolist())):
+                yield i, j, rgb
+
+    def iter_rows(self):
+        """
+        Iterate over the rows of the grid from the top.
+
+        Yields
+        ------
+        row : ndarray
+            Read-only ``(width, 3)`` uint8 view of the colors of a row of
+            blocks. Use indexing to change the grid.
+
+        """
+        for row in self._colors:
+            row = row.view()
+            row.flags.writeable = False
+            yield row
+
+    def apply(self, func, vectorized=True):
+        """
+        Set the color of every block from a function of its index.
+
+        Parameters
+        ----------
+        func : callable
+            Called with the indices of the blocks, ``func(i, j)``, such
+            that ``grid[i, j]`` is the block. For a BlockGrid these are
+            the row and column, for an ImageGrid the x and y coordinates.
+            Should return colors as a tuple of (red, green, blue) values
+            or as an array with a last axis of length three. Values are
+            constrained to [0 - 255].
+        vectorized : bool, optional
+            If True `func` is called once with integer arrays of the
+            indices of all the blocks. Otherwise it is called with the
+            index of each block in turn.
+
+        """
+        self._own_storage(sizes=False)
+        colors = self._iter_order(self._colors)
+        shape = colors.shape[:2]
+
+        if vectorized:
+            i, j = np.indices(shape)
+            new = _colors_from_result(func(i, j), shape)
+        else:
+            new = _colors_from_result(
+                [func(i, j) for i in range(shape[0]) for j in range(shape[1])],
+                shape, per_block=True)
+
+        self._write_colors(colors, new)
+
+    def map(self, func, vectorized=True):
+        """
+        Change the color of every block with a function of its color.
+
+        Parameters
+        ----------
+        func : callable
+            Called with the colors of the blocks, ``func(red, green, blue)``,
+            and should return new colors as a tuple of (red, green, blue)
+            values or as an array with a last axis of length three.
+            Values are constrained to [0 - 255].
+        vectorized : bool, optional
+            If True `func` is called once with integer arrays of the
+            colors of all the blocks. Otherwise it is called with the
+            color of each block in turn.
 
-    def animate(self, stop_time=0.2):
+        """
+        self._own_storage(sizes=False)
+        colors = self._iter_order(self._colors)
+
+        if vectorized:
+            channels = colors.astype(int)
+            new = _colors_from_result(
+                func(channels[..., 0], channels[..., 1], channels[..., 2]),
+                colors.shape[:2])
+        else:
+            new = _colors_from_result(
+                [func(*rgb) for rgb in self.iter_rgb()], colors.shape[:2],
+                per_block=True)
+
+        self._write_colors(colors, new)
+
+    def _write_colors(self, colors, new):
+        """
+        Write `new` colors to `colors`, a view of the grid's colors,
+        marking the blocks that change.
+
+        """
+        changed = (colors != new).any(axis=-1)
+        colors[...] = new
+
+        dirty = self._iter_order(self._dirty)
+        dirty |= changed
+        self._version[...] += 1
+
+    def _set_block_colors(self, row, col, colors, channel=None):
+        """
+        Set the color of the block at a position in storage, all three
+        channels or only `channel`, for `Block`.
+
+        """
+        self._own_storage(sizes=False)
+        if channel is None:
+            self._colors[row, col] = colors
+        else:
+            self._colors[row, col, channel] = colors
+        self._dirty[row, col] = True
+        self._version[...] += 1
+
+    def _set_block_size(self, row, col, size):
+        """
+        Set the size of the block at a position in storage, for `Block`.
+
+        """
+        self._own_storage(colors=False)
+        self._sizes[row, col] = size
+        self._dirty[row, col] = True
+        self._version[...] += 1
+
+    @classmethod
+    def from_function(cls, width, height, func, vectorized=True, **kwargs):
+        """
+        Make a new grid with block colors given by a function of their
+        index, like ``numpy.fromfunction``.
+
+        Parameters
+        ----------
+        width, height : int
+            Size of the grid.
+        func : callable
+            Called with the indices of the blocks, see `apply`.
+        vectorized : bool, optional
+            Whether to call `func` once with arrays of all the indices
+            or once for each block, see `apply`.
+        kwargs
+            Other arguments for making the grid, such as `block_size`.
+
+        Returns
+        -------
+        grid : BlockGrid
+
+        """
+        grid = cls(width, height, **kwargs)
+        grid.apply(func, vectorized)
+
+        return grid
+
+    def to_array(self, copy=False):
+        """
+        Get the colors of the grid as a NumPy array indexed like the grid,
+        so ``colors[i, j]`` is the color of ``grid[i, j]``.
+
+        Parameters
+        ----------
+        copy : bool, optional
+            If False the array is a view of the grid's colors and
+            changing it changes the grid. If True it is a copy.
+
+        Returns
+        -------
+        colors : ndarray
+            uint8 array of colors, ``(height, width, 3)`` for a BlockGrid
+            and ``(width, height, 3)`` for an ImageGrid.
+
+        Notes
+        -----
+        Once the colors have been handed out as a view the grid cannot
+        tell when they change, so it no longer caches its HTML, images,
+        and text and animations send every block with each frame.
+        ``np.asarray(grid)`` gives a read-only view that doesn't have
+        this cost.
+
+        """
+        if copy:
+            return self._iter_order(self._colors).copy()
+
+        self._own_storage(sizes=False)
+        self._shared[...] = True
+        return self._iter_order(self._colors).view()
+
+    def __array__(self, dtype=None, copy=None):
+        if copy:
+            colors = self.to_array(copy=True)
+        else:
+            # read-only so the grid can keep caching, changing colors
+            # in place needs to_array
+            colors = self._iter_order(self._colors).view()
+            colors.flags.writeable = False
+
+        if dtype is not None and np.dtype(dtype) != colors.dtype:
+            if copy is False:
+                raise ValueError('Grid colors are uint8 and cannot be '
+                                 'converted to {0} without a copy.'.format(
+                                     np.dtype(dtype)))
+            colors = colors.astype(dtype)
+
+        return colors
+
+    @classmethod
+    def from_array(cls, arr, copy=False, **kwargs):
+        """
+        Make a new grid with colors from an array indexed like the grid,
+        as from `to_array`.
+
+        Parameters
+        ----------
+        arr : array_like
+            Array of colors, ``(height, width, 3)`` for a BlockGrid
+            and ``(width, height, 3)`` for an ImageGrid. Values are
+            constrained to [0 - 255].
+        copy : bool, optional
+            If False and `arr` is a uint8 array the grid uses it as its
+            storage, so changing either changes the other. Otherwise the
+            grid gets a copy of the colors.
+        kwargs
+            Other arguments for making the grid, such as `block_size`.
+
+        Returns
+        -------
+        grid : BlockGrid
+
+        """
+        arr = np.asarray(arr)
+        if arr.ndim != 3 or arr.shape[2] != 3:
+            raise ShapeMismatch('Color arrays must have three dimensions '
+                                'with a last axis of length three.')
+
+        shared = not copy and arr.dtype == np.uint8
+        if copy and arr.dtype == np.uint8:
+            arr = arr.copy()
+        else:
+            arr = _check_colors(arr)
+
+        grid = cls._from_array(arr, **kwargs)
+        grid._shared[...] = shared
+
+        return grid
+
+    @classmethod
+    def from_image(cls, image, width=None, height=None, resample='area',
+                   **kwargs):
+        """
+        Make a new grid from an image, downsampled to the size of the grid.
+
+        The image is shown the right way up. For an ImageGrid with a
+        lower-left origin pixel (0, 0) is the bottom left of the image.
+
+        Parameters
+        ----------
+        image : str, file, or PIL Image
+            Image or name of an image file to read with PIL. Large
+            JPEG files are decoded at a reduced size where possible.
+        width, height : int, optional
+            Size of the grid, at least one block. If only one is given
+            the other keeps the aspect ratio of the image. If neither is
+            given there is one block per pixel.
+        resample : {'area', 'nearest'}, optional
+            Color blocks with the average of the pixels they cover or
+            with the pixel nearest their center.
+        kwargs
+            Other arguments for making the grid, such as `block_size`.
+
+        Returns
+        -------
+        grid : BlockGrid
+
+        """
+        colors = _image_colors(image, width, height, resample)
+
+        grid = cls(colors.shape[1], colors.shape[0], **kwargs)
+        grid._colors[...] = colors
+
+        return grid
+
+    @classmethod
+    def _from_array(cls, colors, block_size=20, lines_on=True):
+        """
+        Make a grid using `colors`, indexed like the grid, as its storage.
+
+        """
+        sizes = _uniform_sizes(colors.shape[:2], block_size)
+
+        return cls._from_storage(colors, sizes, block_size, lines_on)
+
+    def animate(self, stop_time=0.2, delta=False, fps=None, record=None):
         """
         Call this method in a loop definition to have your changes to the grid
         animated in the IPython Notebook.
 
+        Frames are shown on a fixed schedule: the time taken to display
+        each frame and run the loop body is subtracted from the wait, and
+        frames are dropped when the animation falls a frame behind.
+        When the loop ends the grid's `animation_stats` are updated.
+
         Parameters
         ----------
         stop_time : float
-            Amount of time to pause between loop steps.
+            Amount of time between loop steps.
+        delta : bool, optional
+            If True the grid is displayed once and each step sends only
+            the blocks that changed, which is much less data for large
+            grids.
+        fps : float, optional
+            Target frames per second. Overrides `stop_time`.
+        record : str or AnimationWriter, optional
+            Record every step of the animation, including any frames
+            dropped from the display, to an animated GIF or PNG file with
+            this name, or to an `AnimationWriter`. A writer passed in here
+            is left open so more frames can be added to it.
+
+        """
+        interval = 1.0 / fps if fps else stop_time
+
+        if delta:
+            steps = self._animate_delta(interval)
+        else:
+            steps = self._animate_frames(interval)
+
+        if record is None:
+            return steps
+        else:
+            return self._record_steps(steps, record, interval)
+
+    def _record_steps(self, steps, record, interval):
+        if isinstance(record, AnimationWriter):
+            writer = record
+        else:
+            writer = AnimationWriter(record, duration=interval)
+
+        try:
+            for block in steps:
+                writer.add_frame(self)
+                yield block
+            writer.add_frame(self)
+        except GeneratorExit:
+            # the loop was left early, record where it stopped
+            writer.add_frame(self)
+            raise
+        finally:
+            if writer is not record:
+                writer.close()
+
+    def _animate_frames(self, interval):
+        clock = _FrameClock(interval)
+        handle = None
+        finished = False
+        try:
+            for block in self:
+                if clock.tick():
+                    handle = _display_frame(self._repr_html_(), handle)
+                clock.wait()
+                yield block
+            _display_frame(self._repr_html_(), handle)
+            finished = True
+        finally:
+            # also when the loop is left early or raises
+            self.animation_stats = clock.stats(final=finished)
+
+    def _animate_delta(self, interval):
+        table_id = uuid.uuid4()
+        grid = display(HTML(self._html(table_id) + _DELTA_FUNCTION),
+                       display_id=True)
+        self._dirty[...] = False
+
+        clock = _FrameClock(interval)
+        handle = None
+        finished = False
+        try:
+            for block in self:
+                # changes in dropped frames carry over to the next one
+                if clock.tick():
+                    changes = self._pop_changes()
+                    if changes and grid is None:
+                        # no kernel to update outputs in place
+                        display(HTML(self._repr_html_()))
+                    elif changes:
+                        handle = _display_frame(
+                            self._delta_html(table_id, changes), handle)
+                clock.wait()
+                yield block
+
+            if grid is None:
+                display(HTML(self._repr_html_()))
+            else:
+                # put the final frame in the grid output and drop the
+                # last update so saved notebooks show the final grid
+                grid.update(HTML(self._html(table_id)))
+                if handle is not None:
+                    handle.update(HTML(''))
+            finished = True
+        finally:
+            # also when the loop is left early or raises
+            self.animation_stats = clock.stats(final=finished)
+
+    def _pop_changes(self):
+        """
+        Collect the blocks changed since the last call and mark them
+        as unchanged.
+
+        Returns
+        -------
+        changes : list of int
+            Flat list of (row, column, color, size) for each changed block,
+            with row and column in storage order and the color packed
+            as 0xRRGGBB.
+
+        """
+        if self._shared:
+            # the colors may have been changed through an array
+            self._dirty[...] = True
+
+        rows, cols = np.nonzero(self._dirty)
+        colors = self._colors[rows, cols].astype(np.int64)
+        packed = (colors[:, 0] << 16) | (colors[:, 1] << 8) | colors[:, 2]
+        self._dirty[...] = False
+
+        return np.column_stack(
+            (rows, cols, packed, self._sizes[rows, cols])).ravel().tolist()
+
+    def _delta_html(self, table_id, changes):
+        """
+        HTML with a script that applies `changes`, as from `_pop_changes`,
+        to the grid displayed with `table_id`.
+
+        """
+        return _DELTA_SCRIPT.format(
+            table_id, self._block_size + int(self._lines_on),
+            int(self._lines_on), ','.join(map(str, changes)))
+
+    def _html_labels(self):
+        """
+        The index shown in the title of each cell, as nested lists
+        in the same order as storage.
+
+        """
+        cols = [', {0}'.format(c) for c in range(self._width)]
+        return [[row + col for col in cols]
+                for row in map(str, range(self._height))]
+
+    def _hover_index(self):
+        """
+        JavaScript expression for the index of a cell in its tooltip,
+        given its zero-based table position in ``row`` and ``col``.
 
         """
-        for block in self:
-            self.show()
-            time.sleep(stop_time)
-            yield block
-            clear_output(wait=True)
-        self.show()
+        return 'row + ", " + col'
+
+    def _canvas_html(self, table_id):
+        """
+        HTML that draws the grid on a canvas, with the colors sent as
+        base64 encoded bytes.
+
+        """
+        px_width, px_height = self._calc_image_size()
+        data = self._cached(('canvas',), lambda: base64.b64encode(
+            np.ascontiguousarray(self._colors).tobytes()).decode('ascii'))
+
+        return _CANVAS.format(
+            table_id, px_width, px_height, self._width, self._height,
+            self._block_size + int(self._lines_on), int(self._lines_on),
+            data)
 
     def _repr_html_(self):
-        rows = range(self._height)
-        cols = range(self._width)
+        return self._html(uuid.uuid4())
+
+    def _html(self, table_id):
+        """
+        HTML for displaying the grid as a table, or on a canvas if the grid
+        is larger than `canvas_threshold`.
+
+        Parameters
+        ----------
+        table_id
+            Unique ID of the displayed grid, used to find it in the page.
+
+        """
+        if self.canvas_threshold is not None and \
+                self._width * self._height > self.canvas_threshold:
+            return self._canvas_html(table_id)
+
+        if self.tooltips not in _TOOLTIPS:
+            s = "tooltips must be one of 'title', 'hover', or None."
+            raise ValueError(s)
+
+        # the table rows don't depend on table_id so they can be cached
+        # and reused each time the grid is displayed.
+        css_classes = bool(self.css_classes)
+        blocks, html = self._cached(
+            ('table', css_classes, self.tooltips),
+            lambda: self._table_rows(css_classes, self.tooltips))
+
+        if not css_classes:
+            html = _TABLE.format(table_id, int(self._lines_on), html)
+
+        else:
+            # one class per unique block, with the grid's block size set
+            # once for every cell and overridden only where it differs.
+            size = max(_SMALLEST_BLOCK, self._block_size)
+            styles = ''.join(
+                (_CSS_CLASS if b[3] == size else _CSS_CLASS_SIZED).format(
+                    table_id, i, *b)
+                for i, b in enumerate(blocks))
+            html = _TABLE_CLASSES.format(
+                table_id, int(self._lines_on), html, size, styles)
+
+        if self.tooltips == 'hover':
+            html += _HOVER_SCRIPT.format(table_id, self._hover_index())
+
+        return html
+
+    def _table_rows(self, css_classes, tooltips):
+        """
+        Render the rows of the grid's table.
 
-        html = reduce(iadd,
-                      (_TR.format(reduce(iadd,
-                                         (self[r, c]._td
-                                          for c in cols)))
-                       for r in rows))
+        Returns
+        -------
+        blocks : list of tuple
+            Unique ``(red, green, blue, size)`` tuples. With `css_classes`
+            the cells of each block use the class ``c`` plus its index.
+        html : str
 
-        return _TABLE.format(uuid.uuid4(), int(self._lines_on), html)
+        """
+        blocks, inverse = _unique_blocks(self._colors, self._sizes)
+
+        if tooltips == 'title':
+            labels = self._html_labels()
+        else:
+            labels = None
+
+        if not css_classes:
+            td = _TD_TAIL if labels else _TD_STYLE
+            tails = [td.format(*b) for b in blocks]
+        else:
+            td = _TD_CLASS_TAIL if labels else _TD_CLASS
+            tails = [td.format(i, *b) for i, b in enumerate(blocks)]
+
+        return blocks, _render_rows(tails, inverse, labels)
 
     def __str__(self):
         s = ['{0}'.format(self.__class__.__name__),
@@ -644,12 +2255,101 @@ class BlockGrid(object):
 
         return os.linesep.join(s)
 
-    def copy(self):
+    def copy(self, copy_on_write=False):
         """
         Returns an independent copy of this BlockGrid.
 
+        Parameters
+        ----------
+        copy_on_write : bool, optional
+            If True the copy shares storage with this grid, and with
+            other copies made this way since the grid was last changed.
+            The storage is copied by whichever grid is changed first.
+            This makes snapshots cheap when few of them are changed.
+
+        """
+        if copy_on_write:
+            colors, sizes = self._frozen_storage()
+        else:
+            colors, sizes = self._colors.copy(), self._sizes.copy()
+
+        new = self._view_from_grid(None, _GridStorage(colors, sizes))
+        new._version = np.zeros((), dtype=np.int64)
+        new._shared = np.zeros((), dtype=bool)
+
+        return new
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    def __getstate__(self):
+        # views are saved with their own arrays, and the weakly held
+        # snapshot and cached output are left out to be remade
+        state = dict((name, value) for name, value in self.__dict__.items()
+                     if name not in _UNPICKLED_ATTRS)
+        state['_colors'] = self._colors
+        state['_sizes'] = self._sizes
+        if self._storage._dirty is not None:
+            state['_dirty'] = self._dirty
+
+        return state
+
+    def __setstate__(self, state):
+        state = dict(state)
+
+        if '_grid' in state:
+            # pickled by ipythonblocks 1.9 or earlier, with a list of
+            # rows of Blocks in the same order as the storage
+            blocks = state.pop('_grid')
+            shape = (state['_height'], state['_width'])
+            state['_colors'] = np.array(
+                [[block.rgb for block in row] for row in blocks],
+                dtype=np.uint8).reshape(shape + (3,))
+            state['_sizes'] = np.array(
+                [[block.size for block in row] for row in blocks],
+                dtype=np.int32).reshape(shape)
+            state['_version'] = np.zeros((), dtype=np.int64)
+            state['_shared'] = np.zeros((), dtype=bool)
+
+        self._storage = _GridStorage(state.pop('_colors'),
+                                     state.pop('_sizes'),
+                                     state.pop('_dirty', None))
+        self._index = ()
+        self.__dict__.update(state)
+        self._reset_cache()
+
+    def _frozen_storage(self):
         """
-        return copy.deepcopy(self)
+        Color and size storage for a copy-on-write copy.
+
+        The storage is made read-only and shared with the copy, so the
+        first of them to be changed copies it.
+
+        """
+        if self._shared:
+            # the colors can be changed through an array handed out
+            # earlier, so the copy can't share them
+            return self._colors.copy(), self._sizes.copy()
+
+        storage = self._storage
+        storage.colors.flags.writeable = False
+        storage.sizes.flags.writeable = False
+
+        return self._colors, self._sizes
+
+    def _own_storage(self, colors=True, sizes=True):
+        """
+        Give a grid with read-only storage, shared with copy-on-write
+        copies or block sizes that are all the same, its own colors
+        and/or sizes before anything can change them. Views share the
+        storage, so this also covers them.
+
+        """
+        storage = self._storage
+        if colors and not storage.colors.flags.writeable:
+            storage.colors = storage.colors.copy()
+        if sizes and not storage.sizes.flags.writeable:
+            storage.sizes = storage.sizes.copy()
 
     def show(self):
         """
@@ -664,8 +2364,9 @@ class BlockGrid(object):
 
         Useful for making an animation or iteratively displaying changes.
 
-        Note that this will leave the grid in place until something replaces
-        it in the same cell. You can use the ``clear`` function to
+        Each call from the same cell replaces the previously flashed grid
+        in place. Note that this will leave the grid in place after
+        the animation. You can use the ``clear`` function to
         manually clear output.
 
         Parameters
@@ -674,9 +2375,18 @@ class BlockGrid(object):
             Amount of time, in seconds, to display the grid.
 
         """
-        self.show()
-        time.sleep(display_time)
-        clear_output(wait=True)
+        cell = _execution_count()
+        if cell is None or cell != _flash_frame['cell']:
+            _flash_frame['handle'] = None
+
+        # the time taken to display the grid counts toward display_time
+        start = _now()
+        _flash_frame['cell'] = cell
+        _flash_frame['handle'] = _display_frame(
+            self._repr_html_(), _flash_frame['handle'])
+        delay = display_time - (_now() - start)
+        if delay > 0:
+            time.sleep(delay)
 
     def _calc_image_size(self):
         """
@@ -695,12 +2405,101 @@ class BlockGrid(object):
             px_width += self._width + 1
             px_height += self._height + 1
 
-        return px_width, px_height
+        return px_width, px_height
+
+    def _image_array(self, blocks=None, line=255):
+        """
+        Expand per-block values to an image of the grid.
+
+        Parameters
+        ----------
+        blocks : ndarray, optional
+            ``(height, width, ...)`` array of the pixel value for each
+            block. Defaults to the grid colors.
+        line : optional
+            Pixel value of the lines between blocks, white by default.
+
+        Returns
+        -------
+        pixels : ndarray
+            ``(px_height, px_width, ...)`` array of pixel values.
+
+        """
+        if blocks is None:
+            blocks = self._colors
+
+        px_width, px_height = self._calc_image_size()
+        step = self._block_size + int(self._lines_on)
+        height, width = self._height, self._width
+        depth = blocks.shape[2:]
+
+        # each block fills a step x step square, and with lines on the
+        # first row and column of each square and the far edges of the
+        # image are lines. build one pixel row per row of blocks and then
+        # copy it down the rows of its squares.
+        rows = np.empty((height, px_width) + depth, dtype=blocks.dtype)
+        block_rows = rows[:, :width * step]
+        block_rows.reshape((height, width, step) + depth)[...] = \
+            blocks[:, :, np.newaxis]
+
+        if self._lines_on:
+            rows[:, ::step] = line
+
+        pixels = np.empty((px_height, px_width) + depth, dtype=blocks.dtype)
+        block_pixels = pixels[:height * step]
+        block_pixels.reshape((height, step, px_width) + depth)[...] = \
+            rows[:, np.newaxis]
+
+        if self._lines_on:
+            pixels[::step] = line
+
+        return pixels
+
+    def _palette_image_array(self):
+        """
+        Make an image of the grid as indices into a palette of colors.
+
+        Returns
+        -------
+        pixels : ndarray or None
+            ``(px_height, px_width)`` uint8 array of palette indices, or
+            None if the image has more than 256 colors.
+        palette : ndarray or None
+            ``(n_colors, 3)`` uint8 array of palette colors.
+
+        """
+        colors = self._colors.astype(np.uint32)
+        packed = ((colors[..., 0] << 16) | (colors[..., 1] << 8) |
+                  colors[..., 2])
+        uniq, inverse = np.unique(packed, return_inverse=True)
+
+        # white is the largest packed color, so it can go on the end
+        # of the sorted colors for the lines.
+        if self._lines_on and (len(uniq) == 0 or uniq[-1] != 0xffffff):
+            uniq = np.append(uniq, 0xffffff)
+
+        if len(uniq) > 256:
+            return None, None
+
+        palette = np.column_stack(
+            ((uniq >> 16) & 255, (uniq >> 8) & 255, uniq & 255))
+        inverse = inverse.reshape(packed.shape).astype(np.uint8)
+
+        return (self._image_array(inverse, line=len(uniq) - 1),
+                palette.astype(np.uint8))
 
-    def _write_image(self, fp, format='png'):
+    def _write_image(self, fp, format='png', compress_level=None,
+                     strategy=None):
         """
         Write an image of the current grid to a file-object.
 
+        PNG images of grids with no more than 256 colors are written
+        with a palette, which makes them much smaller. When a compression
+        level or strategy is given the palette image can come out larger,
+        at low levels or with ``zlib.Z_RLE`` for example, so the smaller
+        of the palette and RGB images is written. PNG bytes are cached
+        until the grid is changed.
+
         Parameters
         ----------
         fp : file-like
@@ -709,39 +2508,91 @@ class BlockGrid(object):
         format : str, optional
             An image format that will be understood by PIL,
             e.g. 'png', 'jpg', 'gif', etc.
+        compress_level : int, optional
+            PNG zlib compression level from 0 (none) to 9 (smallest).
+        strategy : int, optional
+            PNG zlib compression strategy, e.g. ``zlib.Z_RLE``.
+
+        """
+        if format.lower() == 'png':
+            fp.write(self._cached(
+                ('png', compress_level, strategy),
+                lambda: self._png_bytes(compress_level, strategy)))
+        else:
+            self._pil_image(palette=False).save(fp, format=format)
+
+    def _pil_image(self, palette=True):
+        """
+        Make a PIL image of the grid.
+
+        Parameters
+        ----------
+        palette : bool, optional
+            Whether to make a palette image if the grid has no more than
+            256 colors. Otherwise the image is RGB.
 
         """
         try:
             # PIL
             import Image
-            import ImageDraw
         except ImportError:
             # pillow
-            from PIL import Image, ImageDraw
+            from PIL import Image
 
-        im = Image.new(
-            mode='RGB', size=self._calc_image_size(), color=(255, 255, 255))
-        draw = ImageDraw.Draw(im)
+        pixels = None
+        if palette:
+            pixels, colors = self._palette_image_array()
 
-        _bs = self._block_size
+        if pixels is not None:
+            height, width = pixels.shape
+            im = Image.frombytes('P', (width, height), pixels.tobytes())
+            im.putpalette(colors.ravel().tolist())
+        else:
+            im = Image.fromarray(self._image_array())
 
-        for r in range(self._height):
-            for c in range(self._width):
-                px_r = r * _bs
-                px_c = c * _bs
-                if self._lines_on:
-                    px_r += r + 1
-                    px_c += c + 1
+        return im
 
-                rect = ((px_c, px_r), (px_c + _bs - 1, px_r + _bs - 1))
-                draw.rectangle(rect, fill=self._grid[r][c].rgb)
+    def _png_bytes(self, compress_level=None, strategy=None):
+        """
+        Encode an image of the grid as PNG.
 
-        im.save(fp, format=format)
+        Returns
+        -------
+        png : bytes
 
-    def show_image(self):
+        """
+        options = {}
+        if compress_level is not None:
+            options['compress_level'] = compress_level
+        if strategy is not None:
+            options['compress_type'] = strategy
+
+        fp = io.BytesIO()
+        im = self._pil_image()
+        im.save(fp, format='png', **options)
+        png = fp.getvalue()
+
+        if options and im.mode == 'P':
+            # palette images are usually smaller, but not with every
+            # compression option
+            fp = io.BytesIO()
+            self._pil_image(palette=False).save(fp, format='png', **options)
+            if fp.tell() < len(png):
+                png = fp.getvalue()
+
+        return png
+
+    def show_image(self, compress_level=None, strategy=None):
         """
         Embed grid in the notebook as a PNG image.
 
+        Parameters
+        ----------
+        compress_level : int, optional
+            zlib compression level from 0 (none) to 9 (smallest).
+        strategy : int, optional
+            zlib compression strategy, e.g. ``zlib.Z_RLE``.
+
         """
         if sys.version_info[0] == 2:
             from StringIO import StringIO as BytesIO
@@ -749,10 +2600,11 @@ class BlockGrid(object):
             from io import BytesIO
 
         im = BytesIO()
-        self._write_image(im)
+        self._write_image(im, compress_level=compress_level,
+                          strategy=strategy)
         display(ipyImage(data=im.getvalue(), format='png'))
 
-    def save_image(self, filename):
+    def save_image(self, filename, compress_level=None, strategy=None):
         """
         Save an image representation of the grid to a file.
         Image format will be inferred from file extension.
@@ -761,12 +2613,129 @@ class BlockGrid(object):
         ----------
         filename : str
             Name of file to save to.
+        compress_level : int, optional
+            For PNG images, the zlib compression level from
+            0 (none) to 9 (smallest).
+        strategy : int, optional
+            For PNG images, the zlib compression strategy,
+            e.g. ``zlib.Z_RLE``.
+
+        """
+        with open(filename, 'wb') as f:
+            self._write_image(f, format=filename.split('.')[-1],
+                              compress_level=compress_level,
+                              strategy=strategy)
+
+    def save(self, filename):
+        """
+        Save the grid to a compact binary file that can be read back
+        with `load`.
+
+        The file has a short header followed by the raw RGB bytes of
+        the grid colors, and block sizes if they are not all the same.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the file to write. Will be overwritten if it
+            already exists.
 
         """
+        origin = getattr(self, '_origin', None)
+        has_sizes = not (
+            self._sizes == max(_SMALLEST_BLOCK, self._block_size)).all()
+
+        header = _GRID_HEADER.pack(
+            _GRID_MAGIC, _GRID_FORMAT, int(isinstance(self, ImageGrid)),
+            _GRID_ORIGINS.index(origin), int(self._lines_on),
+            int(has_sizes), self._width, self._height, self._block_size)
+
         with open(filename, 'wb') as f:
-            self._write_image(f, format=filename.split('.')[-1])
+            f.write(header)
+            _write_array(f, self._colors)
+            if has_sizes:
+                f.write(b'\0' * (-f.tell() % 4))
+                _write_array(f, self._sizes.astype('<i4', copy=False))
+
+    @classmethod
+    def load(cls, filename, mmap=False):
+        """
+        Load a grid saved with `save`.
+
+        The returned grid is of the class it was saved from, or of the
+        class this is called on if that is a subclass of it. A grid
+        saved from a BlockGrid and loaded as an ImageGrid has the
+        default lower-left origin.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the file to read.
+        mmap : bool, optional
+            If True the grid colors, and block sizes if the file has
+            them, are memory-mapped from the file instead of being read
+            into memory. Only the parts of the file that are used are
+            read, which makes it possible to work with grids larger
+            than memory. Changes to the grid are not written to the
+            file, use `save` for that. Block sizes that are all the same
+            are not stored in the file and take no memory until they are
+            changed.
+
+        Returns
+        -------
+        grid : BlockGrid or ImageGrid
+
+        """
+        with open(filename, 'rb') as f:
+            header = f.read(_GRID_HEADER.size)
+
+            if len(header) != _GRID_HEADER.size or \
+                    header[:len(_GRID_MAGIC)] != _GRID_MAGIC:
+                s = '{0} is not a saved grid file.'.format(filename)
+                raise ValueError(s)
+
+            (_, fmt, cls_index, origin_index, lines_on, has_sizes,
+             width, height, block_size) = _GRID_HEADER.unpack(header)
+
+            if fmt != _GRID_FORMAT:
+                s = 'Unsupported grid file format version {0}.'.format(fmt)
+                raise ValueError(s)
+
+            n_colors = height * width * 3
+            sizes_offset = _GRID_HEADER.size + n_colors
+            sizes_offset += -sizes_offset % 4
+
+            if mmap:
+                colors = np.memmap(f, dtype=np.uint8, mode='c',
+                                   offset=_GRID_HEADER.size,
+                                   shape=(height, width, 3))
+                if has_sizes:
+                    sizes = np.memmap(f, dtype='<i4', mode='c',
+                                      offset=sizes_offset,
+                                      shape=(height, width))
+            else:
+                colors = _read_array(f, np.uint8, (height, width, 3))
+                if has_sizes:
+                    f.seek(sizes_offset)
+                    sizes = _read_array(f, '<i4', (height, width))
+
+        if not has_sizes:
+            sizes = _uniform_sizes((height, width), block_size)
+
+        saved_cls = (BlockGrid, ImageGrid)[cls_index]
+        if not issubclass(cls, saved_cls):
+            cls = saved_cls
+
+        options = {}
+        if issubclass(cls, ImageGrid):
+            # grids saved from a BlockGrid have no origin, their storage
+            # is loaded into an ImageGrid with the default origin
+            options['origin'] = _GRID_ORIGINS[origin_index] or 'lower-left'
+
+        return cls._from_storage(
+            colors, sizes, block_size, bool(lines_on), **options)
 
-    def to_text(self, filename=None):
+    def to_text(self, filename=None, fill=None):
         """
         Write a text file containing the size and block color information
         for this grid.
@@ -777,26 +2746,138 @@ class BlockGrid(object):
         ----------
         filename : str, optional
             File into which data will be written. Will be overwritten if
-            it already exists.
+            it already exists. The file is compressed with gzip if the
+            name ends with '.gz'.
+        fill : tuple of int, optional
+            Initial color written into the file. Blocks of this color are
+            left out, which makes files of mostly one color much smaller.
+            By default the initial color is black and all blocks are
+            written.
 
         """
+        if fill is not None:
+            fill = tuple(Block._check_value(x) for x in fill)
+
+        # keep the text of smaller grids for writing them again
+        if self._width * self._height <= _TEXT_CACHE_BLOCKS:
+            parts = [self._cached(
+                ('text', fill), lambda: ''.join(self._text_parts(fill)))]
+        else:
+            parts = self._text_parts(fill)
+
         if filename:
-            f = open(filename, 'w')
+            with _open_text(filename, 'w') as f:
+                for part in parts:
+                    f.write(part)
         else:
-            f = sys.stdout
+            for part in parts:
+                sys.stdout.write(part)
+
+    def _text_parts(self, fill=None):
+        """
+        Generate the text written by `to_text` a few thousand lines
+        at a time.
 
+        """
         s = ['# width height', '{0} {1}'.format(self.width, self.height),
              '# block size', '{0}'.format(self.block_size),
-             '# initial color', '0 0 0',
+             '# initial color', '{0} {1} {2}'.format(*(fill or (0, 0, 0))),
              '# row column red green blue']
-        f.write(os.linesep.join(s) + os.linesep)
+        yield os.linesep.join(s) + os.linesep
 
-        for block in self:
-            things = [str(x) for x in (block.row, block.col) + block.rgb]
-            f.write(' '.join(things) + os.linesep)
+        line = '%d %d %d %d %d' + os.linesep
+        for blocks in self._text_blocks(_TEXT_LINES):
+            if fill is not None:
+                blocks = blocks[(blocks[:, 2:] != fill).any(axis=1)]
+            yield (line * len(blocks)) % tuple(blocks.ravel().tolist())
 
-        if filename:
-            f.close()
+    def _text_blocks(self, n_lines):
+        """
+        Generate ``(n, 5)`` arrays of the row, column, red, green, and
+        blue of blocks, about `n_lines` blocks at a time, in the order
+        they are iterated over.
+
+        """
+        cols = np.arange(self._width)
+        step = max(1, n_lines // max(1, self._width))
+
+        for start in range(0, self._height, step):
+            colors = self._colors[start:start + step]
+            rows = np.arange(start, start + len(colors))
+            yield np.column_stack((np.repeat(rows, self._width),
+                                   np.tile(cols, len(rows)),
+                                   colors.reshape(-1, 3)))
+
+    @classmethod
+    def from_text(cls, filename):
+        """
+        Make a new BlockGrid from a file written by `to_text`.
+
+        The file is read in large chunks and the colors in each chunk are
+        set at once, so even very large files load quickly and in bounded
+        memory.
+
+        Parameters
+        ----------
+        filename : str or file-like
+            Name of the file to read, or an open text file. Files with
+            names ending in '.gz' are read with gzip.
+
+        Returns
+        -------
+        grid : BlockGrid
+
+        """
+        return cls._from_text(filename)
+
+    @classmethod
+    def _from_text(cls, filename, **options):
+        if not hasattr(filename, 'read'):
+            with _open_text(filename, 'r') as f:
+                return cls._from_text(f, **options)
+
+        f = filename
+
+        # the header is three lines of values among comment lines
+        header = []
+        while len(header) < 3:
+            line = f.readline()
+            if not line:
+                raise ValueError('Text grid file is missing its header.')
+            if line.strip() and not line.lstrip().startswith('#'):
+                header.append([int(x) for x in line.split()])
+
+        (width, height), (block_size,), fill = header
+        grid = cls(width, height, fill, block_size, **options)
+
+        line = f.readline()
+        while line and (not line.strip() or line.lstrip().startswith('#')):
+            line = f.readline()
+
+        for chunk in _text_chunks(f, line, _TEXT_CHUNK):
+            blocks = _parse_blocks(chunk)
+            rows, cols = blocks[:, 0], blocks[:, 1]
+
+            if len(blocks) and (
+                    rows.min() < 0 or rows.max() >= grid._height or
+                    cols.min() < 0 or cols.max() >= grid._width):
+                raise IndexError('Block index out of range for a '
+                                 '{0} x {1} grid.'.format(width, height))
+
+            grid._colors[grid._storage_rows(rows), cols] = \
+                _check_colors(blocks[:, 2:])
+
+        grid._dirty[...] = True
+        grid._version[...] += 1
+
+        return grid
+
+    def _storage_rows(self, rows):
+        """
+        Convert block row numbers to rows of storage.
+
+        """
+        return rows
 
     def _to_simple_grid(self):
         """
@@ -812,8 +2893,8 @@ class BlockGrid(object):
             block in the [0][0] position.
 
         """
-        return [[(x.red, x.green, x.blue, x.size) for x in row]
-                for row in self._grid]
+        return [[tuple(rgb) + (size,) for rgb, size in zip(*row)]
+                for row in zip(self._colors.tolist(), self._sizes.tolist())]
 
     def _construct_post_request(self, code_cells, secret):
         """
@@ -900,10 +2981,12 @@ class BlockGrid(object):
                 len(block_data[0]) != self.width:
             raise ShapeMismatch('block_data must have same shape as grid.')
 
-        for row in range(self.height):
-            for col in range(self.width):
-                self._grid[row][col].rgb = block_data[row][col][:3]
-                self._grid[row][col].size = block_data[row][col][3]
+        block_data = np.array(block_data)
+        self._own_storage()
+        self._colors[...] = _check_colors(block_data[..., :3])
+        self._sizes[...] = np.maximum(_SMALLEST_BLOCK, block_data[..., 3])
+        self._dirty[...] = True
+        self._version[...] += 1
 
     @classmethod
     def from_web(cls, grid_id, secret=False):
@@ -938,6 +3021,8 @@ class BlockGrid(object):
 
 
 class Pixel(Block):
+    __slots__ = ()
+
     @property
     def x(self):
         """
@@ -952,7 +3037,12 @@ class Pixel(Block):
         Vertical coordinate of Pixel.
 
         """
-        return self._row
+        if self._grid is None:
+            return self._row
+        return self._grid._storage_rows(self._row)
+
+    row = y
+    col = x
 
     @property
     def _td(self):
@@ -960,20 +3050,18 @@ class Pixel(Block):
         The HTML for a table cell with the background color of this Pixel.
 
         """
-        title = _TITLE.format(self._col, self._row,
-                              self._red, self._green, self._blue)
-        rgb = _RGB.format(self._red, self._green, self._blue)
-        return _TD.format(title, self._size, rgb)
+        red, green, blue = self.rgb
+        title = _TITLE.format(self.x, self.y, red, green, blue)
+        rgb = _RGB.format(red, green, blue)
+        return _TD.format(title, self.size, rgb)
 
     def __str__(self):
         s = ['{0}'.format(self.__class__.__name__),
-             'Color: ({0}, {1}, {2})'.format(self._red,
-                                             self._green,
-                                             self._blue)]
+             'Color: ({0}, {1}, {2})'.format(*self.rgb)]
 
         # add position information if we have it
         if self._row is not None:
-            s[0] += ' [{0}, {1}]'.format(self._col, self._row)
+            s[0] += ' [{0}, {1}]'.format(self.x, self.y)
 
         return os.linesep.join(s)
 
@@ -1011,29 +3099,33 @@ class ImageGrid(BlockGrid):
     lines_on : bool
         Whether lines are shown between blocks when the grid is displayed.
         This attribute can used to toggle the whether the lines appear.
+    css_classes : bool
+        Whether the displayed HTML styles blocks with one CSS class per
+        unique color instead of inline styles on every cell. This makes
+        the HTML for large grids much smaller. Set this on the class to
+        change the default for all grids.
+    tooltips : {'title', 'hover', None}
+        How the index and color of each block are shown when the mouse
+        is over it. 'title' writes them into every cell, 'hover' computes
+        them in the browser with a small script, and None leaves them out.
+        The last two make the HTML for large grids much smaller.
+        Set this on the class to change the default for all grids.
     origin : str
         The location of the grid origin.
 
     """
 
+    _block_class = Pixel
+
     def __init__(self, width, height, fill=(0, 0, 0),
                  block_size=20, lines_on=True, origin='lower-left'):
         super(ImageGrid, self).__init__(width, height, fill,
                                         block_size, lines_on)
 
-        if origin not in ('lower-left', 'upper-left'):
-            s = "origin keyword must be one of {'lower-left', 'upper-left'}."
-            raise ValueError(s)
+        _check_origin(origin)
 
         self._origin = origin
 
-    def _initialize_grid(self, fill):
-        grid = [[Pixel(*fill, size=self._block_size)
-                for col in range(self.width)]
-                for row in range(self.height)]
-
-        self._grid = grid
-
     @property
     def block_size(self):
         return self._block_size
@@ -1042,29 +3134,46 @@ class ImageGrid(BlockGrid):
     def origin(self):
         return self._origin
 
-    def _transform_index(self, index):
-        """
-        Transform a single-item index from Python style coordinates to
-        image style coordinates in which the first item refers to column and
-        the second item refers to row. Also takes into account the
-        location of the origin.
+    @classmethod
+    def _from_storage(cls, colors, sizes, block_size=20, lines_on=True,
+                      origin='lower-left'):
+        _check_origin(origin)
 
-        """
-        # in ImageGrid index is guaranteed to be a tuple.
+        grid = super(ImageGrid, cls)._from_storage(
+            colors, sizes, block_size, lines_on)
+        grid._origin = origin
+
+        return grid
 
-        # first thing, switch the coordinates since ImageGrid is column
-        # major and ._grid is row major.
-        new_ind = [index[1], index[0]]
+    def _view_from_grid(self, index, storage=None):
+        new_IG = super(ImageGrid, self)._view_from_grid(index, storage)
+        new_IG._origin = self._origin
 
-        # now take into account that the ImageGrid origin may be lower-left,
-        # while the ._grid origin is upper-left.
-        if self._origin == 'lower-left':
-            if new_ind[0] >= 0:
-                new_ind[0] = self._height - new_ind[0] - 1
-            else:
-                new_ind[0] = abs(new_ind[0]) - 1
+        return new_IG
 
-        return tuple(new_ind)
+    def __setitem__(self, index, value):
+        if isinstance(value, ImageGrid) and value._origin != self._origin:
+            # pixels are matched up by coordinate, so present the value
+            # with its rows flipped and our origin.
+            value = value._view_from_grid(slice(None, None, -1))
+            value._origin = self._origin
+
+        elif isinstance(value, np.ndarray) and value.ndim == 3 and \
+                self._categorize_index(index) != _SINGLE_ITEM:
+            # arrays are indexed by x and then y, as from to_array, so
+            # present them in storage order. arrays assigned to a single
+            # pixel are left for BlockGrid to reject.
+            thing = self[index]
+            shape = thing._iter_order(thing._colors).shape
+            if value.shape != shape:
+                raise ShapeMismatch('Assigned arrays must have shape '
+                                    '(width, height, 3) matching the grid.')
+
+            value = value.swapaxes(0, 1)
+            if self._origin == 'lower-left':
+                value = value[::-1]
+
+        super(ImageGrid, self).__setitem__(index, value)
 
     def __getitem__(self, index):
         ind_cat = self._categorize_index(index)
@@ -1075,63 +3184,164 @@ class ImageGrid(BlockGrid):
             raise IndexError(s)
 
         if ind_cat == _SINGLE_ITEM:
-            # should be able to index ._grid with new_ind regardless of any
-            # following coordinate transforms. let's just make sure.
-            self._grid[index[1]][index[0]]
+            # indexing a range checks bounds and wraps negative indices
+            x = range(self._width)[index[0]]
+            y = range(self._height)[index[1]]
 
-            real_index = self._transform_index(index)
-            pixel = self._grid[real_index[0]][real_index[1]]
-            pixel._col, pixel._row = index
-            return pixel
+            return Pixel._from_grid(self, self._storage_rows(y), x)
 
         elif ind_cat == _DOUBLE_SLICE:
-            new_grid = self._get_double_slice(index)
-            return self._view_from_grid(new_grid)
+            return self._view_from_grid(self._double_slice_index(index))
 
-    def _get_double_slice(self, index):
+    def _double_slice_index(self, index):
+        """
+        Get the index into storage for a 2D slice.
+
+        Returns
+        -------
+        index : tuple of slice
+            Index giving rows in display order, top row first.
+
+        """
         cslice, rslice = index
 
         if isinstance(rslice, int):
-            if rslice == -1:
-                rslice = slice(rslice, None)
-            else:
-                rslice = slice(rslice, rslice + 1)
+            rslice = _int_to_slice(rslice)
 
         if isinstance(cslice, int):
-            if cslice == -1:
-                cslice = slice(cslice, None)
-            else:
-                cslice = slice(cslice, cslice + 1)
+            cslice = _int_to_slice(cslice)
 
-        rows = range(self._height)[rslice]
         if self._origin == 'lower-left':
-            rows = rows[::-1]
+            rslice = _flip_slice(rslice, self._height)
+
+        return rslice, cslice
 
-        cols = range(self._width)[cslice]
+    def _iter_order(self, array):
+        """
+        View of `array`, one of the color, size, or changed block
+        storage arrays, with the pixels in the order they are iterated
+        over: indexed by x and then y.
 
-        new_grid = [[self[c, r] for c in cols] for r in rows]
+        """
+        if self._origin == 'lower-left':
+            array = array[::-1]
 
-        return new_grid
+        return array.swapaxes(0, 1)
 
     def __iter__(self):
-        for col in range(self.width):
-            for row in range(self.height):
-                yield self[col, row]
+        rows = self._storage_rows(np.arange(self._height)).tolist()
+        return _iter_blocks(self._block_class, self, rows,
+                            range(self._width), transposed=True)
 
-    def _repr_html_(self):
+    @classmethod
+    def _from_array(cls, colors, block_size=20, lines_on=True,
+                    origin='lower-left'):
+        _check_origin(origin)
+
+        # colors are indexed by x and then y, storage is top row first
+        colors = colors.swapaxes(0, 1)
+        if origin == 'lower-left':
+            colors = colors[::-1]
+
+        sizes = _uniform_sizes(colors.shape[:2], block_size)
+
+        return cls._from_storage(colors, sizes, block_size, lines_on, origin)
+
+    def iter_rows(self):
+        """
+        Iterate over the rows of the grid in order of y coordinate.
+
+        Yields
+        ------
+        row : ndarray
+            Read-only ``(width, 3)`` uint8 view of the colors of a row of
+            pixels. Use indexing to change the grid.
+
+        """
+        for row in self._iter_order(self._colors).swapaxes(0, 1):
+            row = row.view()
+            row.flags.writeable = False
+            yield row
+
+    def _storage_rows(self, rows):
+        """
+        Convert pixel y coordinates to rows of storage.
+
+        """
+        if self._origin == 'lower-left':
+            return self._height - 1 - rows
+        else:
+            return rows
+
+    def _text_blocks(self, n_lines):
+        """
+        Generate ``(n, 5)`` arrays of the y, x, red, green, and blue of
+        pixels, about `n_lines` pixels at a time, in the order they are
+        iterated over.
+
+        """
+        colors = self._iter_order(self._colors)
+        ys = np.arange(self._height)
+        step = max(1, n_lines // max(1, self._height))
+
+        for start in range(0, self._width, step):
+            chunk = colors[start:start + step]
+            xs = np.arange(start, start + len(chunk))
+            yield np.column_stack((np.tile(ys, len(xs)),
+                                   np.repeat(xs, self._height),
+                                   chunk.reshape(-1, 3)))
+
+    @classmethod
+    def from_text(cls, filename, origin='lower-left'):
+        """
+        Make a new ImageGrid from a file written by `to_text`.
+
+        The file is read in large chunks and the colors in each chunk are
+        set at once, so even very large files load quickly and in bounded
+        memory.
+
+        Parameters
+        ----------
+        filename : str or file-like
+            Name of the file to read, or an open text file. Files with
+            names ending in '.gz' are read with gzip.
+        origin : {'lower-left', 'upper-left'}, optional
+            Set the location of the grid origin. The row and column in
+            the file are taken as the y and x coordinates of each pixel
+            with this origin.
+
+        Returns
+        -------
+        grid : ImageGrid
+
+        """
+        return cls._from_text(filename, origin=origin)
+
+    def _html_labels(self):
+        """
+        The index shown in the title of each cell, as nested lists
+        in the same order as storage.
+
+        """
         rows = range(self._height)
-        cols = range(self._width)
 
+        # storage is always top row first
         if self._origin == 'lower-left':
             rows = rows[::-1]
 
-        html = reduce(iadd,
-                      (_TR.format(reduce(iadd,
-                                         (self[c, r]._td
-                                          for c in cols)))
-                       for r in rows))
+        cols = ['{0}, '.format(c) for c in range(self._width)]
+        return [[col + row for col in cols] for row in map(str, rows)]
 
-        return _TABLE.format(uuid.uuid4(), int(self._lines_on), html)
+    def _hover_index(self):
+        """
+        JavaScript expression for the index of a cell in its tooltip,
+        given its zero-based table position in ``row`` and ``col``.
+
+        """
+        if self._origin == 'lower-left':
+            return 'col + ", " + ({0} - row)'.format(self._height - 1)
+        else:
+            return 'col + ", " + row'
 
     @classmethod
     def from_web(cls, grid_id, secret=False, origin='lower-left'):
@@ -1167,6 +3377,391 @@ class ImageGrid(BlockGrid):
         return grid
 
 
+def _png_chunk(kind, data):
+    """
+    Make a PNG chunk of type `kind` holding `data`.
+
+    """
+    crc = zlib.crc32(kind + data) & 0xffffffff
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', crc)
+
+
+def _png_chunks(png):
+    """
+    Yield the type and data of each chunk in an encoded PNG.
+
+    """
+    pos = len(_PNG_SIGNATURE)
+    while pos < len(png):
+        length, = struct.unpack('>I', png[pos:pos + 4])
+        yield png[pos + 4:pos + 8], png[pos + 8:pos + 8 + length]
+        pos += length + 12
+
+
+def _gif_image(gif):
+    """
+    Take apart a single frame GIF to reuse its image in another GIF.
+
+    Parameters
+    ----------
+    gif : bytes
+        A GIF written by PIL without interlacing.
+
+    Returns
+    -------
+    table_bits : int
+        The size field for the color table in GIF image descriptor flags.
+    table : bytes
+        The color table for the image.
+    data : bytes
+        The LZW encoded image data, up to and including the block
+        terminator.
+    transparency : int or None
+        The index of the transparent color, if there is one.
+
+    """
+    gif = bytearray(gif)
+    flags = gif[10]
+    pos = 13
+    table = b''
+    transparency = None
+
+    if flags & 0x80:
+        end = pos + (3 << ((flags & 7) + 1))
+        table = bytes(gif[pos:end])
+        pos = end
+
+    # skip extensions, which are a label and then sub-blocks up to an
+    # empty one, picking the transparent color out of the graphic
+    # control extension.
+    while gif[pos] == 0x21:
+        if gif[pos + 1] == 0xf9 and gif[pos + 3] & 1:
+            transparency = gif[pos + 6]
+        pos += 2
+        while gif[pos]:
+            pos += gif[pos] + 1
+        pos += 1
+
+    local_flags = gif[pos + 9]
+    pos += 10
+
+    if local_flags & 0x80:
+        flags = local_flags
+        end = pos + (3 << ((flags & 7) + 1))
+        table = bytes(gif[pos:end])
+        pos = end
+
+    # the image data runs up to the trailer
+    return flags & 7, table, bytes(gif[pos:-1]), transparency
+
+
+def _encode_frame(pixels, format, unchanged=None):
+    """
+    Encode a ``(height, width, 3)`` array of pixels with PIL, as a
+    single frame GIF or an RGB PNG.
+
+    GIF frames with more than 256 colors are quantized.
+
+    Parameters
+    ----------
+    pixels : ndarray
+    format : {'gif', 'png'}
+    unchanged : ndarray, optional
+        ``(height, width)`` bool array of pixels that are the same as in
+        the previous frame. If there is room in the palette these are
+        made transparent in GIFs so the previous frame shows through,
+        which compresses better.
+
+    """
+    try:
+        # PIL
+        import Image
+    except ImportError:
+        # pillow
+        from PIL import Image
+
+    fp = io.BytesIO()
+
+    if format == 'png':
+        Image.fromarray(pixels).save(fp, format='png')
+        return fp.getvalue()
+
+    packed = pixels.astype(np.uint32)
+    packed = (packed[..., 0] << 16) | (packed[..., 1] << 8) | packed[..., 2]
+    uniq = None
+    options = {}
+
+    if unchanged is not None:
+        changed = ~unchanged
+        uniq, inverse = np.unique(packed[changed], return_inverse=True)
+
+    if uniq is not None and len(uniq) < 256:
+        # unchanged pixels get the index after the colors
+        indices = np.empty(packed.shape, dtype=np.intp)
+        indices[unchanged] = len(uniq)
+        indices[changed] = inverse.ravel()
+        options['transparency'] = len(uniq)
+        uniq = np.append(uniq, 0)
+    else:
+        uniq, indices = np.unique(packed, return_inverse=True)
+
+    if len(uniq) <= 256:
+        height, width = packed.shape
+        im = Image.frombytes(
+            'P', (width, height), indices.astype(np.uint8).tobytes())
+        im.putpalette(np.column_stack(
+            ((uniq >> 16) & 255, (uniq >> 8) & 255, uniq & 255)
+        ).astype(np.uint8).ravel().tolist())
+    else:
+        im = Image.fromarray(pixels).quantize(256)
+
+    im.save(fp, format='gif', interlace=False, **options)
+    return fp.getvalue()
+
+
+class AnimationWriter(object):
+    """
+    Write grids as the frames of an animated GIF or PNG.
+
+    Frames are encoded as they are added so memory use does not grow with
+    the length of the animation. A frame that is the same as the one
+    before it makes that frame last longer instead of adding another,
+    and each frame holds only the rectangle of pixels that changed.
+
+    Every frame must have the same image size. APNG output is RGB and
+    GIF frames with more than 256 colors are quantized.
+
+    Parameters
+    ----------
+    fp : str, path, or file-like
+        Name or path of the file to write, or a binary file object. File
+        objects must be seekable for PNG output.
+    format : {'gif', 'png'}, optional
+        Inferred from the extension of the file name if not given.
+    duration : float, optional
+        Time to show each frame, in seconds.
+    loop : int, optional
+        Number of times to play the animation. Zero means forever.
+
+    Attributes
+    ----------
+    frames : int
+        Number of frames written, after identical frames are merged.
+
+    """
+    def __init__(self, fp, format=None, duration=0.2, loop=0):
+        # anything that isn't a file object is a file name or path
+        is_file = hasattr(fp, 'write')
+
+        if format is None:
+            if is_file:
+                raise ValueError('format is required for file objects.')
+            format = os.path.splitext(fp)[1][1:]
+
+        format = format.lower()
+        if format == 'apng':
+            format = 'png'
+        if format not in ('gif', 'png'):
+            s = "format must be one of 'gif' or 'png'. got {0!r}."
+            raise ValueError(s.format(format))
+
+        if is_file:
+            self._fp = fp
+            self._close_fp = False
+        else:
+            self._fp = open(fp, 'wb')
+            self._close_fp = True
+
+        self.format = format
+        self.duration = duration
+        self.loop = loop
+        self.frames = 0
+
+        self._size = None
+        self._last = None
+        self._pending = None
+        self._sequence = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add_frame(self, grid, duration=None):
+        """
+        Add the current state of a grid to the animation.
+
+        Parameters
+        ----------
+        grid : BlockGrid
+        duration : float, optional
+            Time to show this frame, in seconds. Defaults to the
+            writer's `duration`.
+
+        """
+        if duration is None:
+            duration = self.duration
+
+        pixels = grid._image_array()
+
+        if self._last is None:
+            self._size = pixels.shape[:2]
+            self._write_header()
+            top = left = 0
+            bottom, right = self._size
+            unchanged = None
+
+        elif pixels.shape[:2] != self._size:
+            raise ShapeMismatch('Animation frames must all be the same size.')
+
+        else:
+            changed = (pixels != self._last).any(axis=2)
+            rows = np.flatnonzero(changed.any(axis=1))
+
+            if len(rows) == 0:
+                self._pending[-1] += duration
+                return
+
+            cols = np.flatnonzero(changed.any(axis=0))
+            top, bottom = rows[0], rows[-1] + 1
+            left, right = cols[0], cols[-1] + 1
+            unchanged = ~changed[top:bottom, left:right]
+
+        self._flush()
+        self._pending = [left, top, pixels[top:bottom, left:right],
+                         unchanged, duration]
+        self._last = pixels
+
+    def close(self):
+        """
+        Write the last frame and finish the file.
+
+        """
+        if self._fp is None:
+            return
+
+        self._flush()
+        if self._size is not None:
+            self._write_trailer()
+
+        if self._close_fp:
+            self._fp.close()
+        self._fp = None
+
+    def _flush(self):
+        """
+        Encode and write the pending frame.
+
+        """
+        if self._pending is None:
+            return
+
+        left, top, pixels, unchanged, duration = self._pending
+        self._pending = None
+        self.frames += 1
+
+        data = _encode_frame(pixels, self.format, unchanged)
+        height, width = pixels.shape[:2]
+
+        if self.format == 'gif':
+            table_bits, table, data, transparency = _gif_image(data)
+            delay = min(65535, int(round(duration * 100)))
+            flags = 4 if transparency is None else 5
+            self._fp.write(
+                # graphic control extension, leaving the frame in place
+                # for the next one to be drawn over
+                struct.pack('<3sBHBB', b'!\xf9\x04', flags, delay,
+                            transparency or 0, 0) +
+                struct.pack('<cHHHHB', b',', left, top, width, height,
+                            0x80 | table_bits) +
+                table + data)
+
+        else:
+            delay = min(65535, int(round(duration * 1000)))
+            self._write_png_chunk(b'fcTL', struct.pack(
+                '>IIIIIHHBB', self._sequence, width, height, left, top,
+                delay, 1000, 0, 0))
+            self._sequence += 1
+
+            for kind, chunk in _png_chunks(data):
+                if kind != b'IDAT':
+                    continue
+                if self.frames == 1:
+                    self._write_png_chunk(b'IDAT', chunk)
+                else:
+                    self._write_png_chunk(
+                        b'fdAT', struct.pack('>I', self._sequence) + chunk)
+                    self._sequence += 1
+
+    def _write_png_chunk(self, kind, data):
+        self._fp.write(_png_chunk(kind, data))
+
+    def _write_header(self):
+        height, width = self._size
+
+        if self.format == 'gif':
+            self._fp.write(
+                b'GIF89a' + struct.pack('<HHBBB', width, height, 0, 0, 0) +
+                # application extension for looping
+                b'!\xff\x0bNETSCAPE2.0' +
+                struct.pack('<BBHB', 3, 1, self.loop, 0))
+
+        else:
+            self._fp.write(_PNG_SIGNATURE)
+            self._write_png_chunk(
+                b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+
+            # the number of frames isn't known until the end, so the
+            # animation control chunk is filled in then.
+            self._actl = self._fp.tell()
+            self._write_png_chunk(b'acTL', struct.pack('>II', 0, self.loop))
+
+    def _write_trailer(self):
+        if self.format == 'gif':
+            self._fp.write(b';')
+
+        else:
+            self._write_png_chunk(b'IEND', b'')
+            end = self._fp.tell()
+            self._fp.seek(self._actl)
+            self._write_png_chunk(
+                b'acTL', struct.pack('>II', self.frames, self.loop))
+            self._fp.seek(end)
+
+
+def save_animation(grids, fp, format=None, duration=0.2, loop=0):
+    """
+    Save a sequence of grid states as an animated GIF or PNG.
+
+    Parameters
+    ----------
+    grids : iterable of BlockGrid
+        The frames of the animation. These may be the same grid changed
+        between frames, e.g. by a generator.
+    fp : str, path, or file-like
+        Name or path of the file to write, or a binary file object. File
+        objects must be seekable for PNG output.
+    format : {'gif', 'png'}, optional
+        Inferred from the extension of the file name if not given.
+    duration : float, optional
+        Time to show each frame, in seconds.
+    loop : int, optional
+        Number of times to play the animation. Zero means forever.
+
+    Returns
+    -------
+    frames : int
+        Number of frames written, after identical frames are merged.
+
+    """
+    with AnimationWriter(fp, format, duration, loop) as writer:
+        for grid in grids:
+            writer.add_frame(grid)
+
+    return writer.frames
+
+
 # Convenience wrapper for color tuples with attribute access for the
 # component colors
 Color = namedtuple('Color', ['red', 'green', 'blue'])
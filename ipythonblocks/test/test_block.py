@@ -1,4 +1,6 @@
+import copy
 import os
+import pickle
 import pytest
 
 from .. import ipythonblocks
@@ -109,9 +111,7 @@ def test_rgb_attr(basic_block):
 
     bb.rgb = (1, 2, 3)
     assert bb.rgb == (1, 2, 3)
-    assert bb._red == 1
-    assert bb._green == 2
-    assert bb._blue == 3
+    assert (bb._red, bb._green, bb._blue) == (1, 2, 3)
 
     with pytest.raises(ValueError):
         bb.rgb = (1, 2)
@@ -212,3 +212,74 @@ def test_update():
 
     with pytest.raises(ValueError):
         b1._update((1, 2, 3, 4))
+
+def test_slots(basic_block):
+    assert not hasattr(basic_block, '__dict__')
+
+    with pytest.raises(AttributeError):
+        basic_block.color = (1, 2, 3)
+
+@pytest.mark.parametrize('protocol', range(pickle.HIGHEST_PROTOCOL + 1))
+def test_pickle(basic_block, protocol):
+    basic_block._row = 1
+    basic_block._col = 2
+
+    new = pickle.loads(pickle.dumps(basic_block, protocol))
+
+    assert new == basic_block
+    assert new.row == 1
+    assert new.col == 2
+    assert repr(new) == repr(basic_block)
+
+def test_unpickle_1_9():
+    """
+    Blocks pickled by ipythonblocks 1.9 kept their attributes in a dict.
+
+    """
+    data = (
+        b'\x80\x02cipythonblocks.ipythonblocks\nBlock\nq\x00)\x81q\x01}q'
+        b'\x02(X\x04\x00\x00\x00_redq\x03K\x01X\x06\x00\x00\x00_greenq'
+        b'\x04K\x02X\x05\x00\x00\x00_blueq\x05K\x03X\x05\x00\x00\x00_size'
+        b'q\x06K\x07X\x04\x00\x00\x00_rowq\x07NX\x04\x00\x00\x00_colq\x08N'
+        b'ub.')
+
+    block = pickle.loads(data)
+
+    assert block == ipythonblocks.Block(1, 2, 3, size=7)
+    assert block.row is None
+    assert block.col is None
+
+    block.red = 10
+    assert block.rgb == (10, 2, 3)
+
+def test_copy_view():
+    bg = ipythonblocks.BlockGrid(2, 2, fill=(1, 2, 3))
+    block = copy.copy(bg[1, 1])
+
+    block.red = 100
+    assert block.rgb == (100, 2, 3)
+    assert bg[1, 1].rgb == (1, 2, 3)
+
+def test_memory_per_block():
+    """
+    Blocks should be small whether on their own or made from a grid.
+
+    """
+    tracemalloc = pytest.importorskip('tracemalloc')
+
+    bg = ipythonblocks.BlockGrid(100, 100)
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        blocks = [ipythonblocks.Block(1, 2, 3) for _ in range(1000)]
+        standalone = tracemalloc.get_traced_memory()[0] - before
+
+        before = tracemalloc.get_traced_memory()[0]
+        grid_blocks = list(bg)
+        from_grid = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+    assert standalone / float(len(blocks)) < 150
+    assert from_grid / float(len(grid_blocks)) < 150
@@ -1,5 +1,9 @@
+import copy
+import io
 import os
+import pickle
 import uuid
+import numpy as np
 import pytest
 
 from .. import ipythonblocks
@@ -374,3 +378,1076 @@ def test_to_text(capsys):
     out, err = capsys.readouterr()
 
     assert out == ref
+
+
+def test_storage(basic_grid):
+    """
+    Grid colors live in a single (height, width, 3) uint8 array.
+
+    """
+    bg = basic_grid
+
+    assert bg._colors.shape == (6, 5, 3)
+    assert bg._colors.dtype == np.uint8
+    assert bg._sizes.shape == (6, 5)
+    assert (bg._colors == (1, 2, 3)).all()
+
+
+def test_block_writes_through(basic_grid):
+    """
+    Blocks returned by indexing are views onto the grid storage.
+
+    """
+    bg = basic_grid
+
+    bg[2, 3].red = 300
+    bg[2, 3].blue = 42.4
+    bg[-1, -1].rgb = (7, 8, 9)
+    bg[0, 0].size = 5
+
+    assert bg._colors[2, 3].tolist() == [255, 2, 42]
+    assert bg._colors[5, 4].tolist() == [7, 8, 9]
+    assert bg._sizes[0, 0] == 5
+    assert bg[0, 0].size == 5
+
+
+def test_view_shares_storage(basic_grid):
+    bg = basic_grid
+    ng = bg[1:4, ::2]
+
+    assert np.shares_memory(ng._colors, bg._colors)
+
+    ng[0, 1].rgb = (9, 9, 9)
+    assert bg[1, 2].rgb == (9, 9, 9)
+
+
+def test_view_skips_init(basic_grid, monkeypatch):
+    """
+    Views should reuse the parent's storage without initializing a grid.
+
+    """
+    def fail(*args, **kwargs):
+        raise AssertionError('view should not initialize a grid')
+
+    monkeypatch.setattr(ipythonblocks.BlockGrid, '_initialize_grid', fail)
+
+    ng = basic_grid[1:3, 2:]
+
+    assert ng.shape == (3, 2)
+    assert ng.block_size == basic_grid.block_size
+    assert ng.lines_on == basic_grid.lines_on
+    assert ng._colors.base is not None
+
+
+def test_setitem_clips_and_rounds(basic_grid):
+    bg = basic_grid
+
+    bg[1:3, 1:3] = (-10, 300.2, 4.6)
+
+    for block in bg[1:3, 1:3]:
+        assert block.rgb == (0, 255, 5)
+
+    assert bg[0, 0].rgb == (1, 2, 3)
+    assert bg[3, 3].rgb == (1, 2, 3)
+
+
+def test_setitem_bad_colors_slice(basic_grid):
+    with pytest.raises(ipythonblocks.InvalidColorSpec):
+        basic_grid[:2, :2] = (1, 'a', 3)
+
+    with pytest.raises(ipythonblocks.InvalidColorSpec):
+        basic_grid[:2] = ((1, 2, 3), (4, 5, 6), (7, 8, 9))
+
+    with pytest.raises(ValueError):
+        basic_grid[:2] = (1, 2, 3, 4)
+
+    assert (basic_grid._colors == (1, 2, 3)).all()
+
+
+def test_setitem_block_to_slice(basic_grid):
+    bg = basic_grid
+
+    bg[:, 1] = ipythonblocks.Block(9, 8, 7, size=3)
+
+    for block in bg[:, 1]:
+        assert block.rgb == (9, 8, 7)
+        assert block.size == 3
+
+    assert bg[0, 0].size == 20
+
+
+def test_setitem_array(basic_grid):
+    bg = basic_grid
+    arr = np.arange(2 * 3 * 3).reshape((2, 3, 3)) * 20.0
+
+    bg[1:3, 2:] = arr
+
+    assert bg._colors[1:3, 2:].tolist() == np.clip(arr, 0, 255).tolist()
+
+    with pytest.raises(ipythonblocks.ShapeMismatch):
+        bg[:2, :2] = arr
+
+    with pytest.raises(ipythonblocks.InvalidColorSpec):
+        bg[1:3, 2:] = arr.astype(str)
+
+
+def test_memory_per_block():
+    """
+    Grid storage should only cost a few bytes per block.
+
+    """
+    tracemalloc = pytest.importorskip('tracemalloc')
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        bg = ipythonblocks.BlockGrid(200, 200)
+        used = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+    assert used / float(bg.width * bg.height) < 16
+
+
+def test_repr_html_matches_td(basic_grid, monkeypatch):
+    """
+    The grid HTML is built from storage but must match the HTML built
+    from the `_td` of each block.
+
+    """
+    bg = basic_grid
+    bg[0, 0] = (255, 0, 10)
+    bg[2, 3] = (255, 0, 10)
+    bg[4, 1].size = 7
+    bg[5] = (0, 128, 0)
+
+    monkeypatch.setattr(uuid, 'uuid4', fake_uuid)
+
+    rows = ''.join(
+        ipythonblocks._TR.format(''.join(bg[r, c]._td
+                                         for c in range(bg.width)))
+        for r in range(bg.height))
+    html = ipythonblocks._TABLE.format(fake_uuid(), 1, rows)
+
+    assert bg._repr_html_() == html
+
+
+def test_repr_html_css_classes(basic_grid, monkeypatch):
+    bg = basic_grid
+    bg[0, 0] = (255, 0, 10)
+    bg[2, 3] = (255, 0, 10)
+    bg[4, 1].size = 7
+
+    monkeypatch.setattr(uuid, 'uuid4', fake_uuid)
+
+    inline = bg._repr_html_()
+    bg.css_classes = True
+    html = bg._repr_html_()
+
+    assert len(html) < len(inline)
+    assert 'style="' not in html.split('</style>')[1]
+    assert ' #blocksabc td {border: 1px solid white; width: 20px; ' \
+        'height: 20px;}' in html
+
+    # three unique blocks, in sorted order of size and color
+    assert ' #blocksabc td.c0 {width: 7px; height: 7px; ' \
+        'background-color: rgb(1, 2, 3);}' in html
+    assert ' #blocksabc .c1 {background-color: rgb(1, 2, 3);}' in html
+    assert ' #blocksabc .c2 {background-color: rgb(255, 0, 10);}' in html
+
+    assert html.count('class="c0"') == 1
+    assert html.count('class="c2"') == 2
+    assert '<td title="Index: [2, 3]&#10;Color: (255, 0, 10)" ' \
+        'class="c2"></td>' in html
+
+    assert bg[1:3, 1:3].css_classes is True
+    assert ipythonblocks.BlockGrid.css_classes is False
+
+
+def test_repr_html_no_tooltips(basic_grid, monkeypatch):
+    bg = basic_grid
+    bg[1, 1] = (4, 5, 6)
+
+    monkeypatch.setattr(uuid, 'uuid4', fake_uuid)
+
+    bg.tooltips = None
+    html = bg._repr_html_()
+
+    assert 'title=' not in html
+    assert '<script' not in html
+    assert html.count('<td ') == 30
+    assert ipythonblocks._TD_STYLE.format(4, 5, 6, 20) in html
+
+    bg.css_classes = True
+    html = bg._repr_html_()
+
+    assert 'title=' not in html
+    assert '<tr><td class="c0"></td><td class="c0"></td>' in html
+    assert html.count('<td class="c1"></td>') == 1
+
+
+def test_repr_html_hover_tooltips(basic_grid, monkeypatch):
+    bg = basic_grid
+
+    monkeypatch.setattr(uuid, 'uuid4', fake_uuid)
+
+    bg.tooltips = 'hover'
+    html = bg._repr_html_()
+
+    assert 'title=' not in html
+    assert html.endswith(ipythonblocks._HOVER_SCRIPT.format(
+        fake_uuid(), 'row + ", " + col'))
+
+
+def test_tooltips_default(basic_grid, monkeypatch):
+    monkeypatch.setattr(ipythonblocks.BlockGrid, 'tooltips', None)
+
+    assert 'title=' not in basic_grid._repr_html_()
+    assert basic_grid[:2, :2].tooltips is None
+
+    basic_grid.tooltips = 'title'
+    assert 'title=' in basic_grid._repr_html_()
+    assert basic_grid[:2, :2].tooltips == 'title'
+
+
+def test_tooltips_bad_value(basic_grid):
+    basic_grid.tooltips = 'nope'
+
+    with pytest.raises(ValueError):
+        basic_grid._repr_html_()
+
+
+def test_canvas_html(basic_grid):
+    import base64
+
+    bg = basic_grid
+    bg[1, 2] = (200, 100, 50)
+
+    html = bg._canvas_html(fake_uuid())
+    data = base64.b64encode(bg._colors.tobytes()).decode('ascii')
+
+    assert html.startswith(
+        '<canvas id="blocksabc" width="106" height="127"></canvas>')
+    assert 'w = 5, h = 6, step = 21, lines = 1,' in html
+    assert 'atob("{0}")'.format(data) in html
+
+    bg.lines_on = False
+    assert 'step = 20, lines = 0,' in bg._canvas_html(fake_uuid())
+
+
+def test_canvas_threshold(basic_grid, monkeypatch):
+    monkeypatch.setattr(uuid, 'uuid4', fake_uuid)
+
+    bg = basic_grid
+    assert '<table' in bg._repr_html_()
+
+    bg.canvas_threshold = 30
+    assert '<table' in bg._repr_html_()
+
+    bg.canvas_threshold = 29
+    assert bg._repr_html_() == bg._canvas_html(fake_uuid())
+    assert '<table' in bg[:2, :2]._repr_html_()
+
+    bg.canvas_threshold = None
+    assert '<table' in bg._repr_html_()
+
+
+class FakeDisplay(object):
+    """
+    Stands in for IPython's display function, recording what is displayed
+    and updated through the handles it returns.
+
+    """
+    def __init__(self, kernel=True):
+        self.kernel = kernel
+        self.shown = []
+        self.updated = []
+
+    def __call__(self, obj, display_id=False):
+        self.shown.append(obj.data)
+        if self.kernel and display_id:
+            return self
+
+    def update(self, obj):
+        self.updated.append(obj.data)
+
+
+def test_animate_updates_in_place(monkeypatch):
+    fake = FakeDisplay()
+    monkeypatch.setattr(ipythonblocks, 'display', fake)
+    monkeypatch.setattr(uuid, 'uuid4', fake_uuid)
+
+    bg = ipythonblocks.BlockGrid(2, 2)
+    for block in bg.animate(stop_time=0):
+        block.red = 255
+
+    assert len(fake.shown) == 1
+    assert len(fake.updated) == 4
+    assert fake.updated[-1] == bg._repr_html_()
+
+
+def test_animate_outside_kernel(monkeypatch):
+    fake = FakeDisplay(kernel=False)
+    monkeypatch.setattr(ipythonblocks, 'display', fake)
+
+    bg = ipythonblocks.BlockGrid(2, 2)
+    for block in bg.animate(stop_time=0):
+        pass
+
+    assert len(fake.shown) == 5
+    assert fake.updated == []
+
+
+def test_flash_updates_in_place(monkeypatch):
+    fake = FakeDisplay()
+    monkeypatch.setattr(ipythonblocks, 'display', fake)
+    monkeypatch.setattr(ipythonblocks, '_flash_frame',
+                        {'cell': None, 'handle': None})
+    monkeypatch.setattr(ipythonblocks, '_execution_count', lambda: 1)
+
+    bg = ipythonblocks.BlockGrid(2, 2)
+    for _ in range(3):
+        bg.flash(display_time=0)
+
+    assert len(fake.shown) == 1
+    assert len(fake.updated) == 2
+
+    # a flash from a new cell gets its own output
+    monkeypatch.setattr(ipythonblocks, '_execution_count', lambda: 2)
+    bg.flash(display_time=0)
+
+    assert len(fake.shown) == 2
+    assert len(fake.updated) == 2
+
+
+def test_dirty_tracking(basic_grid):
+    bg = basic_grid
+    bg._dirty[...] = False
+
+    bg[0, 0].red = 10
+    bg[1, 1].size = 5
+    bg[2:4, 3] = (1, 1, 1)
+    bg[5, 1:3][0, 0].rgb = (9, 9, 9)
+
+    assert sorted(zip(*np.nonzero(bg._dirty))) == \
+        [(0, 0), (1, 1), (2, 3), (3, 3), (5, 1)]
+
+    bg._dirty[...] = False
+    bg.block_size = 10
+    assert bg._dirty.all()
+
+
+def test_pop_changes(basic_grid):
+    bg = basic_grid
+    bg._dirty[...] = False
+
+    bg[2, 3] = (1, 0, 255)
+    bg[0, 4].size = 7
+
+    assert bg._pop_changes() == [0, 4, 0x010203, 7, 2, 3, 0x0100ff, 20]
+    assert not bg._dirty.any()
+    assert bg._pop_changes() == []
+
+
+def test_delta_html(basic_grid):
+    html = basic_grid._delta_html('abc', [0, 4, 0x010203, 7])
+
+    assert html == ('<script type="text/javascript">'
+                    'ipythonblocksDelta("blocksabc", 21, 1, [0,4,66051,7]);'
+                    '</script>')
+
+
+def test_animate_delta(monkeypatch):
+    fake = FakeDisplay()
+    monkeypatch.setattr(ipythonblocks, 'display', fake)
+    monkeypatch.setattr(uuid, 'uuid4', fake_uuid)
+
+    bg = ipythonblocks.BlockGrid(2, 2)
+    for block in bg.animate(stop_time=0, delta=True):
+        if block.row == 1:
+            block.rgb = (255, 0, 0)
+
+    # the grid, then an update with the first changed block, and finally
+    # the grid with the last change and an empty update.
+    assert fake.shown == [
+        (ipythonblocks.BlockGrid(2, 2)._repr_html_() +
+         ipythonblocks._DELTA_FUNCTION),
+        bg._delta_html('abc', [1, 0, 0xff0000, 20])]
+    assert fake.updated == [bg._repr_html_(), '']
+
+
+def test_animate_delta_outside_kernel(monkeypatch):
+    fake = FakeDisplay(kernel=False)
+    monkeypatch.setattr(ipythonblocks, 'display', fake)
+
+    bg = ipythonblocks.BlockGrid(2, 2)
+    for block in bg.animate(stop_time=0, delta=True):
+        block.red = 255
+
+    assert len(fake.shown) == 5
+    assert fake.updated == []
+
+
+class FakeTime(object):
+    """
+    A clock that only moves when slept on or when a frame is displayed.
+
+    """
+    def __init__(self, render_time=0):
+        self.now = 0.0
+        self.render_time = render_time
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    def display(self, obj, display_id=False):
+        self.now += self.render_time
+
+
+def test_animate_schedule(monkeypatch):
+    clock = FakeTime(render_time=0.03)
+    monkeypatch.setattr(ipythonblocks, '_now', clock)
+    monkeypatch.setattr(ipythonblocks.time, 'sleep', clock.sleep)
+    monkeypatch.setattr(ipythonblocks, 'display', clock.display)
+
+    bg = ipythonblocks.BlockGrid(2, 2)
+    for block in bg.animate(fps=10):
+        pass
+
+    # render time is taken out of the wait between frames
+    assert clock.sleeps == pytest.approx([0.07] * 4)
+    assert clock.now == pytest.approx(0.43)
+    assert bg.animation_stats.frames == 5
+    assert bg.animation_stats.dropped == 0
+    assert bg.animation_stats.fps == pytest.approx(5 / 0.43)
+
+
+@pytest.mark.parametrize('delta', [False, True])
+def test_animate_drops_frames(monkeypatch, delta):
+    clock = FakeTime(render_time=0.25)
+    monkeypatch.setattr(ipythonblocks, '_now', clock)
+    monkeypatch.setattr(ipythonblocks.time, 'sleep', clock.sleep)
+    monkeypatch.setattr(ipythonblocks, 'display', clock.display)
+    monkeypatch.setattr(ipythonblocks.BlockGrid, '_pop_changes',
+                        lambda self: [0, 0, 0, 20])
+
+    bg = ipythonblocks.BlockGrid(2, 2)
+    for block in bg.animate(stop_time=0.1, delta=delta):
+        pass
+
+    assert clock.sleeps == []
+    assert bg.animation_stats.frames == 3
+    assert bg.animation_stats.dropped == 2
+
+
+@pytest.mark.parametrize('delta', [False, True])
+def test_animate_stats_break(monkeypatch, delta):
+    clock = FakeTime(render_time=0.25)
+    monkeypatch.setattr(ipythonblocks, '_now', clock)
+    monkeypatch.setattr(ipythonblocks.time, 'sleep', clock.sleep)
+    monkeypatch.setattr(ipythonblocks, 'display', clock.display)
+    monkeypatch.setattr(ipythonblocks.BlockGrid, '_pop_changes',
+                        lambda self: [0, 0, 0, 20])
+
+    bg = ipythonblocks.BlockGrid(2, 2)
+    for block in bg.animate(stop_time=0.1, delta=delta):
+        if block.row == 1:
+            break
+
+    assert bg.animation_stats.frames == 2
+    assert bg.animation_stats.dropped == 1
+
+    with pytest.raises(RuntimeError):
+        for block in bg.animate(stop_time=0.1, delta=delta):
+            raise RuntimeError('stop')
+
+    assert bg.animation_stats.frames == 1
+    assert bg.animation_stats.dropped == 0
+
+
+def test_flash_counts_render_time(monkeypatch):
+    clock = FakeTime(render_time=0.05)
+    monkeypatch.setattr(ipythonblocks, '_now', clock)
+    monkeypatch.setattr(ipythonblocks.time, 'sleep', clock.sleep)
+    monkeypatch.setattr(ipythonblocks, 'display', clock.display)
+
+    ipythonblocks.BlockGrid(2, 2).flash(display_time=0.2)
+
+    assert clock.sleeps == pytest.approx([0.15])
+
+
+def test_version_bumped_by_writes(basic_grid):
+    bg = basic_grid
+    view = bg[1:3, 1:3]
+    writes = [
+        lambda: setattr(bg[0, 0], 'red', 10),
+        lambda: setattr(bg[0, 0], 'size', 5),
+        lambda: setattr(view[0, 0], 'rgb', (1, 1, 1)),
+        lambda: bg.__setitem__((2, 3), (4, 5, 6)),
+        lambda: bg.__setitem__((slice(0, 2), 1), ipythonblocks.Block(1, 2, 3)),
+        lambda: bg.__setitem__(slice(None), bg.copy()),
+        lambda: bg.__setitem__(0, np.zeros((1, 5, 3))),
+        lambda: setattr(bg, 'block_size', 10),
+        lambda: setattr(bg, 'lines_on', False),
+    ]
+
+    for write in writes:
+        version = int(bg._version)
+        write()
+        assert bg._version > version
+        assert view._version is bg._version
+
+
+def test_render_cache(basic_grid, monkeypatch):
+    monkeypatch.setattr(uuid, 'uuid4', fake_uuid)
+    bg = basic_grid
+    html = bg._repr_html_()
+
+    assert bg._repr_html_() == html
+    assert bg.cache_stats == ipythonblocks.CacheStats(hits=1, misses=1)
+
+    # changes through a view invalidate the grid's cache
+    bg[1:3, 1:3][0, 0].red = 200
+    new_html = bg._repr_html_()
+
+    assert new_html != html
+    assert bg.cache_stats == ipythonblocks.CacheStats(hits=1, misses=2)
+    assert new_html == ipythonblocks.BlockGrid._repr_html_(bg.copy())
+
+    # options are part of the cache key
+    bg.css_classes = True
+    assert bg._repr_html_() != new_html
+    assert bg.cache_stats.misses == 3
+
+
+def test_render_cache_outputs(basic_grid, capsys):
+    bg = basic_grid
+
+    for _ in range(2):
+        bg.to_text()
+        fp = io.BytesIO()
+        bg._write_image(fp)
+        bg._canvas_html('abc')
+
+    assert bg.cache_stats == ipythonblocks.CacheStats(hits=3, misses=3)
+
+    text = capsys.readouterr()[0]
+    assert text[:len(text) // 2] == text[len(text) // 2:]
+
+    bg.block_size = 2
+    bg.to_text()
+    fp2 = io.BytesIO()
+    bg._write_image(fp2)
+
+    assert '# block size{0}2{0}'.format(os.linesep) in capsys.readouterr()[0]
+    assert fp2.getvalue() != fp.getvalue()
+    assert bg.cache_stats == ipythonblocks.CacheStats(hits=3, misses=5)
+
+
+@pytest.mark.parametrize('chunk', [7, 2 ** 22])
+def test_from_text(monkeypatch, chunk):
+    monkeypatch.setattr(ipythonblocks, '_TEXT_CHUNK', chunk)
+
+    text = os.linesep.join([
+        '# width height', '3 2',
+        '# block size', '5',
+        '# initial color', '9 9 9',
+        '# row column red green blue',
+        '0 1 1 2 3 ',
+        '1 2 4 5 600',
+        '1 0 7 8 9'])
+    bg = ipythonblocks.BlockGrid.from_text(io.StringIO(text))
+
+    assert bg.shape == (3, 2)
+    assert bg.block_size == 5
+    assert bg[0, 0].rgb == (9, 9, 9)
+    assert bg[0, 1].rgb == (1, 2, 3)
+    assert bg[1, 2].rgb == (4, 5, 255)
+    assert bg[1, 0].rgb == (7, 8, 9)
+
+
+def test_from_text_round_trip(basic_grid, tmpdir):
+    basic_grid[2, 3] = (200, 100, 0)
+    basic_grid[5, 4] = (0, 100, 200)
+    filename = str(tmpdir.join('grid.txt'))
+    basic_grid.to_text(filename)
+
+    assert ipythonblocks.BlockGrid.from_text(filename) == basic_grid
+
+
+@pytest.mark.parametrize('line', ['0 1 2 3', '0 1 2 3 x', '0 9 1 2 3'])
+def test_from_text_bad_blocks(line):
+    text = '\n'.join(['2 2', '20', '0 0 0', line])
+
+    with pytest.raises((ValueError, IndexError)):
+        ipythonblocks.BlockGrid.from_text(io.StringIO(text))
+
+
+def reference_text(grid, fill=None):
+    """
+    to_text output made a block at a time.
+
+    """
+    lines = ['# width height', '{0} {1}'.format(grid.width, grid.height),
+             '# block size', str(grid.block_size),
+             '# initial color', '{0} {1} {2}'.format(*(fill or (0, 0, 0))),
+             '# row column red green blue']
+    lines.extend(' '.join(map(str, (b.row, b.col) + b.rgb))
+                 for b in grid if b.rgb != fill)
+    return os.linesep.join(lines) + os.linesep
+
+
+@pytest.mark.parametrize('grid', [
+    ipythonblocks.BlockGrid(5, 3),
+    ipythonblocks.ImageGrid(5, 3, origin='lower-left'),
+    ipythonblocks.ImageGrid(5, 3, origin='upper-left')])
+@pytest.mark.parametrize('fill', [None, (0, 0, 0), (1, 2, 3)])
+def test_to_text_chunks(grid, fill, capsys, monkeypatch):
+    monkeypatch.setattr(ipythonblocks, '_TEXT_LINES', 4)
+    monkeypatch.setattr(ipythonblocks, '_TEXT_CACHE_BLOCKS', 0)
+
+    grid = grid.copy()
+    grid[1, 2] = (1, 2, 3)
+    grid[2, 1] = (4, 5, 6)
+    grid.to_text(fill=fill)
+
+    assert capsys.readouterr()[0] == reference_text(grid, fill)
+
+
+def test_to_text_fill_round_trip(basic_grid, tmpdir):
+    basic_grid[2, 3] = (200, 100, 0)
+    filename = str(tmpdir.join('grid.txt'))
+    basic_grid.to_text(filename, fill=(1, 2, 3))
+
+    with open(filename) as f:
+        assert len(f.readlines()) == 8
+
+    assert ipythonblocks.BlockGrid.from_text(filename) == basic_grid
+
+
+def test_to_text_gzip(basic_grid, tmpdir):
+    import gzip
+
+    basic_grid[2, 3] = (200, 100, 0)
+    filename = str(tmpdir.join('grid.txt.gz'))
+    basic_grid.to_text(filename)
+
+    with gzip.open(filename, 'rt') as f:
+        assert f.read() == reference_text(basic_grid)
+
+    assert ipythonblocks.BlockGrid.from_text(filename) == basic_grid
+
+
+def test_iter_fast_paths(basic_grid):
+    bg = basic_grid
+    bg[:, :] = np.arange(6 * 5 * 3).reshape(6, 5, 3)
+
+    blocks = list(bg)
+    ref = [bg[r, c] for r in range(bg.height) for c in range(bg.width)]
+
+    assert [(b.row, b.col, b.rgb) for b in blocks] == \
+        [(b.row, b.col, b.rgb) for b in ref]
+    assert list(bg.iter_rgb()) == [b.rgb for b in ref]
+    assert list(bg.enumerate_rgb()) == [(b.row, b.col, b.rgb) for b in ref]
+
+    rows = list(bg.iter_rows())
+    assert len(rows) == bg.height
+    np.testing.assert_array_equal(rows[2], bg._colors[2])
+    with pytest.raises(ValueError):
+        rows[0][0] = 0
+
+
+def test_iter_blocks_write_through(basic_grid):
+    basic_grid._dirty[...] = False
+
+    for block in basic_grid:
+        if block.row == 1:
+            block.size = 3
+
+    assert (basic_grid._sizes[1] == 3).all()
+    assert basic_grid._dirty[1].all()
+    assert not basic_grid._dirty[0].any()
+
+
+@pytest.mark.parametrize('vectorized', [True, False])
+def test_apply(basic_grid, vectorized):
+    bg = basic_grid
+    bg._dirty[...] = False
+    version = int(bg._version)
+
+    bg.apply(lambda row, col: (row * 100, col * 100, 300), vectorized)
+
+    for block in bg:
+        assert block.rgb == (min(block.row * 100, 255),
+                             min(block.col * 100, 255), 255)
+    assert bg._dirty.all()
+    assert int(bg._version) > version
+
+
+@pytest.mark.parametrize('vectorized', [True, False])
+def test_map(basic_grid, vectorized):
+    bg = basic_grid
+    expected = [(255 - b.red, b.green, 2 * b.blue) for b in bg]
+
+    bg.map(lambda red, green, blue: (255 - red, green, 2 * blue), vectorized)
+
+    assert list(bg.iter_rgb()) == [tuple(min(c, 255) for c in rgb)
+                                   for rgb in expected]
+
+
+def test_map_marks_changed(basic_grid):
+    bg = basic_grid
+    bg._dirty[...] = False
+
+    bg.map(lambda red, green, blue: (red, green, blue))
+    assert not bg._dirty.any()
+
+    bg.map(lambda red, green, blue: (red, green, np.where(red, 1, blue)))
+    assert bg._dirty.tolist() == (bg._colors[..., 0] != 0).tolist()
+
+
+def test_apply_array_result():
+    bg = ipythonblocks.BlockGrid(3, 2)
+    bg.apply(lambda row, col: np.dstack([row, col, row + col]) * 2.4)
+
+    assert bg[1, 2].rgb == (2, 5, 7)
+
+
+def test_apply_bad_result():
+    bg = ipythonblocks.BlockGrid(3, 2)
+
+    with pytest.raises(ipythonblocks.ShapeMismatch):
+        bg.apply(lambda row, col: np.zeros((3, 3, 3)))
+    with pytest.raises(ipythonblocks.ShapeMismatch):
+        bg.apply(lambda row, col: (row, col), vectorized=False)
+    with pytest.raises(ipythonblocks.InvalidColorSpec):
+        bg.apply(lambda row, col: ('a', 'b', 'c'))
+
+
+def test_from_function():
+    bg = ipythonblocks.BlockGrid.from_function(
+        4, 3, lambda row, col: (row, col, 0), block_size=5)
+
+    assert bg.shape == (4, 3)
+    assert bg.block_size == 5
+    assert [b.rgb for b in bg] == [(b.row, b.col, 0) for b in bg]
+
+
+def test_to_array(basic_grid):
+    bg = basic_grid
+    colors = bg.to_array()
+
+    assert colors.shape == (bg.height, bg.width, 3)
+    assert colors.dtype == np.uint8
+    assert [tuple(c) for c in colors.reshape(-1, 3).tolist()] == \
+        list(bg.iter_rgb())
+
+    colors[1, 2] = (1, 2, 3)
+    assert bg[1, 2].rgb == (1, 2, 3)
+
+    copied = bg.to_array(copy=True)
+    copied[1, 2] = (4, 5, 6)
+    assert bg[1, 2].rgb == (1, 2, 3)
+
+
+def test_array_interface(basic_grid):
+    bg = basic_grid
+    colors = np.asarray(bg)
+
+    assert np.shares_memory(colors, bg._colors)
+    assert np.array_equal(colors, bg._colors)
+    assert not colors.flags.writeable
+    with pytest.raises(ValueError):
+        colors[0, 0] = (9, 9, 9)
+
+    copied = np.array(bg)
+    assert not np.shares_memory(copied, bg._colors)
+    copied[0, 0] = (9, 9, 9)
+    assert bg[0, 0].rgb != (9, 9, 9)
+
+    assert np.array(bg, dtype=float).dtype == float
+    assert np.mean(bg) == bg._colors.mean()
+
+    # reading through NumPy leaves the render cache on
+    assert not bg._shared
+    bg._repr_html_()
+    bg._repr_html_()
+    assert bg.cache_stats.hits == 1
+
+
+def test_shared_colors_not_cached(basic_grid):
+    bg = basic_grid
+    bg._repr_html_()
+    bg._pop_changes()
+
+    colors = bg.to_array()
+    colors[0, 0] = (9, 9, 9)
+
+    assert 'rgb(9, 9, 9)' in bg._repr_html_()
+    assert bg._pop_changes()[:4] == [0, 0, 0x090909, bg[0, 0].size]
+
+    # views share the flag
+    assert 'rgb(9, 9, 9)' in bg[:1, :1]._repr_html_()
+
+
+def test_from_array():
+    colors = np.arange(2 * 3 * 3, dtype=np.uint8).reshape(2, 3, 3)
+    bg = ipythonblocks.BlockGrid.from_array(colors, block_size=5)
+
+    assert bg.shape == (3, 2)
+    assert bg.block_size == 5
+    assert bg[1, 2].rgb == tuple(colors[1, 2])
+
+    colors[1, 2] = 0
+    assert bg[1, 2].rgb == (0, 0, 0)
+
+    copied = ipythonblocks.BlockGrid.from_array(colors, copy=True)
+    colors[1, 2] = 1
+    assert copied[1, 2].rgb == (0, 0, 0)
+
+
+def test_from_array_converts():
+    bg = ipythonblocks.BlockGrid.from_array([[[-1, 1.4, 300]]])
+
+    assert bg[0, 0].rgb == (0, 1, 255)
+
+    with pytest.raises(ipythonblocks.ShapeMismatch):
+        ipythonblocks.BlockGrid.from_array(np.zeros((2, 2, 4)))
+
+
+def test_copy_storage(basic_grid):
+    bg = basic_grid
+    bg.lines_on = False
+    bg.css_classes = True
+    ng = bg.copy()
+
+    assert ng == bg
+    assert not ng.lines_on
+    assert ng.css_classes
+    assert not np.shares_memory(ng._colors, bg._colors)
+    assert ng._version is not bg._version
+
+    dg = copy.deepcopy(bg)
+    assert dg == bg
+    assert not np.shares_memory(dg._colors, bg._colors)
+
+
+def test_copy_on_write(basic_grid):
+    bg = basic_grid
+    first = bg.copy(copy_on_write=True)
+    second = bg.copy(copy_on_write=True)
+    third = second.copy(copy_on_write=True)
+
+    # copies share frozen storage with the grid
+    assert bg._colors is first._colors is second._colors is third._colors
+    assert not bg._colors.flags.writeable
+
+    bg[0, 0] = (9, 9, 9)
+    assert first[0, 0].rgb != (9, 9, 9)
+    assert not np.shares_memory(bg._colors, first._colors)
+    assert first._colors is second._colors is third._colors
+
+    # a snapshot right after a change shares storage until either side
+    # is changed
+    fourth = bg.copy(copy_on_write=True)
+    assert fourth._colors is bg._colors
+    assert fourth[0, 0].rgb == (9, 9, 9)
+
+    fourth[0, 1] = (8, 8, 8)
+    assert not np.shares_memory(fourth._colors, bg._colors)
+    assert bg[0, 1].rgb != (8, 8, 8)
+
+    bg[0, 1] = (7, 7, 7)
+    assert fourth[0, 1].rgb == (8, 8, 8)
+    assert first[0, 1].rgb == second[0, 1].rgb == third[0, 1].rgb
+
+
+def test_copy_on_write_shared_array(basic_grid):
+    bg = basic_grid
+    colors = bg.to_array(copy=False)
+    first = bg.copy(copy_on_write=True)
+
+    colors[0, 0] = 9
+    assert first[0, 0].rgb != (9, 9, 9)
+
+
+@pytest.mark.parametrize('change', [
+    lambda g: g.__setitem__((0, 0), (9, 9, 9)),
+    lambda g: g[0, 0].set_colors(9, 9, 9),
+    lambda g: next(iter(g)).set_colors(9, 9, 9),
+    lambda g: g[:1, :1].__setitem__((0, 0), (9, 9, 9)),
+    lambda g: g.apply(lambda i, j: (9, 9, 9)),
+    lambda g: g.map(lambda r, gr, b: (9, 9, 9)),
+    lambda g: g.to_array().__setitem__((0, 0), 9),
+])
+def test_copy_on_write_change(basic_grid, change):
+    bg = basic_grid
+    original = bg[0, 0].rgb
+    first = bg.copy(copy_on_write=True)
+    second = bg.copy(copy_on_write=True)
+
+    change(first)
+
+    assert first[0, 0].rgb == (9, 9, 9)
+    assert second[0, 0].rgb == original
+    assert bg[0, 0].rgb == original
+
+
+def test_copy_on_write_reads(basic_grid):
+    bg = basic_grid
+    first = bg.copy(copy_on_write=True)
+    second = bg.copy(copy_on_write=True)
+
+    # reading blocks and views doesn't copy the storage
+    rgb = [block.rgb for block in first]
+    view = first[1:, :2]
+    assert view[0, 0].rgb == rgb[first.width]
+    assert first[0, 0].rgb == rgb[0]
+    assert first._colors is second._colors
+
+    # views made before a change see it and stay part of the grid
+    view[0, 0] = (9, 9, 9)
+    assert first[1, 0].rgb == (9, 9, 9)
+    assert first._colors is not second._colors
+    first[1, 1] = (8, 8, 8)
+    assert view[0, 1].rgb == (8, 8, 8)
+    assert second[1, 0].rgb == second[1, 1].rgb == bg[1, 0].rgb
+
+
+@pytest.mark.parametrize('protocol', range(pickle.HIGHEST_PROTOCOL + 1))
+def test_pickle(basic_grid, protocol):
+    bg = basic_grid
+    bg._repr_html_()
+    first = bg.copy(copy_on_write=True)
+    view = bg[1:, 1:]
+
+    for grid in (bg, first, view):
+        new = pickle.loads(pickle.dumps(grid, protocol))
+
+        assert new == grid
+        assert new.block_size == grid.block_size
+        assert new.lines_on == grid.lines_on
+
+        new[0, 0] = (9, 9, 9)
+        assert new[0, 0].rgb == (9, 9, 9)
+        assert grid[0, 0].rgb != (9, 9, 9)
+
+
+def test_copy_on_write_block_size(basic_grid):
+    bg = basic_grid
+    first = bg.copy(copy_on_write=True)
+    second = bg.copy(copy_on_write=True)
+
+    first.block_size = 3
+
+    assert first[0, 0].size == 3
+    assert second[0, 0].size == bg[0, 0].size == bg.block_size
+
+
+def test_eq_storage(basic_grid, monkeypatch):
+    monkeypatch.setattr(ipythonblocks, '_COMPARE_ELEMENTS', 5)
+    bg = basic_grid
+    ng = bg.copy()
+
+    assert bg == bg
+    assert bg == ng
+    assert bg[1:, :] == ng[1:, :]
+    assert bg != bg[1:, :]
+
+    ng[-1, -1] = (255, 255, 255)
+    assert bg != ng
+
+    ng = bg.copy()
+    ng[-1, -1].size = 3
+    assert bg != ng
+
+    assert ipythonblocks.BlockGrid(0, 0) == ipythonblocks.BlockGrid(0, 0)
+
+
+def test_content_digest(basic_grid):
+    bg = basic_grid
+    digest = bg.content_digest()
+
+    assert isinstance(digest, str)
+    assert bg.copy().content_digest() == digest
+    assert bg.copy(copy_on_write=True).content_digest() == digest
+
+    # cached until the grid changes
+    assert bg._digest == (int(bg._version), digest)
+    bg[0, 0] = (100, 100, 100)
+    changed = bg.content_digest()
+    assert changed != digest
+
+    bg[0, 0] = (1, 2, 3)
+    assert bg.content_digest() == digest
+
+    # views change the grid
+    bg[:1, :1] = (100, 100, 100)
+    assert bg.content_digest() == changed
+
+
+@pytest.mark.parametrize('change', [
+    lambda g: setattr(g, 'block_size', 5),
+    lambda g: setattr(g, 'lines_on', False),
+    lambda g: g[1, 1].__setattr__('size', 7),
+    lambda g: g.to_array().__setitem__((0, 0), 200),
+])
+def test_content_digest_changes(basic_grid, change):
+    bg = basic_grid
+    digest = bg.content_digest()
+
+    change(bg)
+
+    assert bg.content_digest() != digest
+
+
+def test_content_digest_layout():
+    # the same colors in a different shape look different
+    wide = ipythonblocks.BlockGrid(4, 1)
+    tall = ipythonblocks.BlockGrid(1, 4)
+
+    assert wide.content_digest() != tall.content_digest()
+    assert ipythonblocks.BlockGrid(4, 3)[1:, 1:].content_digest() == \
+        ipythonblocks.BlockGrid(3, 2).content_digest()
+
+
+def test_unpickle_1_9():
+    """
+    Grids pickled by ipythonblocks 1.9 held a list of rows of Blocks.
+
+    """
+    data = (
+        b'\x80\x02cipythonblocks.ipythonblocks\nBlockGrid\nq\x00)\x81q'
+        b'\x01}q\x02(X\x06\x00\x00\x00_widthq\x03K\x03X\x07\x00\x00\x00_'
+        b'heightq\x04K\x02X\x0b\x00\x00\x00_block_sizeq\x05K\tX\t\x00'
+        b'\x00\x00_lines_onq\x06\x89X\x05\x00\x00\x00_gridq\x07]q\x08(]q'
+        b'\t(cipythonblocks.ipythonblocks\nBlock\nq\n)\x81q\x0b}q\x0c(X'
+        b'\x04\x00\x00\x00_redq\rK\x04X\x06\x00\x00\x00_greenq\x0eK\x05X'
+        b'\x05\x00\x00\x00_blueq\x0fK\x06X\x05\x00\x00\x00_sizeq\x10K'
+        b'\x04X\x04\x00\x00\x00_rowq\x11K\x00X\x04\x00\x00\x00_colq\x12K'
+        b'\x00ubh\n)\x81q\x13}q\x14(h\rK\x04h\x0eK\x05h\x0fK\x06h\x10K\t'
+        b'h\x11Nh\x12Nubh\n)\x81q\x15}q\x16(h\rK\x04h\x0eK\x05h\x0fK\x06'
+        b'h\x10K\th\x11Nh\x12Nube]q\x17(h\n)\x81q\x18}q\x19(h\rK\x04h'
+        b'\x0eK\x05h\x0fK\x06h\x10K\th\x11Nh\x12Nubh\n)\x81q\x1a}q\x1b(h'
+        b'\rK\x04h\x0eK\x05h\x0fK\x06h\x10K\th\x11Nh\x12Nubh\n)\x81q\x1c'
+        b'}q\x1d(h\rK\x07h\x0eK\x08h\x0fK\th\x10K\th\x11K\x01h\x12K\x02u'
+        b'beeub.')
+
+    bg = pickle.loads(data)
+
+    assert bg.shape == (3, 2)
+    assert bg.block_size == 9
+    assert not bg.lines_on
+    assert bg[1, 2].rgb == (7, 8, 9)
+    assert bg[0, 0].size == 4
+    assert bg[0, 1].rgb == (4, 5, 6)
+    assert bg[0, 1].size == 9
+
+    bg[0, 1] = (1, 2, 3)
+    assert bg[0, 1].rgb == (1, 2, 3)
+    assert bg.copy() == bg
@@ -1,3 +1,5 @@
+import pickle
+import numpy as np
 import pytest
 
 from .. import ipythonblocks
@@ -82,9 +84,14 @@ def test_setitem_bad_index(upper_left):
 def test_getitem_upper_left_single(upper_left):
     ul = upper_left
 
+    ul._colors[...] = 0
+    ul._colors[1, 0] = (1, 2, 3)
+
     for row in range(ul.height):
         for col in range(ul.width):
-            assert ul[col, row] is ul._grid[row][col]
+            assert ul[col, row].rgb == tuple(ul._colors[row, col])
+
+    assert ul[0, 1].rgb == (1, 2, 3)
 
 
 def test_getitem_upper_left_slice(upper_left):
@@ -94,16 +101,23 @@ def test_getitem_upper_left_slice(upper_left):
 
     assert ng.width == 1
     assert ng.height == 2
-    assert ng._grid == [[ul._grid[0][0]], [ul._grid[1][0]]]
+    assert ng._colors.tolist() == [[ul._colors[0, 0].tolist()],
+                                   [ul._colors[1, 0].tolist()]]
+    assert np.shares_memory(ng._colors, ul._colors)
 
 
 def test_getitem_lower_left_single(lower_left):
     ll = lower_left
 
+    ll._colors[...] = 0
+    ll._colors[1, 0] = (1, 2, 3)
+
     for row in range(ll.height):
         for col in range(ll.width):
             trow = ll.height - row - 1
-            assert ll[col, row] is ll._grid[trow][col]
+            assert ll[col, row].rgb == tuple(ll._colors[trow, col])
+
+    assert ll[0, 1].rgb == (1, 2, 3)
 
 
 def test_getitem_lower_left_single_neg(lower_left):
@@ -125,7 +139,9 @@ def test_getitem_lower_left_slice(lower_left):
 
     assert ng.width == 1
     assert ng.height == 2
-    assert ng._grid == [[ll._grid[-2][0]], [ll._grid[-1][0]]]
+    assert ng._colors.tolist() == [[ll._colors[-2, 0].tolist()],
+                                   [ll._colors[-1, 0].tolist()]]
+    assert np.shares_memory(ng._colors, ll._colors)
 
 
 def test_setitem_lower_left_single(lower_left):
@@ -133,9 +149,7 @@ def test_setitem_lower_left_single(lower_left):
 
     ll[0, 1].set_colors(201, 202, 203)
 
-    assert ll._grid[-2][0].red == 201
-    assert ll._grid[-2][0].green == 202
-    assert ll._grid[-2][0].blue == 203
+    assert ll._colors[-2, 0].tolist() == [201, 202, 203]
 
 
 def test_setitem_lower_left_slice(lower_left):
@@ -143,15 +157,14 @@ def test_setitem_lower_left_slice(lower_left):
 
     ll[:, ::2] = (201, 202, 203)
 
-    for pix in ll._grid[0]:
-        assert pix.red == 201
-        assert pix.green == 202
-        assert pix.blue == 203
+    for rgb in ll._colors[0]:
+        assert rgb.tolist() == [201, 202, 203]
+
+    for rgb in ll._colors[2]:
+        assert rgb.tolist() == [201, 202, 203]
 
-    for pix in ll._grid[2]:
-        assert pix.red == 201
-        assert pix.green == 202
-        assert pix.blue == 203
+    for rgb in ll._colors[1]:
+        assert rgb.tolist() == [7, 8, 9]
 
 
 def test_slice_assignment(lower_left):
@@ -186,3 +199,263 @@ def test_setitem_with_grid_ll(lower_left):
             assert b.rgb == (4, 5, 6)
         else:
             assert b.rgb == (7, 8, 9)
+
+
+def test_view_keeps_origin(upper_left, lower_left):
+    ul_view = upper_left[:, 1:]
+    ll_view = lower_left[:, 1:]
+
+    assert ul_view.origin == 'upper-left'
+    assert ll_view.origin == 'lower-left'
+
+    upper_left[1, 1] = (1, 1, 1)
+    lower_left[1, 1] = (1, 1, 1)
+
+    assert ul_view[1, 0].rgb == (1, 1, 1)
+    assert ll_view[1, 0].rgb == (1, 1, 1)
+
+
+def test_setitem_with_grid_other_origin(upper_left, lower_left):
+    lower_left[0, 0] = (1, 1, 1)
+    lower_left[1, 2] = (2, 2, 2)
+
+    upper_left[:, :] = lower_left
+
+    assert upper_left[0, 0].rgb == (1, 1, 1)
+    assert upper_left[1, 2].rgb == (2, 2, 2)
+    assert upper_left[0, 1].rgb == (7, 8, 9)
+
+
+@pytest.mark.parametrize('origin', ['upper-left', 'lower-left'])
+def test_repr_html_matches_td(origin, monkeypatch):
+    """
+    The grid HTML is built from storage but must match the HTML built
+    from the `_td` of each pixel, top row first.
+
+    """
+    from .test_blockgrid import uuid, fake_uuid
+
+    ig = ipythonblocks.ImageGrid(3, 4, (7, 8, 9), 20, True, origin)
+    ig[0, 0] = (1, 2, 3)
+    ig[2, 1] = (4, 5, 6)
+    ig[1, 3].size = 5
+
+    monkeypatch.setattr(uuid, 'uuid4', fake_uuid)
+
+    rows = range(ig.height)
+    if origin == 'lower-left':
+        rows = rows[::-1]
+
+    html = ''.join(
+        ipythonblocks._TR.format(''.join(ig[c, r]._td
+                                         for c in range(ig.width)))
+        for r in rows)
+    html = ipythonblocks._TABLE.format(fake_uuid(), 1, html)
+
+    assert ig._repr_html_() == html
+
+
+def test_hover_index(upper_left, lower_left):
+    assert upper_left._hover_index() == 'col + ", " + row'
+    assert lower_left._hover_index() == 'col + ", " + (2 - row)'
+
+
+def test_canvas_html_origin(upper_left, lower_left):
+    import base64
+
+    upper_left[0, 0] = (1, 1, 1)
+    lower_left[0, 0] = (1, 1, 1)
+
+    def first_color(grid):
+        html = grid._canvas_html('abc')
+        data = html.split('atob("')[1].split('"')[0]
+        return tuple(bytearray(base64.b64decode(data))[:3])
+
+    # the canvas is drawn top row first
+    assert first_color(upper_left) == (1, 1, 1)
+    assert first_color(lower_left) == (7, 8, 9)
+
+
+def test_dirty_tracking(lower_left):
+    lower_left._dirty[...] = False
+
+    lower_left[0, 0] = (1, 1, 1)
+    lower_left[1, 1:][0, 0].red = 5
+
+    # storage is top row first
+    assert sorted(zip(*np.nonzero(lower_left._dirty))) == [(1, 1), (2, 0)]
+
+
+@pytest.mark.parametrize('origin', ['lower-left', 'upper-left'])
+def test_from_text_round_trip(origin, tmpdir):
+    ig = ipythonblocks.ImageGrid(3, 2, origin=origin)
+    ig[0, 0] = (1, 2, 3)
+    ig[2, 1] = (4, 5, 6)
+    filename = str(tmpdir.join('grid.txt'))
+    ig.to_text(filename)
+
+    loaded = ipythonblocks.ImageGrid.from_text(filename, origin=origin)
+
+    assert loaded.origin == origin
+    assert loaded == ig
+
+
+@pytest.mark.parametrize('origin', ['lower-left', 'upper-left'])
+@pytest.mark.parametrize('rslice', [
+    slice(None), slice(1, 3), slice(-2, None), slice(None, None, 2),
+    slice(None, None, -1), slice(3, 0, -2), slice(5, 9), 2, -1])
+def test_slice_matches_pixels(origin, rslice):
+    ig = ipythonblocks.ImageGrid(3, 4, origin=origin)
+    for x in range(3):
+        for y in range(4):
+            ig[x, y] = (x, y, 0)
+
+    view = ig[1:, rslice]
+
+    if isinstance(rslice, int):
+        rslice = slice(rslice, rslice + 1 or None)
+    ys = list(range(4))[rslice]
+
+    assert view.height == len(ys)
+    for x in range(view.width):
+        for y in range(view.height):
+            assert view[x, y].rgb == (x + 1, ys[y], 0)
+
+
+@pytest.mark.parametrize('origin', ['lower-left', 'upper-left'])
+def test_pixel_bounds(origin):
+    ig = ipythonblocks.ImageGrid(3, 4, origin=origin)
+    ig[0, -4] = (1, 1, 1)
+
+    assert ig[0, 0].rgb == (1, 1, 1)
+    assert ig[-3, 0].rgb == (1, 1, 1)
+    for index in [(0, 4), (0, -5), (3, 0), (-4, 0)]:
+        with pytest.raises(IndexError):
+            ig[index]
+
+
+@pytest.mark.parametrize('origin', ['lower-left', 'upper-left'])
+def test_iter_fast_paths(origin):
+    ig = ipythonblocks.ImageGrid(3, 4, origin=origin)
+    ig[:, :] = np.arange(3 * 4 * 3).reshape(3, 4, 3)
+
+    ref = [ig[x, y] for x in range(ig.width) for y in range(ig.height)]
+
+    assert [(p.x, p.y, p.rgb) for p in ig] == \
+        [(p.x, p.y, p.rgb) for p in ref]
+    assert list(ig.iter_rgb()) == [p.rgb for p in ref]
+    assert list(ig.enumerate_rgb()) == [(p.x, p.y, p.rgb) for p in ref]
+
+    rows = list(ig.iter_rows())
+    assert len(rows) == ig.height
+    for y, row in enumerate(rows):
+        assert [tuple(rgb) for rgb in row.tolist()] == \
+            [ig[x, y].rgb for x in range(ig.width)]
+
+
+@pytest.mark.parametrize('origin', ['lower-left', 'upper-left'])
+@pytest.mark.parametrize('vectorized', [True, False])
+def test_apply_map(origin, vectorized):
+    ig = ipythonblocks.ImageGrid.from_function(
+        3, 4, lambda x, y: (x, y, 10 * x + y), vectorized, origin=origin)
+
+    assert ig.origin == origin
+    assert [p.rgb for p in ig] == [(p.x, p.y, 10 * p.x + p.y) for p in ig]
+
+    ig.map(lambda red, green, blue: (blue, red, green), vectorized)
+
+    assert [p.rgb for p in ig] == [(10 * p.x + p.y, p.x, p.y) for p in ig]
+
+
+@pytest.mark.parametrize('origin', ['lower-left', 'upper-left'])
+def test_to_from_array(origin):
+    colors = np.arange(3 * 4 * 3, dtype=np.uint8).reshape(3, 4, 3)
+    ig = ipythonblocks.ImageGrid.from_array(colors, origin=origin)
+
+    assert ig.shape == (3, 4)
+    assert ig.origin == origin
+    assert [p.rgb for p in ig] == [tuple(colors[p.x, p.y]) for p in ig]
+
+    array = ig.to_array()
+    assert array.shape == (3, 4, 3)
+    assert np.shares_memory(array, colors)
+    assert np.array_equal(np.asarray(ig), colors)
+
+    array[2, 0] = (1, 2, 3)
+    assert ig[2, 0].rgb == (1, 2, 3)
+
+    assert np.array_equal(ig[1:, 2:].to_array(), colors[1:, 2:])
+
+
+@pytest.mark.parametrize('origin', ['lower-left', 'upper-left'])
+def test_setitem_array_round_trip(origin):
+    ig = ipythonblocks.ImageGrid(3, 4, origin=origin)
+    ig[0, 1] = (50, 50, 50)
+    ig[2, 3] = (1, 2, 3)
+
+    colors = ig.to_array(copy=True)
+    ig[:, :] = np.zeros_like(colors)
+    ig[:, :] = colors
+
+    assert ig[0, 1].rgb == (50, 50, 50)
+    assert ig[2, 3].rgb == (1, 2, 3)
+    assert np.array_equal(ig.to_array(), colors)
+
+    ig[1:, 2:] = colors[:2, :2]
+    assert ig[1, 3].rgb == (50, 50, 50)
+
+    with pytest.raises(ipythonblocks.ShapeMismatch):
+        ig[:, :] = colors.swapaxes(0, 1)
+
+
+def test_setitem_array_single_pixel():
+    ig = ipythonblocks.ImageGrid(3, 4)
+
+    with pytest.raises(ValueError):
+        ig[0, 0] = np.zeros((1, 1, 3))
+
+    ig[0, 0] = np.array([1, 2, 3])
+    assert ig[0, 0].rgb == (1, 2, 3)
+
+
+def test_copy_on_write():
+    ig = ipythonblocks.ImageGrid(3, 2, origin='upper-left')
+    ig[0, 0] = (1, 2, 3)
+
+    first = ig.copy(copy_on_write=True)
+    second = ig.copy(copy_on_write=True)
+    assert first.origin == 'upper-left'
+    assert first == ig
+
+    first[0, 0] = (4, 5, 6)
+    assert second[0, 0].rgb == ig[0, 0].rgb == (1, 2, 3)
+
+
+def test_unpickle_1_9():
+    """
+    Grids pickled by ipythonblocks 1.9 held a list of rows of Pixels.
+
+    """
+    data = (
+        b'\x80\x02cipythonblocks.ipythonblocks\nImageGrid\nq\x00)\x81q'
+        b'\x01}q\x02(X\x06\x00\x00\x00_widthq\x03K\x02X\x07\x00\x00\x00_'
+        b'heightq\x04K\x02X\x0b\x00\x00\x00_block_sizeq\x05K\x14X\t\x00'
+        b'\x00\x00_lines_onq\x06\x88X\x05\x00\x00\x00_gridq\x07]q\x08(]q'
+        b'\t(cipythonblocks.ipythonblocks\nPixel\nq\n)\x81q\x0b}q\x0c(X'
+        b'\x04\x00\x00\x00_redq\rK\x00X\x06\x00\x00\x00_greenq\x0eK\x00X'
+        b'\x05\x00\x00\x00_blueq\x0fK\x00X\x05\x00\x00\x00_sizeq\x10K'
+        b'\x14X\x04\x00\x00\x00_rowq\x11NX\x04\x00\x00\x00_colq\x12Nubh'
+        b'\n)\x81q\x13}q\x14(h\rK\x00h\x0eK\x00h\x0fK\x00h\x10K\x14h\x11'
+        b'Nh\x12Nube]q\x15(h\n)\x81q\x16}q\x17(h\rK\x00h\x0eK\x00h\x0fK'
+        b'\x00h\x10K\x14h\x11Nh\x12Nubh\n)\x81q\x18}q\x19(h\rK\x07h\x0eK'
+        b'\x08h\x0fK\th\x10K\x14h\x11K\x00h\x12K\x01ubeeX\x07\x00\x00'
+        b'\x00_originq\x1aX\n\x00\x00\x00lower-leftq\x1bub.')
+
+    ig = pickle.loads(data)
+
+    assert type(ig) is ipythonblocks.ImageGrid
+    assert ig.origin == 'lower-left'
+    assert ig.shape == (2, 2)
+    assert ig[1, 0].rgb == (7, 8, 9)
+    assert ig[0, 0].rgb == ig[1, 1].rgb == (0, 0, 0)
+    assert [p.rgb for p in ig] == [(0, 0, 0), (0, 0, 0), (7, 8, 9), (0, 0, 0)]
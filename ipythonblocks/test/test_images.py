@@ -2,14 +2,21 @@
 Tests for the ability to save images of grids.
 
 """
+import io
 import os
+import struct
 import tempfile
+import zlib
 
 import mock
+import numpy as np
 import pytest
-from PIL import Image
+from PIL import Image, ImageSequence
 
-from ..ipythonblocks import BlockGrid, ImageGrid, colors
+from .. import ipythonblocks
+from ..ipythonblocks import (
+    AnimationWriter, BlockGrid, ImageGrid, ShapeMismatch, colors,
+    save_animation, _png_chunks)
 
 
 @pytest.fixture
@@ -67,16 +74,18 @@ def test_save_image(bg, ig, bg_png, ig_png):
 
     for im in (bg_im, ig_im):
         assert im.format == 'PNG'
+        assert im.mode == 'P'
         assert im.size == (bg.width, bg.height)
 
+    bg_im = bg_im.convert('RGB')
+    ig_im = ig_im.convert('RGB')
+
     for bg_block, bg_pix, ig_pix in zip(bg, bg_im.getdata(), ig_im.getdata()):
         assert bg_block.rgb == bg_pix
         assert bg_block.rgb == ig_pix
 
 
 def test_show_image(bg, ig):
-    from .. import ipythonblocks
-
     with mock.patch.object(ipythonblocks, 'display') as display:
         bg.show_image()
         display.assert_called_once()
@@ -84,3 +93,361 @@ def test_show_image(bg, ig):
     with mock.patch.object(ipythonblocks, 'display') as display:
         ig.show_image()
         display.assert_called_once()
+
+
+def draw_rectangles(grid):
+    """
+    Draw a grid one rectangle per block, the way _write_image used to.
+
+    """
+    from PIL import ImageDraw
+
+    im = Image.new(
+        mode='RGB', size=grid._calc_image_size(), color=(255, 255, 255))
+    draw = ImageDraw.Draw(im)
+    bs = grid.block_size
+
+    for r in range(grid.height):
+        for c in range(grid.width):
+            px_r = r * bs
+            px_c = c * bs
+            if grid.lines_on:
+                px_r += r + 1
+                px_c += c + 1
+
+            rect = ((px_c, px_r), (px_c + bs - 1, px_r + bs - 1))
+            draw.rectangle(rect, fill=tuple(grid._colors[r, c].tolist()))
+
+    return im
+
+
+@pytest.mark.parametrize('lines_on', [True, False])
+@pytest.mark.parametrize('block_size', [1, 3, 20])
+def test_image_matches_rectangles(bg, lines_on, block_size):
+    bg.lines_on = lines_on
+    bg.block_size = block_size
+
+    expected = draw_rectangles(bg)
+    im = Image.fromarray(bg._image_array())
+
+    assert im.size == expected.size
+    assert im.tobytes() == expected.tobytes()
+
+
+def write_png(grid, **options):
+    fp = io.BytesIO()
+    grid._write_image(fp, **options)
+    return fp.getvalue()
+
+
+@pytest.mark.parametrize('lines_on', [True, False])
+def test_palette_png(bg, lines_on):
+    bg.lines_on = lines_on
+    bg.block_size = 3
+
+    im = Image.open(io.BytesIO(write_png(bg)))
+
+    assert im.mode == 'P'
+    assert im.convert('RGB').tobytes() == bg._image_array().tobytes()
+
+
+def test_many_colors_png():
+    grid = BlockGrid(20, 20, block_size=2)
+    grid[:, :] = np.arange(20 * 20 * 3).reshape(20, 20, 3) % 256
+
+    im = Image.open(io.BytesIO(write_png(grid)))
+
+    assert im.mode == 'RGB'
+    assert im.tobytes() == grid._image_array().tobytes()
+
+
+def test_png_compression(bg):
+    bg.block_size = 20
+
+    assert len(write_png(bg, compress_level=9)) < \
+        len(write_png(bg, compress_level=0))
+    assert write_png(bg, strategy=zlib.Z_RLE) != \
+        write_png(bg, strategy=zlib.Z_HUFFMAN_ONLY)
+
+
+@pytest.mark.parametrize('options', [
+    {'compress_level': 1}, {'compress_level': 9}, {'strategy': zlib.Z_RLE}])
+def test_png_compression_smallest(options):
+    rs = np.random.RandomState(0)
+    palette = rs.randint(0, 256, size=(16, 3))
+    grid = BlockGrid(50, 50, block_size=10)
+    grid[:, :] = palette[rs.randint(0, 16, size=(50, 50))]
+
+    pil_options = {'compress_level': options.get('compress_level', 6)}
+    if 'strategy' in options:
+        pil_options['compress_type'] = options['strategy']
+    sizes = []
+    for palette in (True, False):
+        fp = io.BytesIO()
+        grid._pil_image(palette=palette).save(fp, format='png',
+                                              **pil_options)
+        sizes.append(fp.tell())
+
+    png = write_png(grid, **options)
+
+    assert len(png) == min(sizes)
+    im = Image.open(io.BytesIO(png))
+    assert im.convert('RGB').tobytes() == grid._image_array().tobytes()
+
+
+def test_save_image_gif(bg, request):
+    name = tempfile.NamedTemporaryFile(suffix='.gif').name
+    request.addfinalizer(lambda: os.remove(name))
+
+    bg.save_image(name, compress_level=9)
+
+    im = Image.open(name)
+    assert im.format == 'GIF'
+    assert im.convert('RGB').tobytes() == bg._image_array().tobytes()
+
+
+def grid_states(frames):
+    """
+    Yield a grid with a block changed in every step but one, saving an
+    image of each state in `frames`.
+
+    """
+    grid = BlockGrid(5, 4, block_size=3)
+    for change in [None, (1, 2), None, (3, 4)]:
+        if change:
+            grid[change] = colors.Red
+        frames.append(grid._image_array())
+        yield grid
+
+
+def read_frames(data):
+    im = Image.open(io.BytesIO(data))
+    return [(np.asarray(frame.convert('RGB')), frame.info['duration'])
+            for frame in ImageSequence.Iterator(im)]
+
+
+@pytest.mark.parametrize('format', ['gif', 'png'])
+def test_save_animation(format):
+    fp = io.BytesIO()
+    frames = []
+
+    assert save_animation(grid_states(frames), fp, format, 0.1) == 3
+
+    read = read_frames(fp.getvalue())
+
+    # the unchanged frame is merged into the one before it
+    assert [duration for _, duration in read] == [100, 200, 100]
+    for (pixels, _), ref in zip(read, [frames[0], frames[2], frames[3]]):
+        np.testing.assert_array_equal(pixels, ref)
+
+
+def test_animation_changed_region():
+    fp = io.BytesIO()
+    save_animation(grid_states([]), fp, 'png')
+
+    regions = [struct.unpack('>IIII', data[4:20])
+               for kind, data in _png_chunks(fp.getvalue())
+               if kind == b'fcTL']
+
+    # (width, height, x, y) of each frame
+    assert regions == [(21, 17, 0, 0), (3, 3, 9, 5), (3, 3, 17, 13)]
+
+
+def test_animation_size_mismatch():
+    with AnimationWriter(io.BytesIO(), 'gif') as writer:
+        writer.add_frame(BlockGrid(2, 2))
+        with pytest.raises(ShapeMismatch):
+            writer.add_frame(BlockGrid(3, 2))
+
+
+def test_animation_format():
+    with pytest.raises(ValueError):
+        AnimationWriter('animation.mp4')
+
+
+@pytest.mark.parametrize('make_path', [
+    lambda name: pytest.importorskip('pathlib').Path(name),
+    lambda name: u'{0}'.format(name)])
+def test_save_animation_path(tmpdir, make_path):
+    name = str(tmpdir.join('animation.gif'))
+    frames = []
+
+    assert save_animation(grid_states(frames), make_path(name)) == 3
+
+    with open(name, 'rb') as f:
+        read = read_frames(f.read())
+    np.testing.assert_array_equal(read[0][0], frames[0])
+
+
+def test_animate_record(request, monkeypatch):
+    monkeypatch.setattr(ipythonblocks, 'display', lambda *a, **kw: None)
+    monkeypatch.setattr(ipythonblocks.time, 'sleep', lambda t: None)
+
+    name = tempfile.NamedTemporaryFile(suffix='.gif').name
+    request.addfinalizer(lambda: os.remove(name))
+
+    grid = BlockGrid(2, 1, block_size=2, lines_on=False)
+    frames = []
+    for block in grid.animate(stop_time=0.05, record=name):
+        frames.append(grid._image_array())
+        block.rgb = (0, 0, 255)
+    frames.append(grid._image_array())
+
+    with open(name, 'rb') as f:
+        read = read_frames(f.read())
+
+    assert [duration for _, duration in read] == [50] * 3
+    for (pixels, _), ref in zip(read, frames):
+        np.testing.assert_array_equal(pixels, ref)
+
+
+@pytest.mark.parametrize('suffix', ['.gif', '.png'])
+def test_animate_record_break(request, monkeypatch, suffix):
+    monkeypatch.setattr(ipythonblocks, 'display', lambda *a, **kw: None)
+    monkeypatch.setattr(ipythonblocks.time, 'sleep', lambda t: None)
+
+    name = tempfile.NamedTemporaryFile(suffix=suffix).name
+    request.addfinalizer(lambda: os.remove(name))
+
+    grid = BlockGrid(3, 1, block_size=2, lines_on=False)
+    frames = []
+    for block in grid.animate(stop_time=0.05, record=name):
+        frames.append(grid._image_array())
+        block.rgb = (0, 0, 255)
+        if block.col == 1:
+            break
+    frames.append(grid._image_array())
+
+    with open(name, 'rb') as f:
+        read = read_frames(f.read())
+
+    assert len(read) == 3
+    for (pixels, _), ref in zip(read, frames):
+        np.testing.assert_array_equal(pixels, ref)
+
+
+def test_gif_unchanged_pixels_transparent():
+    def states():
+        grid = BlockGrid(4, 4, block_size=2)
+        yield grid
+        grid[0, 0] = colors.Red
+        grid[3, 3] = colors.Blue
+        yield grid
+
+    grids = list(g.copy() for g in states())
+    fp = io.BytesIO()
+    save_animation(states(), fp, 'gif')
+
+    assert b'!\xf9\x04\x05' in fp.getvalue()
+    for (pixels, _), grid in zip(read_frames(fp.getvalue()), grids):
+        np.testing.assert_array_equal(pixels, grid._image_array())
+
+
+def test_from_image_round_trip(bg, ig, bg_png):
+    bg.save_image(bg_png)
+
+    assert BlockGrid.from_image(bg_png, block_size=1, lines_on=False) == bg
+    assert ImageGrid.from_image(
+        Image.open(bg_png), block_size=1, lines_on=False) == ig
+
+    upper = ImageGrid.from_image(bg_png, origin='upper-left')
+    assert upper.origin == 'upper-left'
+    assert upper[0, 0].rgb == colors.Yellow
+
+
+@pytest.mark.parametrize('resample', ['area', 'nearest'])
+def test_from_image_resample(resample):
+    pixels = np.random.RandomState(0).randint(
+        0, 256, (6, 9, 3)).astype(np.uint8)
+    im = Image.fromarray(pixels)
+
+    grid = BlockGrid.from_image(im, width=3, resample=resample)
+    assert grid.shape == (3, 2)
+
+    if resample == 'area':
+        expected = pixels.reshape(2, 3, 3, 3, 3).mean(axis=(1, 3))
+    else:
+        expected = pixels[1::3, 1::3]
+    assert np.array_equal(grid._colors, np.rint(expected))
+
+    # blocks smaller than pixels
+    grid = BlockGrid.from_image(im, height=12, resample=resample)
+    assert grid.shape == (18, 12)
+    assert np.array_equal(grid._colors[::2, ::2], pixels)
+
+
+def test_from_image_uneven():
+    pixels = np.random.RandomState(1).randint(
+        0, 256, (5, 7, 3)).astype(np.uint8)
+
+    grid = BlockGrid.from_image(Image.fromarray(pixels), width=3, height=2)
+
+    expected = pixels[2:, 4:].reshape(-1, 3).mean(axis=0)
+    assert grid[1, 2].rgb == tuple(np.rint(expected).astype(int))
+
+
+def test_from_image_jpeg(request):
+    name = tempfile.NamedTemporaryFile(suffix='.jpg').name
+    request.addfinalizer(lambda: os.remove(name))
+
+    Image.new('RGB', (640, 480), (200, 100, 50)).save(name, quality=95)
+
+    grid = ImageGrid.from_image(name, width=20)
+    assert grid.shape == (20, 15)
+    assert all(np.abs(np.subtract(p.rgb, (200, 100, 50))).max() <= 2
+               for p in grid)
+
+
+def test_from_image_bad_resample(bg, bg_png):
+    bg.save_image(bg_png)
+
+    with pytest.raises(ValueError):
+        BlockGrid.from_image(bg_png, resample='bicubic')
+
+
+@pytest.mark.parametrize('size', [
+    {'width': 0}, {'height': -2}, {'width': 3, 'height': 0}])
+def test_from_image_bad_size(bg, bg_png, size):
+    bg.save_image(bg_png)
+
+    with pytest.raises(ValueError):
+        BlockGrid.from_image(bg_png, **size)
+
+
+def test_from_image_closes_file(request):
+    name = tempfile.NamedTemporaryFile(suffix='.gif').name
+    request.addfinalizer(lambda: os.remove(name))
+
+    # PIL keeps animated images open to read more frames
+    frames = [Image.new('RGB', (4, 4), c) for c in ((255, 0, 0), (0, 0, 255))]
+    frames[0].save(name, save_all=True, append_images=frames[1:])
+
+    opened = []
+    image_open = Image.open
+
+    def spy_open(fp, *args, **kwargs):
+        image = image_open(fp, *args, **kwargs)
+        opened.append((image, image.fp))
+        return image
+
+    with mock.patch.object(Image, 'open', spy_open):
+        grid = BlockGrid.from_image(name, width=2)
+        assert grid[0, 0].rgb == (255, 0, 0)
+        assert opened[-1][1].closed
+
+        # images passed in are left open
+        image = Image.open(name)
+        BlockGrid.from_image(image, width=2)
+        assert not opened[-1][1].closed
+        image.close()
+
+
+def test_from_image_large():
+    pixels = np.random.RandomState(2).randint(
+        0, 256, (400, 600, 3)).astype(np.uint8)
+
+    grid = BlockGrid.from_image(Image.fromarray(pixels), width=15)
+
+    expected = pixels.reshape(10, 40, 15, 40, 3).mean(axis=(1, 3))
+    assert grid.shape == (15, 10)
+    assert np.abs(grid._colors - expected).max() <= 1
@@ -1,4 +1,5 @@
 import os
+import pickle
 import pytest
 
 from .. import ipythonblocks
@@ -68,3 +69,27 @@ def test_str2(basic_pixel):
     s = os.linesep.join(['Pixel [9, 8]', 'Color: (5, 6, 7)'])
 
     assert bp.__str__() == s
+
+
+def test_slots(basic_pixel):
+    assert not hasattr(basic_pixel, '__dict__')
+
+
+def test_unpickle_1_9():
+    """
+    Pixels pickled by ipythonblocks 1.9 kept their attributes in a dict.
+
+    """
+    data = (
+        b'\x80\x02cipythonblocks.ipythonblocks\nPixel\nq\x00)\x81q\x01}q'
+        b'\x02(X\x04\x00\x00\x00_redq\x03K\x07X\x06\x00\x00\x00_greenq'
+        b'\x04K\x08X\x05\x00\x00\x00_blueq\x05K\tX\x05\x00\x00\x00_size'
+        b'q\x06K\x14X\x04\x00\x00\x00_rowq\x07K\x00X\x04\x00\x00\x00_colq'
+        b'\x08K\x01ub.')
+
+    pixel = pickle.loads(data)
+
+    assert type(pixel) is ipythonblocks.Pixel
+    assert pixel.rgb == (7, 8, 9)
+    assert pixel.size == 20
+    assert (pixel.x, pixel.y) == (1, 0)
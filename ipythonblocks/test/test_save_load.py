@@ -0,0 +1,162 @@
+"""
+Tests for saving grids to binary files and loading them.
+
+"""
+import numpy as np
+import pytest
+
+from ..ipythonblocks import BlockGrid, ImageGrid, colors
+
+
+@pytest.fixture
+def grid_file(tmpdir):
+    return str(tmpdir.join('grid.ipbg'))
+
+
+@pytest.fixture
+def bg():
+    grid = BlockGrid(4, 3, block_size=7, lines_on=False)
+    grid[1, 2] = colors.Red
+    grid[2, :] = colors.Blue
+    return grid
+
+
+@pytest.mark.parametrize('mmap', [False, True])
+def test_save_load(bg, grid_file, mmap):
+    bg.save(grid_file)
+    loaded = BlockGrid.load(grid_file, mmap=mmap)
+
+    assert type(loaded) is BlockGrid
+    assert loaded == bg
+    assert loaded.block_size == 7
+    assert loaded.lines_on is False
+    assert loaded._sizes.dtype == np.int32
+    assert isinstance(loaded._colors, np.memmap) is mmap
+
+
+def test_file_size(bg, grid_file):
+    bg.save(grid_file)
+
+    with open(grid_file, 'rb') as f:
+        assert len(f.read()) == 24 + 4 * 3 * 3
+
+
+@pytest.mark.parametrize('mmap', [False, True])
+def test_save_load_sizes(bg, grid_file, mmap):
+    bg[0, 1].size = 3
+    bg.save(grid_file)
+    loaded = BlockGrid.load(grid_file, mmap=mmap)
+
+    assert loaded == bg
+    assert loaded[0, 1].size == 3
+    assert loaded[0, 0].size == 7
+
+
+def test_save_load_view(bg, grid_file):
+    view = bg[1:, 1:3]
+    view.save(grid_file)
+
+    assert BlockGrid.load(grid_file) == view
+
+
+@pytest.mark.parametrize('origin', ['lower-left', 'upper-left'])
+def test_save_load_imagegrid(grid_file, origin):
+    ig = ImageGrid(3, 2, origin=origin)
+    ig[0, 0] = colors.Green
+    ig.save(grid_file)
+
+    loaded = BlockGrid.load(grid_file)
+
+    assert type(loaded) is ImageGrid
+    assert loaded.origin == origin
+    assert loaded[0, 0].rgb == colors.Green
+    assert loaded == ig
+
+
+def test_load_across_classes(bg, grid_file):
+    bg.save(grid_file)
+    loaded = ImageGrid.load(grid_file)
+
+    assert type(loaded) is ImageGrid
+    assert loaded.origin == 'lower-left'
+    assert loaded.shape == bg.shape
+    # both grids keep their rows top row first
+    assert loaded[1, bg.height - 1 - 2].rgb == bg[2, 1].rgb
+    assert loaded[:2, :2].shape == (2, 2)
+
+    ig = ImageGrid(3, 2, origin='upper-left')
+    ig[0, 1] = colors.Green
+    ig.save(grid_file)
+    loaded = BlockGrid.load(grid_file)
+
+    assert type(loaded) is ImageGrid
+    assert loaded.origin == 'upper-left'
+    assert loaded == ig
+
+
+def test_from_storage_bad_origin():
+    with pytest.raises(ValueError):
+        ImageGrid._from_storage(np.zeros((2, 3, 3), dtype=np.uint8),
+                                np.ones((2, 3), dtype=np.int32),
+                                origin=None)
+
+
+def test_mmap_copy_on_write(bg, grid_file):
+    bg.save(grid_file)
+    loaded = BlockGrid.load(grid_file, mmap=True)
+
+    loaded[0, 0] = colors.Yellow
+    assert loaded[0, 0].rgb == colors.Yellow
+    assert BlockGrid.load(grid_file) == bg
+
+
+def test_mmap_memory(grid_file):
+    """
+    Loading with mmap shouldn't allocate anything per block until the
+    grid is changed.
+
+    """
+    tracemalloc = pytest.importorskip('tracemalloc')
+
+    grid = BlockGrid(200, 200, block_size=7)
+    grid[0, 0] = colors.Red
+    grid.save(grid_file)
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        loaded = BlockGrid.load(grid_file, mmap=True)
+        assert loaded[0, 0].rgb == colors.Red
+        assert loaded[1, 1].size == 7
+        assert loaded == grid
+        used = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+    assert used / float(grid.width * grid.height) < 0.5
+
+    loaded[1, 1].size = 3
+    loaded[2, 2] = colors.Blue
+    assert loaded[1, 1].size == 3
+    assert loaded[2, 2].rgb == colors.Blue
+    assert loaded[3, 3].size == 7
+    assert BlockGrid.load(grid_file) == grid
+
+
+def test_load_bad_file(grid_file):
+    with open(grid_file, 'wb') as f:
+        f.write(b'# width height\n')
+
+    with pytest.raises(ValueError):
+        BlockGrid.load(grid_file)
+
+
+def test_load_truncated(bg, grid_file):
+    bg.save(grid_file)
+    with open(grid_file, 'rb') as f:
+        data = f.read()
+    with open(grid_file, 'wb') as f:
+        f.write(data[:-1])
+
+    with pytest.raises(ValueError):
+        BlockGrid.load(grid_file)
@@ -23,7 +23,8 @@ setup(name='ipythonblocks',
                    'Intended Audience :: Education',
                    'Topic :: Education'],
       install_requires=[
-            'ipython>=4.0',
+            'ipython>=5.4',
+            'numpy>=1.7',
             'notebook>=4.0',
             'requests>=1.0',
       ])